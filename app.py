@@ -1,6 +1,8 @@
-from shiny import App, render, ui, reactive, session
-from shinywidgets import output_widget, render_widget
-from utils import db, excel_io
+from shiny import App, render, ui, reactive, session, req
+from shiny.session import get_current_session
+from shinywidgets import output_widget
+from starlette.responses import JSONResponse
+from utils import db, excel_io, search, debounce, figure_cache, widgets, availability, conflicts, occupancy, capacity, cube, export_jobs, delta_export, validation, bulk_entry, recurrence
 from great_tables import GT
 
 import faicons as fa
@@ -9,7 +11,9 @@ from datetime import datetime, timedelta, date
 
 import re
 import json
+import asyncio
 import os
+import tempfile
 import plotly.express as px
 import plotly.io as pio
 pio.templates.default = "ggplot2"
@@ -20,6 +24,29 @@ db.initialize_db()
 # Create a reactive value that acts as a data validation trigger
 data_trigger = reactive.Value(0)
 
+# Number of rows sent to the browser per page in the paged data grids
+PAGE_SIZE = 100
+
+# Default window of the calendar timeline around today. Events are fetched for the
+# visible window plus CALENDAR_PREFETCH windows on each side, so that panning stays local
+CALENDAR_WINDOW_BEFORE = timedelta(weeks=2)
+CALENDAR_WINDOW_AFTER = timedelta(weeks=6)
+CALENDAR_PREFETCH = 2
+
+# How dependent outputs wait for their inputs to settle before recomputing (see utils/debounce.py):
+# ("debounce", s) recomputes s seconds after the last change, ("coalesce", s) at most once every s seconds
+RECOMPUTE_POLICIES = {
+    "data": ("coalesce", 1.0),  # data_trigger, bumped by every write from any session
+    "calendar_range": ("debounce", 0.3),
+    "calendar_filters": ("debounce", 0.3),
+    "availability_filters": ("debounce", 0.3),
+    "capacity_filters": ("debounce", 0.3),
+    "support_overview_filters": ("debounce", 0.3),
+    "support_filters": ("debounce", 0.3),
+    "country_focals_filters": ("debounce", 0.3),
+    "proposal_filters": ("debounce", 0.3),
+}
+
 # Load credentials from .secrets.json
 SECRETS = False
 try:
@@ -38,7 +65,101 @@ def get_departments():
     conn = db.get_db_connection()
     return [row for row in conn.execute("SELECT code, icon FROM departments ORDER BY code DESC").fetchall()]
 
+# Selectize input whose options are searched on the server (see utils/search.py)
+# instead of being shipped to the browser with every modal
+def search_selectize(id, label, kind, dept=None, selected=None, multiple=False, create=False):
+    current_session = get_current_session()
+
+    def choices_json(request):
+        query = request.query_params.get("query", "")
+        return JSONResponse(search.get_index(kind, dept).search(query))
+
+    url = current_session.dynamic_route(f"search_{id}", choices_json)
+
+    # Only the selected values are rendered with the input, the rest is loaded on demand
+    if isinstance(selected, str):
+        selected = [selected]
+    selected = [value for value in (selected or []) if value]
+    return ui.input_selectize(
+        id,
+        label,
+        choices=search.get_index(kind, dept).lookup(selected),
+        selected=selected if multiple else (selected[0] if selected else None),
+        multiple=multiple,
+        options={
+            "valueField": "value",
+            "labelField": "label",
+            "searchField": ["label"],
+            "maxOptions": search.SEARCH_LIMIT,
+            "preload": "focus",
+            "create": create,
+            "load": ui.js_eval(
+                "function(query, callback) {"
+                f"  fetch('{url}&query=' + encodeURIComponent(query))"
+                "    .then(response => response.json()).then(callback).catch(() => callback());"
+                "}"
+            )
+        }
+    )
+
+# ---- Filter choices ----
+# Computed with cached SELECT DISTINCT queries (see db.distinct_values), so they
+# are only re-read from the database when their table changes
+def year_choices(table, column, dept):
+    return [str(year) for year in db.distinct_values(table, f"year({column})", "department_code = ?", [dept])]
+
+def column_choices(table, column, dept, year_column=None, year=None, split=False):
+    # split: the column holds comma separated lists (e.g. "Sudan, Chad")
+    expr = f"unnest(string_split({column}, ', '))" if split else column
+    where, params = "department_code = ?", [dept]
+    if year_column and year:
+        where, params = where + f" AND year({year_column}) = ?", params + [int(year)]
+    return db.distinct_values(table, expr, where, params)
+
+# Filters are rendered once and then refreshed in place with ui.update_select (see sync_filter in server)
+FILTER_CHOICES = {
+    "calendar_{dept}_insights_year_filter_": lambda dept, year=None: year_choices("calendar", "start_date", dept),
+    "calendar_{dept}_insights_advisor_filter_": lambda dept, year=None: ["All"] + column_choices("calendar", "advisor_short_name", dept),
+    "capacity_{dept}_year_filter_": lambda dept, year=None: sorted(set(year_choices("calendar", "start_date", dept)) | set(year_choices("timesheet", "date", dept))),
+    "support_{dept}_overall_year_filter_": lambda dept, year=None: year_choices("timesheet", "date", dept),
+    "support_{dept}_insights_year_filter_": lambda dept, year=None: year_choices("timesheet", "date", dept),
+    "support_{dept}_insights_country_filter_": lambda dept, year=None: ["All"] + column_choices("timesheet", "country_name", dept, split=True),
+    "country_focals_{dept}_country_filter_": lambda dept, year=None: ["All"] + column_choices("country_focals", "country_name", dept),
+    "proposal_{dept}_insights_year_filter_": lambda dept, year=None: year_choices("proposals", "date_submission", dept),
+    "proposal_{dept}_insights_country_filter_": lambda dept, year=None: ["All"] + column_choices("proposals", "country_name", dept, "date_submission", year),
+}
+
+def default_choice(choices):
+    # "All" when available, otherwise the latest year
+    return "All" if "All" in choices else (choices[-1] if choices else None)
+
 # ---- UI builders ----
+def filter_select(name, label, dept, year=None):
+    choices = FILTER_CHOICES[name](dept, year)
+    return ui.input_select(
+        name.format(dept=dept),
+        label,
+        choices=choices,
+        selected=default_choice(choices),
+        width="150px"
+    )
+
+# Data grid paged, sorted and filtered on the server (see paged_grid in server)
+def paged_grid_ui(grid_id, table):
+    return ui.TagList(
+        ui.row(
+            ui.column(3, ui.input_text(f"{grid_id}_search", "Filter", placeholder="Search all columns")),
+            ui.column(3, ui.input_select(f"{grid_id}_sort", "Sort by", choices=db.table_columns(table), selected="id")),
+            ui.column(2, ui.input_checkbox(f"{grid_id}_descending", "Descending", value=True)),
+            ui.column(4,
+                ui.input_action_button(f"{grid_id}_prev", "", class_="btn btn-light btn-sm", icon=fa.icon_svg("chevron-left")),
+                ui.input_action_button(f"{grid_id}_next", "", class_="btn btn-light btn-sm", icon=fa.icon_svg("chevron-right")),
+                ui.output_text(f"{grid_id}_page_info", inline=True)
+            )
+        ),
+        ui.output_data_frame(grid_id)
+    )
+
 def login_ui():
     return ui.page_fluid(
         ui.card(
@@ -58,22 +179,58 @@ def calendar_panel(dept):
             ui.nav_panel(
                 "Dashboard",
                 ui.card(
+                    ui.row(
+                        ui.column(4, ui.input_date_range(
+                            f"calendar_{dept}_data_range_", "Date range",
+                            start=date.today() - CALENDAR_WINDOW_BEFORE, end=date.today() + CALENDAR_WINDOW_AFTER,
+                            format="dd-mm-yyyy", weekstart=1
+                        )),
+                        ui.column(4,
+                            ui.input_action_button(f"calendar_{dept}_range_prev_", "", class_="btn btn-light", icon=fa.icon_svg("chevron-left")),
+                            ui.input_action_button(f"calendar_{dept}_range_today_", "Today", class_="btn btn-light"),
+                            ui.input_action_button(f"calendar_{dept}_range_next_", "", class_="btn btn-light", icon=fa.icon_svg("chevron-right")),
+                            style="padding-top: 32px;"
+                        )
+                    ),
                     output_widget(f"calendar_{dept}_plot"),
                     full_screen=True
                 ),
 
                 ui.card(
                     ui.row(
-                        ui.column(3, ui.output_ui(f"calendar_{dept}_insights_year_filter")),
-                        ui.column(3, ui.output_ui(f"calendar_{dept}_insights_advisor_filter"))
+                        ui.column(3, filter_select("calendar_{dept}_insights_year_filter_", "Select Year", dept)),
+                        ui.column(3, filter_select("calendar_{dept}_insights_advisor_filter_", "Select Advisor", dept))
                     ),
                     ui.row(
                         ui.column(4, ui.output_ui(f"calendar_{dept}_insights_table")),
                         ui.column(8, output_widget(f"calendar_{dept}_insights_plot"))
+                    ),
+                    ui.row(
+                        ui.column(12, output_widget(f"calendar_{dept}_utilisation_heatmap"))
                     )
                 ),
                 icon=fa.icon_svg("chart-pie")
             ),
+            ui.nav_panel(
+                "Availability",
+                ui.card(
+                    ui.row(
+                        ui.column(4, search_selectize(f"availability_{dept}_advisors_filter_", "Advisors (all if empty)", "active_advisors", dept=dept, multiple=True)),
+                        ui.column(4, ui.input_date_range(
+                            f"availability_{dept}_range_filter_", "Between",
+                            start=date.today(), end=date.today() + timedelta(weeks=2),
+                            format="dd-mm-yyyy", weekstart=1
+                        )),
+                        ui.column(2, ui.input_numeric(f"availability_{dept}_min_days_filter_", "Min. free days", value=1, min=1))
+                    ),
+                    ui.row(
+                        ui.column(5, ui.output_ui(f"availability_{dept}_advisors_table")),
+                        ui.column(7, ui.output_ui(f"availability_{dept}_slots_table"))
+                    ),
+                    ui.output_ui(f"availability_{dept}_api")
+                ),
+                icon=fa.icon_svg("user-clock")
+            ),
             ui.nav_panel(
                 "Data",
                 ui.row(
@@ -82,9 +239,11 @@ def calendar_panel(dept):
                         ui.row(ui.br()),
                         ui.row(ui.output_ui(f"edit_calendar_{dept}_btn")),
                         ui.row(ui.br()),
-                        ui.row(ui.output_ui(f"delete_calendar_{dept}_btn"))
+                        ui.row(ui.output_ui(f"delete_calendar_{dept}_btn")),
+                        ui.row(ui.br()),
+                        ui.row(ui.output_ui(f"conflicts_calendar_{dept}_btn"))
                     ),
-                    ui.column(10, ui.output_data_frame(f"calendar_{dept}_table"))
+                    ui.column(10, paged_grid_ui(f"calendar_{dept}_table", "calendar"))
                 ),
                 icon=fa.icon_svg("table")
             )
@@ -99,15 +258,15 @@ def support_panel(dept):
             ui.nav_panel(
                 "Dashboard",
                 ui.card(
-                    ui.output_ui(f"support_{dept}_overall_year_filter"),
+                    filter_select("support_{dept}_overall_year_filter_", "Select Year", dept),
                     output_widget(f"support_{dept}_plot"),
                     full_screen=True
                 ),
 
                 ui.card(
                     ui.row(
-                        ui.column(3, ui.output_ui(f"support_{dept}_insights_year_filter")),
-                        ui.column(3, ui.output_ui(f"support_{dept}_insights_country_filter"))
+                        ui.column(3, filter_select("support_{dept}_insights_year_filter_", "Select Year", dept)),
+                        ui.column(3, filter_select("support_{dept}_insights_country_filter_", "Select Country", dept))
                     ),
                     ui.row(
                         ui.column(7, output_widget(f"support_{dept}_insights_timeline")),
@@ -127,9 +286,11 @@ def support_panel(dept):
                         ui.row(ui.br()),
                         ui.row(ui.output_ui(f"edit_timesheet_{dept}_btn")),
                         ui.row(ui.br()),
-                        ui.row(ui.output_ui(f"delete_timesheet_{dept}_btn"))
+                        ui.row(ui.output_ui(f"delete_timesheet_{dept}_btn")),
+                        ui.row(ui.br()),
+                        ui.row(ui.output_ui(f"bulk_timesheet_{dept}_btn"))
                     ),
-                    ui.column(10, ui.output_data_frame(f"timesheet_{dept}_table"))
+                    ui.column(10, paged_grid_ui(f"timesheet_{dept}_table", "timesheet"))
                 ),
                 icon=fa.icon_svg("table")
             )
@@ -147,7 +308,7 @@ def countries_panel(dept):
                 ui.card(
                     ui.row(
                         ui.column(2,
-                            ui.row(ui.output_ui(f"country_focals_{dept}_country_filter")),
+                            ui.row(filter_select("country_focals_{dept}_country_filter_", "Select Country", dept)),
                             ui.row(ui.output_ui(f"make_country_focals_{dept}_btn"))
                         ),
                         ui.column(10, ui.output_ui(f"country_focals_{dept}_table")),
@@ -165,7 +326,7 @@ def countries_panel(dept):
                         ui.row(ui.br()),
                         ui.row(ui.output_ui(f"delete_country_focal_{dept}_btn"))
                     ),
-                    ui.column(10, ui.output_data_frame(f"country_focals_{dept}_table_editable"))
+                    ui.column(10, paged_grid_ui(f"country_focals_{dept}_table_editable", "country_focals"))
                 ),
                 icon=fa.icon_svg("table")
             )
@@ -174,6 +335,7 @@ def countries_panel(dept):
     )
 
 def proposals_panel(dept):
+    proposal_years = FILTER_CHOICES["proposal_{dept}_insights_year_filter_"](dept)
     return ui.nav_panel(
         "Proposals",
         ui.navset_card_tab(
@@ -181,8 +343,8 @@ def proposals_panel(dept):
                 "Dashboard",
                 ui.card(
                     ui.row(
-                        ui.column(3, ui.output_ui(f"proposal_{dept}_insights_year_filter")),
-                        ui.column(3, ui.output_ui(f"proposal_{dept}_insights_country_filter"))
+                        ui.column(3, filter_select("proposal_{dept}_insights_year_filter_", "Select Year", dept)),
+                        ui.column(3, filter_select("proposal_{dept}_insights_country_filter_", "Select Country", dept, year=default_choice(proposal_years)))
                     ),
                     ui.row(
                         ui.column(7, output_widget(f"proposal_{dept}_insights_timeline")),
@@ -201,7 +363,7 @@ def proposals_panel(dept):
                         ui.row(ui.br()),
                         ui.row(ui.output_ui(f"delete_proposal_{dept}_btn"))
                     ),
-                    ui.column(10, ui.output_data_frame(f"proposals_{dept}_table"))
+                    ui.column(10, paged_grid_ui(f"proposals_{dept}_table", "proposals"))
                 ),
                 icon=fa.icon_svg("table")
             )
@@ -248,8 +410,26 @@ def admin_panel():
             "Export / Import",
             ui.card(
                 ui.row(
-                    ui.column(2, ui.row(ui.output_ui("export_btn"))),
-                    ui.column(2, ui.row(ui.output_ui("import_btn")))
+                    ui.column(2, ui.input_select(
+                        "export_format", "Format",
+                        choices={fmt: label for fmt, (label, _) in excel_io.EXPORT_FORMATS.items()},
+                        width="180px"
+                    )),
+                    ui.column(2, ui.row(ui.output_ui("export_btn")), style="padding-top: 32px;"),
+                    ui.column(3, ui.row(ui.output_ui("import_btn")))
+                ),
+            ),
+            ui.card(
+                ui.card_header("Changes since a previous export"),
+                ui.row(
+                    ui.column(3, ui.output_ui("delta_watermark")),
+                    ui.column(2, ui.input_select("delta_format", "Format", choices=delta_export.FORMATS, width="150px")),
+                    ui.column(2, ui.download_button(
+                        id="download_delta",
+                        label="Download changes",
+                        class_="btn btn-success",
+                        icon=fa.icon_svg("file-export")
+                    ), style="padding-top: 32px;")
                 ),
             ),
             icon=fa.icon_svg("database")
@@ -273,6 +453,21 @@ def logout_panel():
     ),
 
 
+def capacity_panel(dept):
+    return ui.nav_panel(
+        "Capacity",
+        ui.card(
+            ui.row(
+                ui.column(3, filter_select("capacity_{dept}_year_filter_", "Select Year", dept))
+            ),
+            output_widget(f"capacity_{dept}_heatmap"),
+            full_screen=True
+        ),
+        ui.card(ui.output_ui(f"capacity_{dept}_table")),
+        icon=fa.icon_svg("gauge")
+    )
+
+
 # Build full department UI
 def department_ui(dept, icon):
     return ui.nav_panel(
@@ -280,6 +475,7 @@ def department_ui(dept, icon):
         ui.navset_pill_list(
             calendar_panel(dept),
             support_panel(dept),
+            capacity_panel(dept),
             countries_panel(dept),
             proposals_panel(dept),
             widths=(2, 10),
@@ -294,6 +490,14 @@ app_ui = ui.page_fluid(
 
 # Server logic
 def server(input, output, session):
+    # Writes bump data_trigger, outputs follow its coalesced version so that a burst
+    # of writes (e.g. from several users) triggers a single refresh
+    data_version = debounce.settle(RECOMPUTE_POLICIES["data"])(data_trigger.get)
+
+    # Settled view of a group of filter inputs, returned as a tuple of their values
+    def settled_inputs(policy, *input_ids):
+        return debounce.settle(RECOMPUTE_POLICIES[policy])(lambda: tuple(input[i]() for i in input_ids))
+
     # Render the navbar reactively
     @output
     @render.ui
@@ -398,7 +602,8 @@ def server(input, output, session):
                 ui.input_text("role", "Role/Title"),
                 ui.input_text("email", "Email"),
                 ui.input_checkbox("active", "Active", value=True),
-                ui.input_selectize("country_codes", "Country(ies)", dict((db.read_table("countries").select(pl.col("iso_alpha3_code"), pl.col("name"))).iter_rows()), multiple=True),
+                search_selectize("country_codes", "Country(ies)", "country_codes", multiple=True),
+                search_selectize("duty_country_code", "Duty country (public holidays)", "country_codes"),
                 ui.input_text("colour", "Colour (HEX)", value="#000000"),
                 ui.modal_button("Cancel"),
                 ui.input_action_button(f"add_advisor_submit", "Submit", class_="btn btn-primary"),
@@ -420,18 +625,11 @@ def server(input, output, session):
             "email": input.email(),
             "active": input.active(),
             "country_codes": re.sub("[()']", "", ", ".join(map(str, input["country_codes"]()))).strip(","),
+            "duty_country_code": input["duty_country_code"]() or None,
             "colour": input.colour()
         }
         try:
-            if not re.match(r"^#([A-Fa-f0-9]{6})$", new_advisor["colour"]):
-                ui.notification_show(f"Error adding advisor: Colour must be a valid HEX code (e.g., #FF5733).", type="error")
-                raise ValueError("Colour must be a valid HEX code (e.g., #FF5733).")
-            if not new_advisor["name"] or not new_advisor["short_name"] or not new_advisor["department_code"]:
-                ui.notification_show("Error adding advisor: Name, Short Name, and Department are required fields.", type="error")
-                raise ValueError("Name, Short Name, and Department are required fields.")
-            if not re.match(r"[^@]+@[^@]+\.[^@]+", new_advisor["email"]):
-                ui.notification_show(f"Error adding advisor: Email must be a valid email address.", type="error")
-                raise ValueError("Email must be a valid email address.")
+            validation.check_row("advisors", new_advisor)
         except ValueError as ve:
             ui.notification_show(f"Error adding advisor: {ve}", type="error")
             return
@@ -463,7 +661,8 @@ def server(input, output, session):
                     ui.input_text("edit_role", "Role/Title", value=advisor_data["role"]),
                     ui.input_text("edit_email", "Email", value=advisor_data["email"]),
                     ui.input_checkbox("edit_active", "Active", value=advisor_data["active"]),
-                    ui.input_selectize("edit_country_codes", "Country(ies)", choices=dict((db.read_table("countries").select(pl.col("iso_alpha3_code"), pl.col("name"))).iter_rows()), multiple=True, selected=advisor_data["country_codes"]),
+                    search_selectize("edit_country_codes", "Country(ies)", "country_codes", multiple=True, selected=(advisor_data["country_codes"] or "").split(", ")),
+                    search_selectize("edit_duty_country_code", "Duty country (public holidays)", "country_codes", selected=advisor_data.get("duty_country_code")),
                     ui.input_text("edit_colour", "Colour (HEX)", value=advisor_data["colour"]),
                     ui.modal_button("Cancel"),
                     ui.input_action_button(f"edit_advisor_submit", "Submit", class_="btn btn-primary"),
@@ -488,18 +687,11 @@ def server(input, output, session):
                 "email": input.edit_email(),
                 "active": input.edit_active(),
                 "country_codes": re.sub("[()']", "", ", ".join(map(str, input["edit_country_codes"]()))).strip(","),
+                "duty_country_code": input["edit_duty_country_code"]() or None,
                 "colour": input.edit_colour()
             }
             try:
-                if not re.match(r"^#([A-Fa-f0-9]{6})$", updated_advisor["colour"]):
-                    ui.notification_show(f"Error updating advisor: Colour must be a valid HEX code (e.g., #FF5733).", type="error")
-                    raise ValueError("Colour must be a valid HEX code (e.g., #FF5733).")
-                if not updated_advisor["name"] or not updated_advisor["short_name"] or not updated_advisor["department_code"]:
-                    ui.notification_show("Error updating advisor: Name, Short Name, and Department are required fields.", type="error")
-                    raise ValueError("Name, Short Name, and Department are required fields.")
-                if not re.match(r"[^@]+@[^@]+\.[^@]+", updated_advisor["email"]):
-                    ui.notification_show(f"Error updating advisor: Email must be a valid email address.", type="error")
-                    raise ValueError("Email must be a valid email address.")
+                validation.check_row("advisors", updated_advisor)
                 db.update_row("advisors", updates=updated_advisor, where=f"id = {id_to_edit}")
                 ui.notification_show("Advisor updated successfully.", type="success")
             except Exception as e:
@@ -549,7 +741,7 @@ def server(input, output, session):
     @render.data_frame
     def _advisors_table():
         # Use data_trigger to refresh the table when it changes
-        data_trigger.get()  # Trigger reactivity
+        data_version()  # Trigger reactivity
         advisors = db.read_table("advisors").sort(by=["department_code"], descending=False)
         return render.DataGrid(
             advisors,
@@ -619,9 +811,7 @@ def server(input, output, session):
             "icon": input.icon()
         }
         try:
-            if not new_department["name"] or not new_department["code"]:
-                ui.notification_show("Error adding department: Name and Code are required fields.", type="error")
-                raise ValueError("Name and Code are required fields.")
+            validation.check_row("departments", new_department)
             db.insert_row("departments", new_department)
         except Exception as e:
             ui.notification_show(f"Error adding department: {e}", type="error")
@@ -669,9 +859,7 @@ def server(input, output, session):
                 "icon": input.edit_icon()
             }
             try:
-                if not updated_department["name"] or not updated_department["code"]:
-                    ui.notification_show("Error updating department: Name and Code are required fields.", type="error")
-                    raise ValueError("Name and Code are required fields.")
+                validation.check_row("departments", updated_department)
                 db.update_row("departments", updates=updated_department, where=f"id = {id_to_edit}")
                 ui.notification_show("Department updated successfully.", type="success")
             except Exception as e:
@@ -721,7 +909,7 @@ def server(input, output, session):
     @render.data_frame
     def _departments_table():
         # Use data_trigger to refresh the table when it changes
-        data_trigger.get()  # Trigger reactivity
+        data_version()  # Trigger reactivity
         departments = db.read_table("departments").sort(by=["code"], descending=False)
         return render.DataGrid(
             departments,
@@ -731,58 +919,483 @@ def server(input, output, session):
         )
     
     # ----- Export / Import
+    # Exports run as background jobs (see utils/export_jobs.py) on a worker thread,
+    # the file is offered for download once written
+    export_job = reactive.Value(None)
+
+    @ui.bind_task_button(button_id="export_btn_")
+    @reactive.extended_task
+    async def export_task(job):
+        return await asyncio.to_thread(job.run)
+
     @output(id="export_btn")
     @render.ui
     def _export_btn():
-        return ui.download_button(
-            id="download",
-            label="Download Excel",
-            class_="btn btn-success",
-            icon=fa.icon_svg("file-export")
+        return ui.TagList(
+            ui.input_task_button(
+                "export_btn_",
+                "Export",
+                label_busy="Exporting...",
+                class_="btn btn-success",
+                icon=fa.icon_svg("file-export")
+            ),
+            ui.output_ui("export_status")
         )
-    
-    @render.download()
+
+    @reactive.Effect
+    @reactive.event(input.export_btn_)
+    def _start_export():
+        job = export_jobs.ExportJob(input.export_format())
+        export_job.set(job)
+        export_task(job)
+
+    @reactive.Effect
+    @reactive.event(input.export_cancel_btn_)
+    def _cancel_export():
+        if export_job.get() is not None:
+            export_job.get().cancel()
+
+    @output(id="export_status")
+    @render.ui
+    def _export_status():
+        job, status = export_job.get(), export_task.status()
+        if job is None:
+            return None
+        if status == "running":
+            return ui.div(
+                ui.output_ui("export_progress"),
+                ui.input_action_button("export_cancel_btn_", "Cancel", class_="btn btn-light btn-sm"),
+                style="margin-top: 10px;"
+            )
+        if status == "success":
+            return ui.div(
+                ui.p("Database unchanged since the last export, the cached file is ready.", class_="text-muted") if job.cached else None,
+                ui.download_button(id="download", label=f"Download {excel_io.EXPORT_FORMATS[job.fmt][0]}", class_="btn btn-success", icon=fa.icon_svg("download")),
+                style="margin-top: 10px;"
+            )
+        if status == "error":
+            try:
+                export_task.result()
+            except export_jobs.ExportCancelled:
+                return ui.p("Export cancelled.", class_="text-muted")
+            except Exception as e:
+                return ui.p(f"Error exporting database: {e}", class_="text-danger")
+        if status == "cancelled":
+            return ui.p("Export cancelled.", class_="text-muted")
+        return None
+
+    @output(id="export_progress")
+    @render.ui
+    def _export_progress():
+        # Poll the job's progress while it runs
+        job = export_job.get()
+        if job is None or export_task.status() != "running":
+            return None
+        reactive.invalidate_later(0.5)
+        percent = round(job.fraction * 100)
+        return ui.TagList(
+            ui.div(
+                ui.div(f"{percent}%", class_="progress-bar", role="progressbar", style=f"width: {percent}%;"),
+                class_="progress"
+            ),
+            ui.tags.small(job.describe(), class_="text-muted")
+        )
+
+    @render.download(filename=lambda: f"sal_ta_dashboard_export_{datetime.now().isoformat('#', 'seconds').replace(':', '_')}.{export_job.get().extension}")
     def download():
+        # Streamed from the export cache (data/export_cache), files are only replaced through an atomic rename
+        yield from excel_io.read_chunks(export_task.result())
+
+    @output(id="import_btn")
+    @render.ui
+    def _import_btn():
+        return ui.input_file("import_file", "Import", accept=[".xlsx", ".zip"], button_label="Browse...", width="300px")
+
+    @reactive.Effect
+    @reactive.event(input.import_file)
+    def _confirm_import():
+        file = input.import_file()[0]
+        try:
+            fmt = excel_io.detect_format(file["datapath"])
+        except ValueError as e:
+            ui.notification_show(str(e), type="error")
+            return
+        ui.modal_show(
+            ui.modal(
+                ui.p(f"Import {file['name']} ({excel_io.EXPORT_FORMATS[fmt][0]})?"),
+                ui.p(
+                    "New and changed rows will be written to the tables, unchanged rows are skipped." if fmt == "xlsx"
+                    else "The tables it contains will be replaced." if fmt != "duckdb"
+                    else "The whole database will be replaced by the snapshot."
+                ),
+                title="Import",
+                easy_close=True,
+                footer=ui.TagList(
+                    ui.modal_button("Cancel"),
+                    ui.input_action_button("import_submit", "Import", class_="btn btn-danger")
+                )
+            )
+        )
+
+    @reactive.Effect
+    @reactive.event(input.import_submit)
+    def _import():
+        file = input.import_file()[0]
         try:
-            now = datetime.now().isoformat("#", "seconds").replace(":", "_")
-            excel_io.export_db_to_excel(f"sal_ta_dashboard_export_{now}.xlsx")
-            ui.notification_show("Database exported successfully.", type="success")
-            return f"sal_ta_dashboard_export_{now}.xlsx"
+            fmt = excel_io.detect_format(file["datapath"])
+            tables = excel_io.import_db(file["datapath"], fmt)
+            # Rows imported with their ids leave the id sequences behind, the snapshot restores them
+            if fmt != "duckdb":
+                excel_io.ensure_sequences()
+            ui.modal_remove()
+            # {table: (inserted, updated, skipped)}; workbooks are merged, other formats replace the tables
+            inserted, updated, skipped = (sum(counts) for counts in zip(*tables.values())) if tables else (0, 0, 0)
+            if fmt == "xlsx":
+                ui.notification_show(f"Imported {file['name']}: {inserted} row(s) inserted, {updated} updated, {skipped} unchanged.", type="success")
+                if not inserted and not updated:
+                    return
+            else:
+                ui.notification_show(f"Imported {len(tables)} table(s) ({inserted} rows): {', '.join(tables)}.", type="success")
+            data_trigger.set(data_trigger.get() + 1)
         except Exception as e:
-            ui.notification_show(f"Error exporting database: {e}", type="error")
-            return None
-    
+            ui.notification_show(f"Error importing {file['name']}: {e}", type="error")
+
+    # Delta exports (see utils/delta_export.py): rows changed since a previous delta export
+    # The snapshot directory is polled, so that exports from any session show up
+    @reactive.poll(delta_export.watermarks, 5)
+    def delta_watermarks():
+        return delta_export.watermarks()
+
+    @output(id="delta_watermark")
+    @render.ui
+    def _delta_watermark():
+        watermarks = delta_watermarks()
+        return ui.input_select(
+            "delta_since",
+            "Since export",
+            choices={"": "Beginning (all rows)", **{w: datetime.strptime(w, "%Y%m%dT%H%M%S%f").strftime("%d-%b-%Y %H:%M:%S") for w in reversed(watermarks)}},
+            selected=watermarks[-1] if watermarks else ""
+        )
 
+    @render.download(filename=lambda: f"sal_ta_dashboard_changes_{datetime.now().isoformat('#', 'seconds').replace(':', '_')}.{'xlsx' if input.delta_format() == 'xlsx' else 'zip'}")
+    async def download_delta():
+        # Built on a worker thread into a private temporary file, removed once sent.
+        # The new watermark is only recorded once the whole file has been sent
+        fd, file_path = tempfile.mkstemp(prefix="sal_delta_")
+        os.close(fd)
+        watermark = None
+        try:
+            watermark = await asyncio.to_thread(delta_export.export_delta, file_path, input.delta_format(), input.delta_since() or None)
+            for chunk in excel_io.read_chunks(file_path):
+                yield chunk
+            delta_export.record(watermark)
+        except Exception as e:
+            ui.notification_show(f"Error exporting changes: {e}", type="error")
+            raise
+        finally:
+            if watermark is not None:
+                delta_export.discard(watermark)
+            os.remove(file_path)
+
+    # Paged data grid: only the visible page is read from the database and sent to the browser.
+    # Pages are addressed by keyset cursors, the stack allows going back to previous pages.
+    # Writes made from this session are pushed to the grid as row patches (see patch_row),
+    # the page is only re-read when the table was changed from somewhere else.
+    def paged_grid(grid_id, table, dept):
+        where = f"department_code = '{dept}'"
+        cursors = reactive.Value([None])
+        reload = reactive.Value(0)
+        patches = reactive.Value([])
+        patched = reactive.Value(0)
+        # Rows currently shown in the browser and the table version they reflect
+        shown = {"rows": None, "version": None}
+
+        @reactive.Calc
+        def page_query():
+            return dict(
+                order_by=input[f"{grid_id}_sort"](),
+                descending=input[f"{grid_id}_descending"](),
+                search=input[f"{grid_id}_search"]().strip() or None
+            )
+
+        @reactive.Calc
+        def page():
+            reload.get()
+            shown["version"] = db.table_version(table, dept)
+            return db.read_page(table, where=where, after=cursors()[-1], limit=PAGE_SIZE, **page_query())
+
+        @reactive.Effect
+        @reactive.event(data_version)
+        def _():
+            # Writes to other tables or already patched in don't need a reload
+            if shown["version"] != db.table_version(table, dept):
+                reload.set(reload.get() + 1)
+
+        def patch_row(op, row_id):
+            # Called by the CRUD handlers right after writing row `row_id` ("insert", "update" or "delete").
+            # The patch accounts for that one write: a write from another session in between
+            # leaves the version behind, and the page is read again (see above)
+            if shown["version"] is not None:
+                shown["version"] = (shown["version"][0], shown["version"][1] + 1)
+            with reactive.isolate():
+                patches.set(patches.get() + [(op, row_id)])
+
+        @reactive.Effect
+        async def _():
+            queue = patches()
+            if not queue or shown["rows"] is None:
+                return
+            patches.set([])
+
+            rows = shown["rows"]
+            with reactive.isolate():
+                query = page_query()
+            stale = False
+            for op, row_id in queue:
+                ids = rows.get_column("id").to_list()
+                if op == "delete":
+                    if row_id in ids:
+                        rows = rows.filter(pl.col("id") != row_id)
+                        await _grid.update_data(rows)
+                    continue
+
+                new_row = db.read_table(table, where=f"id = {row_id}")
+                if new_row.height == 0:
+                    continue
+                if op == "insert":
+                    # New rows are shown on top of the first page when it lists the newest rows
+                    # first; with another sort or a search the row may belong elsewhere or
+                    # nowhere, so the page is read again. Later pages are left untouched.
+                    if len(cursors.get()) == 1:
+                        if query["order_by"] == "id" and query["descending"] and not query["search"]:
+                            rows = pl.concat([new_row, rows], how="vertical_relaxed").head(PAGE_SIZE)
+                            await _grid.update_data(rows)
+                        else:
+                            stale = True
+                            break
+                elif row_id in ids:
+                    # Only send the cells that changed
+                    index = ids.index(row_id)
+                    changed = {
+                        col: new_row.get_column(col)[0] for col in rows.columns
+                        if rows.get_column(col)[index] != new_row.get_column(col)[0]
+                    }
+                    # A row whose sort value changed may move, one that no longer matches the
+                    # department or the search leaves the page: the page is read again
+                    if query["order_by"] in changed or not db.count_rows(table, where=f"{where} AND id = {row_id}", search=query["search"]):
+                        stale = True
+                        break
+                    rows = rows.update(new_row, on="id", include_nulls=True)
+                    if all(isinstance(value, (str, int, float, bool, type(None))) for value in changed.values()):
+                        for col, value in changed.items():
+                            await _grid.update_cell_value(value, row=index, col=col)
+                    else:
+                        # Dates can't be sent as cell patches, resend the page with the updated row instead
+                        await _grid.update_data(rows)
+
+            if stale:
+                with reactive.isolate():
+                    reload.set(reload.get() + 1)
+                return
+            shown["rows"] = rows
+            with reactive.isolate():
+                patched.set(patched.get() + 1)
+
+        @reactive.Effect
+        @reactive.event(page_query)
+        def _():
+            # Sorting or filtering starts again from the first page
+            cursors.set([None])
+
+        @reactive.Effect
+        @reactive.event(input[f"{grid_id}_next"])
+        def _():
+            _, next_cursor = page()
+            if next_cursor is not None:
+                cursors.set(cursors() + [next_cursor])
+
+        @reactive.Effect
+        @reactive.event(input[f"{grid_id}_prev"])
+        def _():
+            if len(cursors()) > 1:
+                cursors.set(cursors()[:-1])
+
+        @output(id=f"{grid_id}_page_info")
+        @render.text
+        def _():
+            patched.get()
+            rows, _ = page()
+            total = db.count_rows(table, where=where, search=page_query()["search"])
+            first = (len(cursors()) - 1) * PAGE_SIZE
+            shown_rows = shown["rows"].height if shown["rows"] is not None else rows.height
+            return f"Rows {min(first + 1, total)}-{first + shown_rows} of {total}"
+
+        @output(id=grid_id)
+        @render.data_frame
+        def _grid():
+            rows, _ = page()
+            shown["rows"] = rows
+            return render.DataGrid(
+                rows,
+                height="400px",
+                selection_mode="rows"
+            )
+
+        return _grid, patch_row
+
+    # Update a filter's choices in place when they change (after a write to its table).
+    # `year_input` is the year filter the choices depend on, if any.
+    def sync_filter(name, dept, year_input=None):
+        input_id = name.format(dept=dept)
+        sent = {"choices": None}
+
+        @reactive.Effect
+        def _():
+            data_version()  # Trigger reactivity
+            year = input[year_input.format(dept=dept)]() if year_input else None
+            choices = FILTER_CHOICES[name](dept, year)
+            if choices == sent["choices"]:
+                return
+            sent["choices"] = choices
+            with reactive.isolate():
+                try:
+                    current = input[input_id]()
+                except Exception:
+                    current = None
+            ui.update_select(
+                input_id,
+                choices=choices,
+                selected=current if current in choices else default_choice(choices)
+            )
+
+    # Calendar timeline window
+    def calendar_window(dept, date_range):
+        # Events overlapping the selected date range. They are read from a prefetched
+        # span of CALENDAR_PREFETCH windows on each side of the range, which is only
+        # fetched again when the range gets close to its edges or the calendar changes
+        prefetched = {"span": None, "version": None, "events": None}
+
+        @reactive.Calc
+        def window():
+            data_version()
+            try:
+                start, end = date_range()[0]
+                assert start is not None and end is not None and start <= end
+            except (TypeError, ValueError, AssertionError):
+                start, end = date.today() - CALENDAR_WINDOW_BEFORE, date.today() + CALENDAR_WINDOW_AFTER
+            # Transform data range into datetime objects (the end date is included)
+            start = datetime(start.year, start.month, start.day)
+            end = datetime(end.year, end.month, end.day) + timedelta(days=1)
+            width = end - start
+
+            span, version = prefetched["span"], db.table_version("calendar", dept)
+            if version != prefetched["version"] or span is None or start - width < span[0] or end + width > span[1]:
+                span = (start - CALENDAR_PREFETCH * width, end + CALENDAR_PREFETCH * width)
+                prefetched.update(
+                    span=span,
+                    version=version,
+                    events=db.read_overlapping("calendar", "start_date", "end_date", *span, where=f"department_code = '{dept}'")
+                )
+            return prefetched["events"], (start, end)
+        return window
+
+    def shift_calendar_range(dept, direction):
+        # Move the date range by its own width (direction -1: back, 1: forward)
+        start, end = input[f"calendar_{dept}_data_range_"]()
+        step = (end - start + timedelta(days=1)) * direction
+        ui.update_date_range(f"calendar_{dept}_data_range_", start=start + step, end=end + step)
+
+    # Advisor availability (see utils/availability.py)
+    def availability_query(advisors, start, end, dept):
+        # Dates of the inputs/API to [start, end) datetimes, all active advisors when none are given
+        start = availability.as_datetime(start)
+        end = availability.as_datetime(end) + timedelta(days=1)
+        return list(advisors) or search.get_index("active_advisors", dept).values, start, end
+
+    def availability_json(dept):
+        def answer(request):
+            params = request.query_params
+            try:
+                advisors, start, end = availability_query(
+                    [advisor for advisor in params.get("advisors", "").split(",") if advisor],
+                    params["start"], params.get("end", params["start"]), dept
+                )
+                min_days = int(params.get("min_days", 1))
+            except (KeyError, ValueError):
+                return JSONResponse({"error": "Expected start and end as YYYY-MM-DD, and an integer min_days"}, status_code=400)
+            if min_days < 1:
+                return JSONResponse({"error": "Expected min_days of at least 1"}, status_code=400)
+            index = availability.get_index(dept)
+            return JSONResponse({
+                "free": index.free_advisors(advisors, start, end),
+                "events": {advisor: index.overlapping(start, end, [advisor]) for advisor in advisors},
+                "slots": [[s.date().isoformat(), (e - timedelta(days=1)).date().isoformat()] for s, e in index.free_slots(advisors, start, end, timedelta(days=min_days))]
+            })
+        return answer
+
+    # Support insights filters as a slice of the timesheet cube (see utils/cube.py)
+    def support_cube_filters(year, country):
+        return {"year": year or None, "country": country if country and country != "All" else None}
 
     # Now define reactive renderers for each department/table combo
     depts = [row[0] for row in get_departments()]
 
-    # Create dictionaries to store renderers
-    calendar_table_renderers = {}
-    timesheet_table_renderers = {}
-    country_focals_table_renderers = {}
-    proposal_table_renderers = {}
+    # Create dictionaries to store the settled filters of each department
+    calendar_filters, support_overview_filters, support_filters = {}, {}, {}
+    calendar_ranges, calendar_windows, availability_filters = {}, {}, {}
+    capacity_filters = {}
+    country_focals_filters, proposal_filters = {}, {}
+
+    # Create dictionaries to store renderers and their row patchers
+    calendar_table_renderers, calendar_table_patchers = {}, {}
+    timesheet_table_renderers, timesheet_table_patchers = {}, {}
+    # Parsed bulk timesheet entry (rows, errors) waiting to be saved, see utils/bulk_entry.py
+    bulk_timesheet_batches = {}
+    country_focals_table_renderers, country_focals_table_patchers = {}, {}
+    proposal_table_renderers, proposal_table_patchers = {}, {}
 
     for dept in depts:
+        for name in FILTER_CHOICES:
+            sync_filter(name, dept, year_input="proposal_{dept}_insights_year_filter_" if name == "proposal_{dept}_insights_country_filter_" else None)
+
+        calendar_filters[dept] = settled_inputs("calendar_filters", f"calendar_{dept}_insights_year_filter_", f"calendar_{dept}_insights_advisor_filter_")
+        support_overview_filters[dept] = settled_inputs("support_overview_filters", f"support_{dept}_overall_year_filter_")
+        support_filters[dept] = settled_inputs("support_filters", f"support_{dept}_insights_year_filter_", f"support_{dept}_insights_country_filter_")
+        country_focals_filters[dept] = settled_inputs("country_focals_filters", f"country_focals_{dept}_country_filter_")
+        proposal_filters[dept] = settled_inputs("proposal_filters", f"proposal_{dept}_insights_year_filter_", f"proposal_{dept}_insights_country_filter_")
+
         # ----- Calendar        
+        calendar_ranges[dept] = settled_inputs("calendar_range", f"calendar_{dept}_data_range_")
+        calendar_windows[dept] = calendar_window(dept, calendar_ranges[dept])
+
+        @reactive.Effect
+        @reactive.event(input[f"calendar_{dept}_range_prev_"])
+        def _calendar_range_prev(dept=dept):
+            shift_calendar_range(dept, -1)
+
+        @reactive.Effect
+        @reactive.event(input[f"calendar_{dept}_range_next_"])
+        def _calendar_range_next(dept=dept):
+            shift_calendar_range(dept, 1)
+
+        @reactive.Effect
+        @reactive.event(input[f"calendar_{dept}_range_today_"])
+        def _calendar_range_today(dept=dept):
+            ui.update_date_range(
+                f"calendar_{dept}_data_range_",
+                start=date.today() - CALENDAR_WINDOW_BEFORE,
+                end=date.today() + CALENDAR_WINDOW_AFTER
+            )
+
         @output(id=f"calendar_{dept}_plot")
-        @render_widget
+        @widgets.persistent
+        @figure_cache.cached(f"calendar_{dept}_plot", ("calendar", "events"), dept=dept, filters=lambda dept=dept: (date.today(), calendar_ranges[dept]()), invalidate=data_version)
         def _plot_calendar(dept=dept):
             # Use data_trigger to refresh the table when it changes
-            data_trigger.get()  # Trigger reactivity
-            calendar = db.read_table("calendar", where=f"department_code = '{dept}'")
+            data_version()  # Trigger reactivity
+            # Events of the visible window and of the prefetched windows around it
+            calendar, (range_x_start, range_x_end) = calendar_windows[dept]()
 
-            # Handle calendar date range
-            try:
-                range_x_start, range_x_end = [datetime.today() - timedelta(weeks=2), datetime.today() + timedelta(weeks=6)]#input[f"calendar_{dept}_data_range_"]()
-                # Transform data range into datetime object
-                range_x_start = datetime(range_x_start.year, range_x_start.month, range_x_start.day)
-                range_x_end = datetime(range_x_end.year, range_x_end.month, range_x_end.day)
-                assert range_x_start is not None and range_x_end is not None
-            except (TypeError, AssertionError) as e:
-                print(e)
-                range_x_start, range_x_end = None, None
-            
             # Ensure that single days events are represented with a visible width
             calendar = calendar.with_columns(
                 pl.when(pl.col("start_date") == pl.col("end_date"))
@@ -803,7 +1416,7 @@ def server(input, output, session):
                 color_discrete_map=dict(zip(events.get_column("name").to_list(), events.get_column("colour").to_list())),
                 text="notes",
                 labels={"event_name": "", "advisor_short_name": ""},
-                range_x=[range_x_start, range_x_end] if range_x_start and range_x_end else None
+                range_x=[range_x_start, range_x_end]
             )
 
             fig.update_xaxes(
@@ -819,61 +1432,27 @@ def server(input, output, session):
             fig.add_vline(x=datetime.today(), line_dash='dot', line_width=2, opacity=1, line_color='black')
             return fig
 
-        @output(id=f"calendar_{dept}_insights_year_filter")
-        @render.ui
-        def _calendar_insights_year_filter(dept=dept):
-            calendar = db.read_table("calendar", where=f"department_code = '{dept}'")
-            years = calendar.select(pl.col("start_date").dt.year().alias("year")).unique().sort("year").to_series().to_list()
-            return ui.input_select(
-                f"calendar_{dept}_insights_year_filter_",
-                "Select Year",
-                choices=years,
-                selected=years[-1] if years else None,
-                width="150px"
-            )
-        
-        @output(id=f"calendar_{dept}_insights_advisor_filter")
-        @render.ui
-        def _calendar_insights_advisor_filter(dept=dept):
-            calendar = db.read_table("calendar", where=f"department_code = '{dept}'")
-            advisors = calendar.select(pl.col("advisor_short_name")).unique().sort("advisor_short_name").to_series().to_list()
-            return ui.input_select(
-                f"calendar_{dept}_insights_advisor_filter_",
-                "Select Advisor",
-                choices=["All"] + advisors,
-                selected="All",
-                width="150px"
-            )
-
         @output(id=f"calendar_{dept}_insights_table")
         @render.ui
         def _calendar_insights_table(dept=dept):
             # Use data_trigger to refresh the table when it changes
-            data_trigger.get()  # Trigger reactivity
-            calendar = db.read_table("calendar", where=f"department_code = '{dept}'")
+            data_version()  # Trigger reactivity
             # Apply filters
             try:
-                selected_year = int(input[f"calendar_{dept}_insights_year_filter_"]())
+                selected_year = int(calendar_filters[dept]()[0])
             except (TypeError, ValueError):
                 selected_year = None
-            selected_advisor = input[f"calendar_{dept}_insights_advisor_filter_"]()
-            if selected_year:
-                calendar = calendar.filter(pl.col("start_date").dt.year() == selected_year)
-            if selected_advisor and selected_advisor != "All":
-                calendar = calendar.filter(pl.col("advisor_short_name") == selected_advisor)
-            
-            # Aggregate data
+            selected_advisor = calendar_filters[dept]()[1]
+            selected_advisors = [selected_advisor] if selected_advisor and selected_advisor != "All" else None
+
+            # Working days per advisor and event type, counted on the occupancy matrix
+            # against the working days of the advisor's duty country (weekends and holidays excluded)
             insights = (
-                calendar
+                occupancy.get_matrix(dept).days_by_event(selected_year, selected_advisors)
+                .sort(["advisor_short_name", "event_name"])
                 .with_columns(
-                    pl.business_day_count(pl.col("start_date").dt.date(), pl.col("end_date").dt.date()).alias("total_business_days"),
-                    pl.col("start_date").dt.year().alias("year"),
+                    (pl.col("total_days") / pl.col("working_days").clip(lower_bound=1) * 100).round(1).alias("percentage_of_year")
                 )
-                .group_by(["year", "advisor_short_name", "event_name"])
-                .agg([pl.sum("total_business_days").alias("total_days")])
-                .sort(["year", "advisor_short_name"])
-            ).with_columns(
-                (pl.col("total_days") / 260 * 100).round(1).alias("percentage_of_year")# Assuming 260 business days in a year
             )
             insights = insights.select([
                 pl.col("advisor_short_name").alias("Advisor"),
@@ -885,35 +1464,21 @@ def server(input, output, session):
             return GT(insights).tab_options(container_height="350px")
         
         @output(id=f"calendar_{dept}_insights_plot")
-        @render_widget
+        @widgets.persistent
+        @figure_cache.cached(f"calendar_{dept}_insights_plot", ("calendar", "advisors", "events", "holidays"), dept=dept, filters=calendar_filters[dept], invalidate=data_version)
         def _calendar_insights_plot(dept=dept):
             # Use data_trigger to refresh the table when it changes
-            data_trigger.get()  # Trigger reactivity
-            calendar = db.read_table("calendar", where=f"department_code = '{dept}'")
+            data_version()  # Trigger reactivity
             # Apply filters
             try:
-                selected_year = int(input[f"calendar_{dept}_insights_year_filter_"]())
+                selected_year = int(calendar_filters[dept]()[0])
             except (TypeError, ValueError):
                 selected_year = None
-            selected_advisor = input[f"calendar_{dept}_insights_advisor_filter_"]()
-            if selected_year:
-                calendar = calendar.filter(pl.col("start_date").dt.year() == selected_year)
-            if selected_advisor and selected_advisor != "All":
-                calendar = calendar.filter(pl.col("advisor_short_name") == selected_advisor)
-            
-            # Aggregate data
-            insights = (
-                calendar
-                .with_columns(
-                    pl.business_day_count(pl.col("start_date").dt.date(), pl.col("end_date").dt.date()).alias("total_business_days"),
-                    pl.col("start_date").dt.year().alias("year"),
-                )
-                .group_by(["year", "advisor_short_name", "event_name"])
-                .agg([pl.sum("total_business_days").alias("total_days")])
-                .sort(["year", "advisor_short_name"])
-            ).with_columns(
-                (pl.col("total_days") / 260 * 100).round(1).alias("percentage_of_year")# Assuming 260 business days in a year
-            )
+            selected_advisor = calendar_filters[dept]()[1]
+            selected_advisors = [selected_advisor] if selected_advisor and selected_advisor != "All" else None
+
+            # Working days per advisor and event type, counted on the occupancy matrix
+            insights = occupancy.get_matrix(dept).days_by_event(selected_year, selected_advisors)
 
             # Get advisors for color mapping
             advisors = db.read_table("advisors", where=f"department_code = '{dept}'")
@@ -931,7 +1496,153 @@ def server(input, output, session):
             fig.update_traces(textposition='inside')
             fig.update_layout(barmode='stack', yaxis={'categoryorder':'total descending'})
             return fig
+
+        @output(id=f"calendar_{dept}_utilisation_heatmap")
+        @widgets.persistent
+        @figure_cache.cached(f"calendar_{dept}_utilisation_heatmap", ("calendar", "events", "advisors", "holidays"), dept=dept, filters=calendar_filters[dept], invalidate=data_version)
+        def _calendar_utilisation_heatmap(dept=dept):
+            # Use data_trigger to refresh the table when it changes
+            data_version()  # Trigger reactivity
+            # Apply filters (the heatmap always shows one year)
+            try:
+                selected_year = int(calendar_filters[dept]()[0])
+            except (TypeError, ValueError):
+                selected_year = date.today().year
+            selected_advisor = calendar_filters[dept]()[1]
+            selected_advisors = [selected_advisor] if selected_advisor and selected_advisor != "All" else None
+
+            # Share of the working days of each month with an event
+            advisors, load = occupancy.get_matrix(dept).monthly_load(selected_year, selected_advisors)
+            if not advisors:
+                return widgets.empty_figure("No advisors to show", title=f"Utilisation per month ({selected_year})")
+            fig = px.imshow(
+                (load * 100).round(0),
+                x=occupancy.MONTHS,
+                y=advisors,
+                zmin=0,
+                zmax=100,
+                color_continuous_scale="Blues",
+                text_auto=True,
+                aspect="auto",
+                labels={"x": "", "y": "", "color": "% busy"},
+                title=f"Utilisation per month ({selected_year})"
+            )
+            return fig
         
+        # ----- Availability
+        availability_filters[dept] = settled_inputs("availability_filters", f"availability_{dept}_advisors_filter_", f"availability_{dept}_range_filter_", f"availability_{dept}_min_days_filter_")
+
+        @output(id=f"availability_{dept}_advisors_table")
+        @render.ui
+        def _availability_advisors_table(dept=dept):
+            # Use data_trigger to refresh the table when it changes
+            data_version()  # Trigger reactivity
+            selected_advisors, (start, end), _ = availability_filters[dept]()
+            if not start or not end:
+                return None
+            advisors, start, end = availability_query(selected_advisors or (), start, end, dept)
+            index = availability.get_index(dept)
+            rows = pl.DataFrame({
+                "Advisor": advisors,
+                "Available": ["Yes" if index.is_free(advisor, start, end) else "No" for advisor in advisors],
+                "Events": [len(index.overlapping(start, end, [advisor])) for advisor in advisors]
+            }, schema={"Advisor": pl.String, "Available": pl.String, "Events": pl.Int64})
+            return GT(rows).tab_header(title="Advisors").tab_options(container_height="350px")
+
+        @output(id=f"availability_{dept}_slots_table")
+        @render.ui
+        def _availability_slots_table(dept=dept):
+            # Use data_trigger to refresh the table when it changes
+            data_version()  # Trigger reactivity
+            selected_advisors, (start, end), min_days = availability_filters[dept]()
+            if not start or not end:
+                return None
+            advisors, start, end = availability_query(selected_advisors or (), start, end, dept)
+            slots = availability.get_index(dept).free_slots(advisors, start, end, timedelta(days=max(int(min_days or 1), 1)))
+            rows = pl.DataFrame({
+                "From": [slot_start.date() for slot_start, _ in slots],
+                "To": [(slot_end - timedelta(days=1)).date() for _, slot_end in slots],
+                "Days": [(slot_end - slot_start).days for slot_start, slot_end in slots]
+            }, schema={"From": pl.Date, "To": pl.Date, "Days": pl.Int64})
+            return GT(rows).tab_header(title="Free for all selected advisors").tab_options(container_height="350px")
+
+        # ----- Capacity
+        capacity_filters[dept] = settled_inputs("capacity_filters", f"capacity_{dept}_year_filter_")
+
+        @output(id=f"capacity_{dept}_heatmap")
+        @widgets.persistent
+        @figure_cache.cached(f"capacity_{dept}_heatmap", ("calendar", "events", "advisors", "holidays", "timesheet"), dept=dept, filters=capacity_filters[dept], invalidate=data_version)
+        def _capacity_heatmap(dept=dept):
+            # Use data_trigger to refresh the plot when it changes
+            data_version()  # Trigger reactivity
+            try:
+                selected_year = int(capacity_filters[dept]()[0])
+            except (TypeError, ValueError):
+                selected_year = date.today().year
+
+            # Logged support hours against available hours, per advisor and week
+            weekly = capacity.weekly_capacity(dept, selected_year)
+            advisors = weekly.get_column("advisor").unique(maintain_order=True).to_list()
+            weeks = weekly.get_column("week").unique().sort().to_list()
+            if not advisors or not weeks:
+                return widgets.empty_figure("No advisors or working weeks to show", title=f"Support load per week ({selected_year})")
+            grid = lambda column: (
+                weekly.pivot(on="week", index="advisor", values=column)
+                .select(["advisor"] + [str(week) for week in weeks])
+                .drop("advisor").rows()
+            )
+            available, logged = grid("available_hours"), grid("logged_hours")
+            fig = px.imshow(
+                # Weeks without available hours stay empty (None) rather than NaN, which can't be sent as JSON
+                [[None if load is None else round(load * 100) for load in row] for row in grid("load")],
+                x=weeks,
+                y=advisors,
+                zmin=0,
+                zmax=100,
+                color_continuous_scale="Blues",
+                aspect="auto",
+                labels={"x": "", "y": "", "color": "% load"}
+            )
+            fig.update_traces(
+                customdata=[[[a, l] for a, l in zip(*row)] for row in zip(available, logged)],
+                hovertemplate="%{y}, week of %{x|%d-%b}<br>Available: %{customdata[0]} h<br>Logged: %{customdata[1]} h<br>Load: %{z}%<extra></extra>"
+            )
+            fig.update_layout(title=f"Support load per week ({selected_year})")
+            return fig
+
+        @output(id=f"capacity_{dept}_table")
+        @render.ui
+        def _capacity_table(dept=dept):
+            # Use data_trigger to refresh the table when it changes
+            data_version()  # Trigger reactivity
+            try:
+                selected_year = int(capacity_filters[dept]()[0])
+            except (TypeError, ValueError):
+                selected_year = date.today().year
+
+            summary = (
+                capacity.weekly_capacity(dept, selected_year)
+                .group_by("advisor")
+                .agg(pl.col("available_hours").sum(), pl.col("logged_hours").sum())
+                .with_columns(
+                    (pl.col("logged_hours") / pl.col("available_hours").clip(lower_bound=capacity.HOURS_PER_DAY) * 100).round(1).alias("load")
+                )
+                .sort("advisor")
+                .select([
+                    pl.col("advisor").alias("Advisor"),
+                    pl.col("available_hours").alias("Available Hours"),
+                    pl.col("logged_hours").round(1).alias("Logged Hours"),
+                    pl.col("load").alias("% Load")
+                ])
+            )
+            return GT(summary).tab_header(title=f"Capacity ({selected_year})").tab_options(container_height="350px")
+
+        @output(id=f"availability_{dept}_api")
+        @render.ui
+        def _availability_api(dept=dept):
+            url = session.dynamic_route(f"availability_{dept}", availability_json(dept))
+            return ui.p(ui.tags.small("API: ", ui.tags.code(f"{url}&start=YYYY-MM-DD&end=YYYY-MM-DD&advisors=A,B&min_days=N")), class_="text-muted")
+
         @output(id=f"add_calendar_{dept}_btn")
         @render.ui
         def _add_calendar_btn(dept=dept):
@@ -965,31 +1676,71 @@ def server(input, output, session):
                 icon=fa.icon_svg("calendar-xmark")
             )
 
-        @output(id=f"calendar_{dept}_table")
-        @render.data_frame
-        def _calendar_table(dept=dept):
-            # Use data_trigger to refresh the table when it changes
-            data_trigger.get()  # Trigger reactivity
-            calendar = db.read_table("calendar", where=f"department_code = '{dept}'").sort(by="id", descending=True)
-            return render.DataGrid(
-                calendar,
-                height="400px",
-                selection_mode="rows"
+        @output(id=f"conflicts_calendar_{dept}_btn")
+        @render.ui
+        def _conflicts_calendar_btn(dept=dept):
+            return ui.input_action_button(
+                f"conflicts_calendar_{dept}_btn_",
+                "Conflicts",
+                class_="btn btn-secondary btn-sm",
+                width="130px",
+                icon=fa.icon_svg("triangle-exclamation")
             )
-        
+
         # Keep a reference to the calendar table for use in other reactive contexts
-        calendar_table_renderers[dept] = _calendar_table
+        calendar_table_renderers[dept], calendar_table_patchers[dept] = paged_grid(f"calendar_{dept}_table", "calendar", dept)
         
+        def add_calendar_series(dept, entry):
+            # Recurring entry: every occurrence validated, checked for double bookings
+            # and inserted in one batch, then a single refresh (see utils/recurrence.py)
+            # A number of occurrences takes precedence over the end date (which defaults to the end of the year)
+            count = input["repeat_count"]()
+            try:
+                rows = recurrence.occurrences(
+                    entry, input["repeat"](), input["repeat_interval"](),
+                    until=None if count else input["repeat_until"](), count=count
+                )
+                errors = validation.validate("calendar", rows)
+                if errors.height:
+                    raise ValueError(" ".join(errors.get_column("message").unique(maintain_order=True).to_list()))
+            except ValueError as e:
+                ui.notification_show(f"Error adding calendar entries: {e}", type="error")
+                return
+
+            overlapping = conflicts.find_series_conflicts(
+                dept, entry["advisor_short_name"], rows.get_column("start_date").dt.date().to_list(), rows.get_column("end_date").dt.date().to_list(),
+                event_name=entry["event_name"]
+            )
+            if overlapping.height > 0 and not input["allow_conflicts"]():
+                ui.notification_show(f"{entry['advisor_short_name']} already has: {conflicts.describe(overlapping)}", type="error")
+                return
+
+            try:
+                ids = recurrence.insert_series(rows)
+                ui.notification_show(f"{len(ids)} calendar entries added successfully for {entry['advisor_short_name']}!", type="success")
+            except Exception as e:
+                ui.notification_show(f"Error adding calendar entries: {e}", type="error")
+            finally:
+                data_trigger.set(data_trigger.get() + 1)
+
         @reactive.Effect
         @reactive.event(input[f"add_calendar_{dept}_btn_"])
         def _(dept=dept):
             ui.modal_show(
                 ui.modal(
-                    ui.input_selectize("advisor_short_name", "Advisor", choices=db.read_table("advisors", where=f"department_code = '{dept}'").select(pl.col("short_name")).to_series().to_list()),
+                    search_selectize("advisor_short_name", "Advisor", "advisors", dept=dept),
                     ui.input_date("start_date", "From", value=date.today()),
                     ui.input_date("end_date", "To", value=date.today()),
                     ui.input_selectize("event_name", "Type", choices=db.read_table("events").get_column("name").unique().to_list()),
                     ui.input_text_area("notes", "Notes", placeholder="Additional details, e.g., country name, workshop title, etc."),
+                    ui.input_select("repeat", "Repeat", choices={"": "Does not repeat", **{key: label for key, (label, _) in recurrence.FREQUENCIES.items()}}),
+                    ui.panel_conditional(
+                        "input.repeat !== ''",
+                        ui.input_numeric("repeat_interval", "Every (days, weeks or months)", value=1, min=1, step=1),
+                        ui.input_date("repeat_until", "Until", value=date(date.today().year, 12, 31)),
+                        ui.input_numeric("repeat_count", "Or number of occurrences", value=None, min=1, max=recurrence.MAX_OCCURRENCES, step=1)
+                    ),
+                    ui.input_checkbox("allow_conflicts", "Save even if it overlaps other events of the advisor", value=False),
                     ui.modal_button("Cancel"),
                     ui.input_action_button(f"add_calendar_{dept}_submit", "Submit", class_="btn btn-primary"),
                     title="Add Calendar Entry",
@@ -1008,17 +1759,36 @@ def server(input, output, session):
             event_name = input["event_name"]()
             notes = input["notes"]()
 
+            if input["repeat"]():
+                add_calendar_series(dept, {
+                    "department_code": dept,
+                    "advisor_short_name": advisor_short_name,
+                    "start_date": start_date,
+                    "end_date": end_date,
+                    "event_name": event_name,
+                    "notes": notes
+                })
+                return
+
+            # Check for double bookings before writing
+            overlapping = conflicts.find_conflicts(dept, advisor_short_name, start_date, end_date, event_name=event_name)
+            if overlapping.height > 0 and not input["allow_conflicts"]():
+                ui.notification_show(f"{advisor_short_name} already has: {conflicts.describe(overlapping)}", type="error")
+                return
+
             try:
-                db.insert_row(
-                    "calendar", {
-                        "department_code": dept,
-                        "advisor_short_name": advisor_short_name,
-                        "start_date": start_date,
-                        "end_date": end_date,
-                        "event_name": event_name,
-                        "notes": notes
-                    }
-                )
+                new_entry = {
+                    "department_code": dept,
+                    "advisor_short_name": advisor_short_name,
+                    "start_date": start_date,
+                    "end_date": end_date,
+                    "event_name": event_name,
+                    "notes": notes
+                }
+                validation.check_row("calendar", new_entry)
+                new_id = db.insert_row("calendar", new_entry)
+                calendar_table_patchers[dept]("insert", new_id)
+                availability.apply(dept, "insert", new_id)
                 ui.notification_show(f"Calendar entry added successfully for {advisor_short_name}!", type="success")
             except Exception as e:
                 ui.notification_show(f"Error adding calendar entry: {e}", type="error")
@@ -1040,11 +1810,12 @@ def server(input, output, session):
                 id_to_edit = selected_rows.get_column("id").to_list()[0]
                 ui.modal_show(
                     ui.modal(
-                        ui.input_selectize("edit_advisor_short_name", "Advisor", choices=db.read_table("advisors", where=f"department_code = '{dept}'").select(pl.col("short_name")).to_series().to_list(), selected=selected_rows.get_column("advisor_short_name").to_list()[0]),
+                        search_selectize("edit_advisor_short_name", "Advisor", "advisors", dept=dept, selected=selected_rows.get_column("advisor_short_name").to_list()[0]),
                         ui.input_date("edit_start_date", "From", value=selected_rows.get_column("start_date").to_list()[0].date()),
                         ui.input_date("edit_end_date", "To", value=selected_rows.get_column("end_date").to_list()[0].date()),
                         ui.input_selectize("edit_event_name", "Type", choices=db.read_table("events").get_column("name").unique().to_list(), selected=selected_rows.get_column("event_name").to_list()[0]),
                         ui.input_text_area("edit_notes", "Notes", value=selected_rows.get_column("notes").to_list()[0], placeholder="Additional details, e.g., country name, workshop title, etc."),
+                        ui.input_checkbox("edit_allow_conflicts", "Save even if it overlaps other events of the advisor", value=False),
                         ui.modal_button("Cancel"),
                         ui.input_action_button(f"edit_calendar_{dept}_submit", "Submit", class_="btn btn-primary"),
                         title="Edit Calendar Entry",
@@ -1064,18 +1835,24 @@ def server(input, output, session):
                 event_name = input["edit_event_name"]()
                 notes = input["edit_notes"]()
 
+                # Check for double bookings before writing
+                overlapping = conflicts.find_conflicts(dept, advisor_short_name, start_date, end_date, exclude_id=id_to_edit, event_name=event_name)
+                if overlapping.height > 0 and not input["edit_allow_conflicts"]():
+                    ui.notification_show(f"{advisor_short_name} already has: {conflicts.describe(overlapping)}", type="error")
+                    return
+
                 try:
-                    db.update_row(
-                        "calendar",
-                        {
-                            "advisor_short_name": advisor_short_name,
-                            "start_date": start_date,
-                            "end_date": end_date,
-                            "event_name": event_name,
-                            "notes": notes
-                        },
-                        where=f"id = {id_to_edit}"
-                    )
+                    updated_entry = {
+                        "advisor_short_name": advisor_short_name,
+                        "start_date": start_date,
+                        "end_date": end_date,
+                        "event_name": event_name,
+                        "notes": notes
+                    }
+                    validation.check_row("calendar", updated_entry)
+                    db.update_row("calendar", updated_entry, where=f"id = {id_to_edit}")
+                    calendar_table_patchers[dept]("update", id_to_edit)
+                    availability.apply(dept, "update", id_to_edit)
                     ui.notification_show(f"Calendar entry updated successfully for {advisor_short_name}!", type="success")
                 except Exception as e:
                     ui.notification_show(f"Error updating calendar entry: {e}", type="error")
@@ -1096,9 +1873,11 @@ def server(input, output, session):
             try:
                 id_to_delete = selected_rows.get_column("id").to_list()[0]
                 advisor_short_name = selected_rows.get_column("advisor_short_name").to_list()[0]
+                series_id = selected_rows.get_column("series_id").to_list()[0] if "series_id" in selected_rows.columns else None
                 ui.modal_show(
                     ui.modal(
                         ui.p(f"Are you sure you want to delete the calendar entry for {advisor_short_name}?"),
+                        ui.input_checkbox(f"delete_calendar_{dept}_series", "Delete every occurrence of this recurring entry", value=False) if series_id is not None else None,
                         ui.modal_button("Cancel"),
                         ui.input_action_button(f"delete_calendar_{dept}_submit", "Delete", class_="btn btn-danger"),
                         title="Confirm Deletion",
@@ -1112,56 +1891,66 @@ def server(input, output, session):
             
             @reactive.Effect
             @reactive.event(input[f"delete_calendar_{dept}_submit"])
-            def _(id_to_delete=id_to_delete, advisor_short_name=advisor_short_name):
+            def _(id_to_delete=id_to_delete, advisor_short_name=advisor_short_name, series_id=series_id):
+                whole_series = series_id is not None and input[f"delete_calendar_{dept}_series"]()
                 ui.modal_remove()
                 try:
+                    if whole_series:
+                        # The grid and the availability index reload once on the next refresh
+                        db.delete_row("calendar", where=f"series_id = {int(series_id)} AND department_code = '{dept}'")
+                        ui.notification_show(f"Recurring calendar entry deleted successfully for {advisor_short_name}!", type="success")
+                        return
                     db.delete_row(
                         "calendar",
                         where=f"id = {id_to_delete}"
                     )
+                    calendar_table_patchers[dept]("delete", id_to_delete)
+                    availability.apply(dept, "delete", id_to_delete)
                     ui.notification_show(f"Calendar entry deleted successfully for {advisor_short_name}!", type="success")
                 except Exception as e:
                     ui.notification_show(f"Error deleting calendar entry: {e}", type="error")
                 finally:
                     data_trigger.set(data_trigger.get() + 1)
 
-        # ----- Country Support
-        @output(id=f"support_{dept}_overall_year_filter")
-        @render.ui
-        def _support_overall_year_filter(dept=dept):
-            timesheet = db.read_table("timesheet", where=f"department_code = '{dept}'")
-            years = timesheet.select(pl.col("date").dt.year().alias("year")).unique().sort("year").to_series().to_list()
-            return ui.input_select(
-                f"support_{dept}_overall_year_filter_",
-                "Select Year",
-                choices=years,
-                selected=years[-1] if years else None,
-                width="150px"
+        @reactive.Effect
+        @reactive.event(input[f"conflicts_calendar_{dept}_btn_"])
+        def _(dept=dept):
+            # Report of all double bookings of the department
+            report = conflicts.scan_conflicts(dept).select([
+                pl.col("advisor").alias("Advisor"),
+                pl.col("overlap_start").alias("From"),
+                pl.col("overlap_end").alias("To"),
+                pl.col("event_name").alias("Event"),
+                pl.col("other_event_name").alias("Overlapping event"),
+                pl.col("id").alias("Id"),
+                pl.col("other_id").alias("Overlapping id")
+            ])
+            ui.modal_show(
+                ui.modal(
+                    ui.p(f"{report.height} overlapping pair(s) of events found.") if report.height else ui.p("No overlapping events found."),
+                    ui.HTML(GT(report).tab_options(container_height="500px").as_raw_html()) if report.height else None,
+                    title="Calendar Conflicts",
+                    size="xl",
+                    easy_close=True,
+                    fade=True
+                )
             )
 
+        # ----- Country Support
         @output(id=f"support_{dept}_plot")
-        @render_widget
+        @widgets.persistent
+        @figure_cache.cached(f"support_{dept}_plot", ("timesheet", "support"), dept=dept, filters=support_overview_filters[dept], invalidate=data_version)
         def _plot_support_overview(dept=dept):
             # Use data_trigger to refresh the table when it changes
-            data_trigger.get()  # Trigger reactivity
-            timesheet = db.read_table("timesheet", where=f"department_code = '{dept}'")
-
+            data_version()  # Trigger reactivity
             # Apply year filter
-            selected_year = int(input[f"support_{dept}_overall_year_filter_"]())
-            timesheet = timesheet.filter(pl.col("date").dt.year() == selected_year)
+            selected_year = int(support_overview_filters[dept]()[0])
 
-            # Transform country_name to handle multiple countries
-            timesheet = (
-                timesheet
-                .with_columns(pl.col("country_name").str.split(", "))
-                .explode("country_name")
-            )
-            
-            # Aggregate data
+            # Hours by country and type of support, sliced from the timesheet cube
+            # (a session with several countries counts for each of them)
             aggregated_data = (
-                timesheet
-                .group_by(["country_name","support_name"])
-                .agg(pl.col("hours").sum().alias("total_hours"))
+                cube.get_cube(dept).aggregate(["country", "support"], year=selected_year)
+                .rename({"country": "country_name", "support": "support_name", "hours": "total_hours"})
             )
 
             # Map colors
@@ -1182,65 +1971,21 @@ def server(input, output, session):
 
             return fig
         
-        @output(id=f"support_{dept}_insights_year_filter")
-        @render.ui
-        def _support_insights_year_filter(dept=dept):
-            timesheet = db.read_table("timesheet", where=f"department_code = '{dept}'")
-            years = timesheet.select(pl.col("date").dt.year().alias("year")).unique().sort("year").to_series().to_list()
-            return ui.input_select(
-                f"support_{dept}_insights_year_filter_",
-                "Select Year",
-                choices=years,
-                selected=years[-1] if years else None,
-                width="150px"
-            )
-        
-        @output(id=f"support_{dept}_insights_country_filter")
-        @render.ui
-        def _support_insights_country_filter(dept=dept):
-            timesheet = db.read_table("timesheet", where=f"department_code = '{dept}'")
-            countries = timesheet.select(pl.col("country_name").str.split(", ")).explode("country_name").unique().sort("country_name").to_series().to_list()
-            
-            return ui.input_select(
-                f"support_{dept}_insights_country_filter_",
-                "Select Country",
-                choices=["All"] + countries,
-                selected="All",
-                width="150px"
-            )
-        
         @output(id=f"support_{dept}_insights_timeline")
-        @render_widget
+        @widgets.persistent
+        @figure_cache.cached(f"support_{dept}_insights_timeline", ("timesheet",), dept=dept, filters=support_filters[dept], invalidate=data_version)
         def _support_insights_timeline(dept=dept):
             # Use data_trigger to refresh the table when it changes
-            data_trigger.get()  # Trigger reactivity
-            timesheet = db.read_table("timesheet", where=f"department_code = '{dept}'")
-
+            data_version()  # Trigger reactivity
             # Apply filters
-            selected_year = int(input[f"support_{dept}_insights_year_filter_"]())
-            selected_country = input[f"support_{dept}_insights_country_filter_"]()
-            if selected_year:
-                timesheet = timesheet.filter(pl.col("date").dt.year() == selected_year)
-            if selected_country and selected_country != "All":
-                # Transform country_name to handle multiple countries
-                timesheet = (
-                    timesheet
-                    .with_columns(pl.col("country_name").str.split(", "))
-                    .explode("country_name")
-                )
-                timesheet = timesheet.filter(pl.col("country_name") == selected_country)
+            selected_year = int(support_filters[dept]()[0])
+            selected_country = support_filters[dept]()[1]
+            filters = support_cube_filters(selected_year, selected_country)
 
-            # Extract month
-            timesheet = timesheet.with_columns(pl.col("date").dt.month().alias("month"))
-            
             # Aggregate data
             MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-            insights = (
-                timesheet
-                .group_by(["month"])
-                .agg(pl.col("hours").sum().alias("total_hours"))
-            )            
-            
+            insights = cube.get_cube(dept).aggregate(["month"], **filters).rename({"hours": "total_hours"})
+
             fig = px.bar(
                 insights,
                 x="month",
@@ -1254,30 +1999,20 @@ def server(input, output, session):
             return fig
         
         @output(id=f"support_{dept}_insights_pie_chart")
-        @render_widget
+        @widgets.persistent
+        @figure_cache.cached(f"support_{dept}_insights_pie_chart", ("timesheet",), dept=dept, filters=support_filters[dept], invalidate=data_version)
         def _support_insights_pie_chart(dept=dept):
             # Use data_trigger to refresh the table when it changes
-            data_trigger.get()  # Trigger reactivity
-            timesheet = db.read_table("timesheet", where=f"department_code = '{dept}'")
+            data_version()  # Trigger reactivity
             # Apply filters
-            selected_year = int(input[f"support_{dept}_insights_year_filter_"]())
-            selected_country = input[f"support_{dept}_insights_country_filter_"]()
-            if selected_year:
-                timesheet = timesheet.filter(pl.col("date").dt.year() == selected_year)
-            if selected_country and selected_country != "All":
-                # Transform country_name to handle multiple countries
-                timesheet = (
-                    timesheet
-                    .with_columns(pl.col("country_name").str.split(", "))
-                    .explode("country_name")
-                )
-                timesheet = timesheet.filter(pl.col("country_name") == selected_country)            
+            selected_year = int(support_filters[dept]()[0])
+            selected_country = support_filters[dept]()[1]
+            filters = support_cube_filters(selected_year, selected_country)
 
             # Aggregate data
             insights = (
-                timesheet
-                .group_by(["support_name"])
-                .agg(pl.col("hours").sum().alias("total_hours"))
+                cube.get_cube(dept).aggregate(["support"], **filters)
+                .rename({"support": "support_name", "hours": "total_hours"})
                 .sort("total_hours", descending=True)
             )
 
@@ -1293,38 +2028,20 @@ def server(input, output, session):
             return fig
         
         @output(id=f"support_{dept}_insights_advisors_plot")
-        @render_widget
+        @widgets.persistent
+        @figure_cache.cached(f"support_{dept}_insights_advisors_plot", ("timesheet", "advisors"), dept=dept, filters=support_filters[dept], invalidate=data_version)
         def _support_insights_advisors_plot(dept=dept):
             # Use data_trigger to refresh the table when it changes
-            data_trigger.get()  # Trigger reactivity
-            timesheet = db.read_table("timesheet", where=f"department_code = '{dept}'")
+            data_version()  # Trigger reactivity
             # Apply filters
-            selected_year = int(input[f"support_{dept}_insights_year_filter_"]())
-            selected_country = input[f"support_{dept}_insights_country_filter_"]()
-            if selected_year:
-                timesheet = timesheet.filter(pl.col("date").dt.year() == selected_year)
-            if selected_country and selected_country != "All":
-                # Transform country_name to handle multiple countries
-                timesheet = (
-                    timesheet
-                    .with_columns(pl.col("country_name").str.split(", "))
-                    .explode("country_name")
-                )
-                timesheet = timesheet.filter(pl.col("country_name") == selected_country)            
-
-            # Transform sal_attendees to handle multiple advisors
-            timesheet = (
-                timesheet
-                .with_columns(pl.col("sal_attendees").str.split(", "))
-                .explode("sal_attendees")
-            )
+            selected_year = int(support_filters[dept]()[0])
+            selected_country = support_filters[dept]()[1]
+            filters = support_cube_filters(selected_year, selected_country)
 
-            # Aggregate data
+            # Aggregate data (a session with several advisors counts for each of them)
             insights = (
-                timesheet
-                .group_by(["sal_attendees"])
-                .agg(pl.col("hours").sum().alias("total_hours"))
-                # .sort("total_hours", descending=True)
+                cube.get_cube(dept).aggregate(["advisor"], **filters)
+                .rename({"advisor": "sal_attendees", "hours": "total_hours"})
             )
 
             # Get advisors for color mapping
@@ -1379,20 +2096,136 @@ def server(input, output, session):
                 icon=fa.icon_svg("calendar-xmark")
             )
 
-        @output(id=f"timesheet_{dept}_table")
+        @output(id=f"bulk_timesheet_{dept}_btn")
+        @render.ui
+        def _bulk_timesheet_btn(dept=dept):
+            return ui.input_action_button(
+                f"bulk_timesheet_{dept}_btn_",
+                "Bulk add",
+                class_="btn btn-success btn-sm",
+                width="130px",
+                icon=fa.icon_svg("table-list")
+            )
+
+        # Keep a reference to the timesheet table for use in other reactive contexts
+        timesheet_table_renderers[dept], timesheet_table_patchers[dept] = paged_grid(f"timesheet_{dept}_table", "timesheet", dept)
+
+        # Bulk entry: many sessions uploaded or pasted at once, validated and previewed
+        # as one batch, then saved in a single transaction with a single refresh
+        bulk_timesheet_batches[dept] = reactive.Value(None)
+
+        @reactive.Effect
+        @reactive.event(input[f"bulk_timesheet_{dept}_btn_"])
+        def _(dept=dept):
+            bulk_timesheet_batches[dept].set(None)
+            ui.modal_show(
+                ui.modal(
+                    ui.p(f"One row per session with the columns: {', '.join(bulk_entry.COLUMNS)} (country_attendees, description and hours are optional). "
+                         "Countries and advisors are comma separated lists."),
+                    ui.input_file(f"bulk_timesheet_{dept}_file", "Upload a file", accept=[".csv", ".tsv", ".txt", ".xlsx"], width="100%"),
+                    ui.input_text_area(
+                        f"bulk_timesheet_{dept}_paste", "Or paste rows copied from a spreadsheet, header row included",
+                        placeholder="\t".join(bulk_entry.COLUMNS), rows=6, width="100%"
+                    ),
+                    ui.input_action_button(f"bulk_timesheet_{dept}_preview", "Preview", class_="btn btn-secondary btn-sm"),
+                    ui.output_ui(f"bulk_timesheet_{dept}_summary"),
+                    ui.output_data_frame(f"bulk_timesheet_{dept}_grid"),
+                    ui.modal_button("Cancel"),
+                    ui.input_action_button(f"bulk_timesheet_{dept}_submit", "Save rows", class_="btn btn-primary"),
+                    title="Bulk Add Timesheet Entries",
+                    size="xl",
+                    easy_close=True,
+                    fade=True,
+                    footer=None
+                )
+            )
+
+        def read_bulk_timesheet(dept=dept):
+            # Rows and errors of the pasted rows, which take precedence over the uploaded file (None without either)
+            pasted = input[f"bulk_timesheet_{dept}_paste"]().strip()
+            files = input[f"bulk_timesheet_{dept}_file"]()
+            if pasted:
+                return bulk_entry.prepare(bulk_entry.read(pasted), dept)
+            if files:
+                return bulk_entry.prepare(bulk_entry.read(files[0]["datapath"], files[0]["name"]), dept)
+            return None
+
+        @reactive.Effect
+        @reactive.event(input[f"bulk_timesheet_{dept}_preview"], input[f"bulk_timesheet_{dept}_file"])
+        def _(dept=dept):
+            try:
+                batch = read_bulk_timesheet(dept)
+                if batch is None:
+                    ui.notification_show("Upload a file or paste rows first.", type="warning")
+                bulk_timesheet_batches[dept].set(batch)
+            except Exception as e:
+                bulk_timesheet_batches[dept].set(None)
+                ui.notification_show(f"Error reading rows: {e}", type="error")
+
+        @output(id=f"bulk_timesheet_{dept}_summary")
+        @render.ui
+        def _(dept=dept):
+            batch = bulk_timesheet_batches[dept]()
+            if batch is None:
+                return None
+            rows, errors = batch
+            if errors.height:
+                return ui.div(
+                    ui.p(f"{errors.get_column('row').n_unique()} of {rows.height} row(s) have errors, fix them and preview again:"),
+                    ui.tags.ul([ui.tags.li(line) for line in validation.describe(errors, first_row=1)]),
+                    class_="text-danger"
+                )
+            return ui.p(f"{rows.height} row(s) ready to save.", class_="text-success")
+
+        @output(id=f"bulk_timesheet_{dept}_grid")
         @render.data_frame
-        def _timesheet_table(dept=dept):
-            # Use data_trigger to refresh the table when it changes
-            data_trigger.get()  # Trigger reactivity
-            timesheet = db.read_table("timesheet", where=f"department_code = '{dept}'").sort(by="id", descending=True)
+        def _(dept=dept):
+            batch = bulk_timesheet_batches[dept]()
+            req(batch is not None)
+            rows, errors = batch
+            invalid = errors.get_column("row").unique().to_list()
             return render.DataGrid(
-                timesheet,
-                height="400px",
-                selection_mode="rows"
+                bulk_entry.preview(rows, errors),
+                height="300px",
+                width="100%",
+                styles=[{"rows": invalid, "style": {"background-color": "#f8d7da"}}] if invalid else None
             )
-        
-        # Keep a reference to the timesheet table for use in other reactive contexts
-        timesheet_table_renderers[dept] = _timesheet_table
+
+        @reactive.Effect
+        @reactive.event(input[f"bulk_timesheet_{dept}_submit"])
+        def _(dept=dept):
+            previewed = bulk_timesheet_batches[dept]()
+            if previewed is None or previewed[0].is_empty():
+                ui.notification_show("Preview the rows to save first.", type="warning")
+                return
+            # Validated again: the rows may have been edited, or the advisors and
+            # support types changed, since the preview
+            try:
+                batch = read_bulk_timesheet(dept)
+            except Exception as e:
+                bulk_timesheet_batches[dept].set(None)
+                ui.notification_show(f"Error reading rows: {e}", type="error")
+                return
+            bulk_timesheet_batches[dept].set(batch)
+            if batch is None or batch[0].is_empty():
+                ui.notification_show("Upload a file or paste rows first.", type="warning")
+                return
+            rows, errors = batch
+            if errors.height:
+                ui.notification_show("Fix the rows with errors before saving.", type="error")
+                return
+            if not rows.equals(previewed[0]):
+                ui.notification_show("The rows changed since the preview, check them and save again.", type="warning")
+                return
+            try:
+                ids = bulk_entry.save(rows)
+            except Exception as e:
+                ui.notification_show(f"Error adding timesheet entries: {e}", type="error")
+                return
+            bulk_timesheet_batches[dept].set(None)
+            ui.modal_remove()
+            ui.notification_show(f"{len(ids)} timesheet entries added successfully!", type="success")
+            data_trigger.set(data_trigger.get() + 1)
 
         @reactive.Effect
         @reactive.event(input[f"add_timesheet_{dept}_btn_"])
@@ -1400,8 +2233,8 @@ def server(input, output, session):
             ui.modal_show(
                 ui.modal(
                     ui.input_date("date", "Date", value=date.today()),
-                    ui.input_selectize("country_name", "Country(ies)", choices=db.read_table("countries").select(pl.col("name")).to_series().to_list(), multiple=True),
-                    ui.input_selectize("sal_attendees", "Advisor(s)", choices=db.read_table("advisors", where=f"department_code = '{dept}' AND active = 'true'").select(pl.col("short_name")).to_series().to_list(), multiple=True),
+                    search_selectize("country_name", "Country(ies)", "countries", multiple=True),
+                    search_selectize("sal_attendees", "Advisor(s)", "active_advisors", dept=dept, multiple=True),
                     ui.input_text_area("country_attendees", "Country Attendee(s)", placeholder="Comma separated list of names"),
                     ui.input_selectize("support_name", "Type of Support", choices=db.read_table("support").select(pl.col("name")).to_series().to_list()),
                     ui.input_text_area("description", "Description", placeholder="Additional details, e.g., monthly catch-up, training topics, etc."),
@@ -1427,18 +2260,19 @@ def server(input, output, session):
             hours = input["hours"]()
 
             try:
-                db.insert_row(
-                    "timesheet", {
-                        "department_code": dept,
-                        "date": date,
-                        "country_name": country_name,
-                        "sal_attendees": sal_attendees,
-                        "country_attendees": country_attendees,
-                        "support_name": support_name,
-                        "description": description,
-                        "hours": hours
-                    }
-                )
+                new_entry = {
+                    "department_code": dept,
+                    "date": date,
+                    "country_name": country_name,
+                    "sal_attendees": sal_attendees,
+                    "country_attendees": country_attendees,
+                    "support_name": support_name,
+                    "description": description,
+                    "hours": hours
+                }
+                validation.check_row("timesheet", new_entry)
+                new_id = db.insert_row("timesheet", new_entry)
+                timesheet_table_patchers[dept]("insert", new_id)
                 ui.notification_show(f"Timesheet entry added successfully for {sal_attendees}!", type="success")
             except Exception as e:
                 ui.notification_show(f"Error adding timesheet entry: {e}", type="error")
@@ -1461,8 +2295,8 @@ def server(input, output, session):
                 ui.modal_show(
                     ui.modal(
                         ui.input_date("edit_date", "Date", value=selected_rows.get_column("date").to_list()[0].date()),
-                        ui.input_selectize("edit_country_name", "Country(ies)", choices=db.read_table("countries").select(pl.col("name")).to_series().to_list(), multiple=True, selected=selected_rows.get_column("country_name").to_list()[0].split(", ")),
-                        ui.input_selectize("edit_sal_attendees", "Advisor(s)", choices=db.read_table("advisors", where=f"department_code = '{dept}' AND active = 'true'").select(pl.col("short_name")).to_series().to_list(), multiple=True, selected=selected_rows.get_column("sal_attendees").to_list()[0].split(", ")),
+                        search_selectize("edit_country_name", "Country(ies)", "countries", multiple=True, selected=selected_rows.get_column("country_name").to_list()[0].split(", ")),
+                        search_selectize("edit_sal_attendees", "Advisor(s)", "active_advisors", dept=dept, multiple=True, selected=selected_rows.get_column("sal_attendees").to_list()[0].split(", ")),
                         ui.input_text_area("edit_country_attendees", "Country Attendee(s)", placeholder="Comma separated list of names", value=selected_rows.get_column("country_attendees").to_list()[0]),
                         ui.input_selectize("edit_support_name", "Type of Support", choices=db.read_table("support").select(pl.col("name")).to_series().to_list(), selected=selected_rows.get_column("support_name").to_list()[0]),
                         ui.input_text_area("edit_description", "Description", placeholder="Additional details, e.g., monthly catch-up, training topics, etc.", value=selected_rows.get_column("description").to_list()[0]),
@@ -1490,19 +2324,18 @@ def server(input, output, session):
                 hours = input["edit_hours"]()
 
                 try:
-                    db.update_row(
-                        "timesheet",
-                        {
-                            "date": date,
-                            "country_name": country_name,
-                            "sal_attendees": sal_attendees,
-                            "country_attendees": country_attendees,
-                            "support_name": support_name,
-                            "description": description,
-                            "hours": hours
-                        },
-                        where=f"id = {id_to_edit}"
-                    )
+                    updated_entry = {
+                        "date": date,
+                        "country_name": country_name,
+                        "sal_attendees": sal_attendees,
+                        "country_attendees": country_attendees,
+                        "support_name": support_name,
+                        "description": description,
+                        "hours": hours
+                    }
+                    validation.check_row("timesheet", updated_entry)
+                    db.update_row("timesheet", updated_entry, where=f"id = {id_to_edit}")
+                    timesheet_table_patchers[dept]("update", id_to_edit)
                     ui.notification_show(f"Timesheet entry updated successfully!", type="success")
                 except Exception as e:
                     ui.notification_show(f"Error updating timesheet entry: {e}", type="error")
@@ -1547,6 +2380,7 @@ def server(input, output, session):
                         "timesheet",
                         where=f"id = {id_to_delete}"
                     )
+                    timesheet_table_patchers[dept]("delete", id_to_delete)
                     ui.notification_show(f"Timesheet entry deleted successfully for {country_name}!", type="success")
                 except Exception as e:
                     ui.notification_show(f"Error deleting timesheet entry: {e}", type="error")
@@ -1555,10 +2389,11 @@ def server(input, output, session):
         
         # ---- Countries
         @output(id=f"allocations_{dept}_map")
-        @render_widget
+        @widgets.persistent
+        @figure_cache.cached(f"allocations_{dept}_map", ("countries", "advisors"), dept=dept, filters=date.today, invalidate=data_version)
         def _allocations_map(dept=dept):
             # Use data_trigger to refresh the table when it changes
-            data_trigger.get()  # Trigger reactivity
+            data_version()  # Trigger reactivity
             countries = db.read_table("countries")
             advisors = db.read_table("advisors", where=f"department_code = '{dept}' AND active = 'true'")
                         
@@ -1586,29 +2421,16 @@ def server(input, output, session):
 
             return fig
         
-        @output(id=f"country_focals_{dept}_country_filter")
-        @render.ui
-        def _country_focals_country_filter(dept=dept):
-            country_focals = db.read_table("country_focals", where=f"department_code = '{dept}'")
-            countries = country_focals.select(pl.col("country_name")).unique().sort("country_name").to_series().to_list()
-            return ui.input_select(
-                f"country_focals_{dept}_country_filter_",
-                "Select Country",
-                choices=["All"] + countries,
-                selected="All",
-                width="150px"
-            )
-
         @output(id=f"country_focals_{dept}_table")
         @render.ui
         def _country_focals_table(dept=dept):
             # Use data_trigger to refresh the table when it changes
-            data_trigger.get()  # Trigger reactivity
+            data_version()  # Trigger reactivity
 
             country_focals = db.read_table("country_focals", where=f"department_code = '{dept}'")
 
             # Apply country filter            
-            selected_country = input[f"country_focals_{dept}_country_filter_"]()
+            selected_country = country_focals_filters[dept]()[0]
             if selected_country and selected_country != "All":
                 country_focals = country_focals.filter(pl.col("country_name") == selected_country) 
 
@@ -1653,20 +2475,8 @@ def server(input, output, session):
                 icon=fa.icon_svg("calendar-xmark")
             )
 
-        @output(id=f"country_focals_{dept}_table_editable")
-        @render.data_frame
-        def _country_focals_table_editable(dept=dept):
-            # Use data_trigger to refresh the table when it changes
-            data_trigger.get()  # Trigger reactivity
-            country_focals = db.read_table("country_focals", where=f"department_code = '{dept}'")
-            return render.DataGrid(
-                country_focals,
-                height="400px",
-                selection_mode="rows"
-            )
-        
         # Keep a reference to the country focals table for use in other reactive contexts
-        country_focals_table_renderers[dept] = _country_focals_table_editable
+        country_focals_table_renderers[dept], country_focals_table_patchers[dept] = paged_grid(f"country_focals_{dept}_table_editable", "country_focals", dept)
 
         @reactive.Effect
         @reactive.event(input[f"add_country_focal_{dept}_btn_"])
@@ -1674,7 +2484,7 @@ def server(input, output, session):
             ui.modal_show(
                 ui.modal(
                     ui.input_text("name", "Name"),
-                    ui.input_selectize("country_name", "Country", choices=db.read_table("countries").select(pl.col("name")).to_series().to_list()),
+                    search_selectize("country_name", "Country", "countries"),
                     ui.input_text("role", "Role/Title"),
                     ui.input_text("email", "Email"),
                     ui.modal_button("Cancel"),
@@ -1698,12 +2508,7 @@ def server(input, output, session):
             }
 
             try:
-                if not new_focal["name"] or not new_focal["country_name"]:
-                    ui.notification_show("Error adding focal point: Name and Country are required fields.", type="error")
-                    raise ValueError("Name and Country are required fields.")
-                if not re.match(r"[^@]+@[^@]+\.[^@]+", new_focal["email"]):
-                    ui.notification_show(f"Error adding focal point: Email must be a valid email address.", type="error")
-                    raise ValueError("Email must be a valid email address.")
+                validation.check_row("country_focals", new_focal)
             except ValueError as ve:
                 ui.notification_show(f"Error adding focal point: {ve}", type="error")
                 return
@@ -1711,7 +2516,8 @@ def server(input, output, session):
                 ui.modal_remove()
                 data_trigger.set(data_trigger.get() + 1)
             
-            db.insert_row("country_focals", new_focal)
+            new_id = db.insert_row("country_focals", new_focal)
+            country_focals_table_patchers[dept]("insert", new_id)
         
         @reactive.Effect
         @reactive.event(input[f"edit_country_focal_{dept}_btn_"])
@@ -1729,7 +2535,7 @@ def server(input, output, session):
                 ui.modal_show(
                     ui.modal(
                         ui.input_text("edit_name", "Name", value=selected_rows.get_column("name").to_list()[0]),
-                        ui.input_selectize("edit_country_name", "Country", choices=db.read_table("countries").select(pl.col("name")).to_series().to_list(), selected=selected_rows.get_column("country_name").to_list()[0]),
+                        search_selectize("edit_country_name", "Country", "countries", selected=selected_rows.get_column("country_name").to_list()[0]),
                         ui.input_text("edit_role", "Role/Title", value=selected_rows.get_column("role").to_list()[0]),
                         ui.input_text("edit_email", "Email", value=selected_rows.get_column("email").to_list()[0]),
                         ui.modal_button("Cancel"),
@@ -1754,13 +2560,9 @@ def server(input, output, session):
                 }
 
                 try:
-                    if not updated_focal["name"] or not updated_focal["country_name"]:
-                        ui.notification_show("Error adding focal point: Name and Country are required fields.", type="error")
-                        raise ValueError("Name and Country are required fields.")
-                    if not re.match(r"[^@]+@[^@]+\.[^@]+", updated_focal["email"]):
-                        ui.notification_show(f"Error adding focal point: Email must be a valid email address.", type="error")
-                        raise ValueError("Email must be a valid email address.")          
+                    validation.check_row("country_focals", updated_focal)
                     db.update_row("country_focals", updates=updated_focal, where=f"id = {id_to_edit}")
+                    country_focals_table_patchers[dept]("update", id_to_edit)
                     ui.notification_show(f"Country focal entry updated successfully!", type="success")
                 except Exception as e:
                     ui.notification_show(f"Error updating country focal entry: {e}", type="error")
@@ -1805,6 +2607,7 @@ def server(input, output, session):
                         "country_focals",
                         where=f"id = {id_to_delete}"
                     )
+                    country_focals_table_patchers[dept]("delete", id_to_delete)
                     ui.notification_show(f"Country focal entry deleted successfully for {country_name}!", type="success")
                 except Exception as e:
                     ui.notification_show(f"Error deleting country focal entry: {e}", type="error")
@@ -1812,44 +2615,17 @@ def server(input, output, session):
                     data_trigger.set(data_trigger.get() + 1)
 
         #  ----- Proposals
-        @output(id=f"proposal_{dept}_insights_year_filter")
-        @render.ui
-        def _proposal_insights_year_filter(dept=dept):
-            proposals = db.read_table("proposals", where=f"department_code = '{dept}'")
-            years = proposals.select(pl.col("date_submission").dt.year().alias("year")).unique().sort("year").to_series().to_list()
-            return ui.input_select(
-                f"proposal_{dept}_insights_year_filter_",
-                "Select Year",
-                choices=years,
-                selected=years[-1] if years else None,
-                width="150px"
-            )
-        
-        @output(id=f"proposal_{dept}_insights_country_filter")
-        @render.ui
-        def _proposal_insights_country_filter(dept=dept):
-            selected_year = int(input[f"proposal_{dept}_insights_year_filter_"]())
-            proposals = db.read_table("proposals", where=f"department_code = '{dept}'")
-            countries = proposals.filter(pl.col("date_submission").dt.year() == selected_year).select(pl.col("country_name")).unique().sort("country_name").to_series().to_list()
-            
-            return ui.input_select(
-                f"proposal_{dept}_insights_country_filter_",
-                "Select Country",
-                choices=["All"] + countries,
-                selected="All",
-                width="150px"
-            )
-        
         @output(id=f"proposal_{dept}_insights_timeline")
-        @render_widget
+        @widgets.persistent
+        @figure_cache.cached(f"proposal_{dept}_insights_timeline", ("proposals",), dept=dept, filters=proposal_filters[dept], invalidate=data_version)
         def _proposal_insights_timeline(dept=dept):
             # Use data_trigger to refresh the table when it changes
-            data_trigger.get()  # Trigger reactivity
+            data_version()  # Trigger reactivity
             proposals = db.read_table("proposals", where=f"department_code = '{dept}'")
 
             # Apply filters
-            selected_year = int(input[f"proposal_{dept}_insights_year_filter_"]())
-            selected_country = input[f"proposal_{dept}_insights_country_filter_"]()
+            selected_year = int(proposal_filters[dept]()[0])
+            selected_country = proposal_filters[dept]()[1]
             if selected_year:
                 proposals = proposals.filter(pl.col("date_submission").dt.year() == selected_year)
             if selected_country and selected_country != "All":
@@ -1858,9 +2634,10 @@ def server(input, output, session):
 
             # Extract month
             proposals = proposals.with_columns(pl.col("date_submission").dt.month().alias("month"))
-            result_map = {True:"win", False:"lost"}
+            # result is BOOLEAN (imported workbooks) or text in databases created from older workbooks
+            result_map = {"true":"win", "false":"lost"}
             proposals = proposals.with_columns(
-                pl.col("result").replace(result_map)
+                pl.col("result").cast(pl.String).str.to_lowercase().replace_strict(result_map, default=None, return_dtype=pl.String)
             ).with_columns(pl.col("result").fill_null("pending"))
 
             # Aggregate data
@@ -1886,22 +2663,24 @@ def server(input, output, session):
             return fig
         
         @output(id=f"proposal_{dept}_insights_pie_chart")
-        @render_widget
+        @widgets.persistent
+        @figure_cache.cached(f"proposal_{dept}_insights_pie_chart", ("proposals",), dept=dept, filters=proposal_filters[dept], invalidate=data_version)
         def _proposal_insights_pie_chart(dept=dept):
             # Use data_trigger to refresh the table when it changes
-            data_trigger.get()  # Trigger reactivity
+            data_version()  # Trigger reactivity
             proposals = db.read_table("proposals", where=f"department_code = '{dept}'")
             # Apply filters
-            selected_year = int(input[f"proposal_{dept}_insights_year_filter_"]())
-            selected_country = input[f"proposal_{dept}_insights_country_filter_"]()
+            selected_year = int(proposal_filters[dept]()[0])
+            selected_country = proposal_filters[dept]()[1]
             if selected_year:
                 proposals = proposals.filter(pl.col("date_submission").dt.year() == selected_year)
             if selected_country and selected_country != "All":
                 proposals = proposals.filter(pl.col("country_name") == selected_country)            
 
-            result_map = {True:"win", False:"lost"}
+            # result is BOOLEAN (imported workbooks) or text in databases created from older workbooks
+            result_map = {"true":"win", "false":"lost"}
             proposals = proposals.with_columns(
-                pl.col("result").replace(result_map)
+                pl.col("result").cast(pl.String).str.to_lowercase().replace_strict(result_map, default=None, return_dtype=pl.String)
             ).with_columns(pl.col("result").fill_null("pending"))
 
             # Aggregate data
@@ -1956,20 +2735,8 @@ def server(input, output, session):
                 icon=fa.icon_svg("calendar-xmark")
             )
 
-        @output(id=f"proposals_{dept}_table")
-        @render.data_frame
-        def _proposals_table(dept=dept):
-            # Use data_trigger to refresh the table when it changes
-            data_trigger.get()  # Trigger reactivity
-            proposals = db.read_table("proposals", where=f"department_code = '{dept}'").sort(by="id", descending=True)
-            return render.DataGrid(
-                proposals,
-                height="400px",
-                selection_mode="rows"
-            )
-        
         # Keep a reference to the proposals table for use in other reactive contexts
-        proposal_table_renderers[dept] = _proposals_table
+        proposal_table_renderers[dept], proposal_table_patchers[dept] = paged_grid(f"proposals_{dept}_table", "proposals", dept)
 
         @reactive.Effect
         @reactive.event(input[f"add_proposal_{dept}_btn_"])
@@ -1977,12 +2744,12 @@ def server(input, output, session):
             ui.modal_show(
                 ui.modal(
                     ui.input_selectize("type", "Type", choices=['proposal', 'concept note']),
-                    ui.input_selectize("country_name", "Country", choices=db.read_table("countries").select(pl.col("name")).to_series().to_list()),
-                    ui.input_text("donor", "Donor"),
+                    search_selectize("country_name", "Country", "countries"),
+                    search_selectize("donor", "Donor", "donors", dept=dept, create=True),
                     ui.input_date("date_submission", "Date submission", value=date.today()),
                     ui.input_switch("result", "Result (tick for win)", value=False),
-                    ui.input_selectize("sal_support", "Advisor(s)", choices=db.read_table("advisors", where=f"department_code = '{dept}' AND active = 'true'").select(pl.col("short_name")).to_series().to_list(), multiple=True),
-                    ui.input_text("country_focal", "Country focal(s)"),
+                    search_selectize("sal_support", "Advisor(s)", "active_advisors", dept=dept, multiple=True),
+                    search_selectize("country_focal", "Country focal(s)", "focals", dept=dept, multiple=True, create=True),
                     ui.input_text_area("description", "Description", placeholder="Add details and reference to GMS if available"),
                     ui.modal_button("Cancel"),
                     ui.input_action_button(f"add_timesheet_{dept}_submit", "Submit", class_="btn btn-primary"),
@@ -2002,11 +2769,11 @@ def server(input, output, session):
             date_submission = input["date_submission"]()
             result = input["result"]()
             sal_support = re.sub("[()']", "", ", ".join(map(str, input["sal_support"]()))).strip(",")
-            country_focal = input["country_focal"]()
+            country_focal = re.sub("[()']", "", ", ".join(map(str, input["country_focal"]()))).strip(",")
             description = input["description"]()
 
             try:
-                db.insert_row(
+                new_id = db.insert_row(
                     "proposals", {
                         "department_code": dept,
                         "type": type,
@@ -2019,6 +2786,7 @@ def server(input, output, session):
                         "description": description
                     }
                 )
+                proposal_table_patchers[dept]("insert", new_id)
                 ui.notification_show(f"Proposal entry added successfully for {country_name}!", type="success")
             except Exception as e:
                 ui.notification_show(f"Error adding proposal entry: {e}", type="error")
@@ -2041,12 +2809,12 @@ def server(input, output, session):
                 ui.modal_show(
                     ui.modal(
                         ui.input_selectize("edit_type", "Type", choices=['proposal', 'concept note'], selected=selected_rows.get_column("type").to_list()[0]),
-                        ui.input_selectize("edit_country_name", "Country", choices=db.read_table("countries").select(pl.col("name")).to_series().to_list(), selected=selected_rows.get_column("country_name").to_list()[0]),
-                        ui.input_text("edit_donor", "Donor", value=selected_rows.get_column("donor").to_list()[0]),
+                        search_selectize("edit_country_name", "Country", "countries", selected=selected_rows.get_column("country_name").to_list()[0]),
+                        search_selectize("edit_donor", "Donor", "donors", dept=dept, create=True, selected=selected_rows.get_column("donor").to_list()[0]),
                         ui.input_date("edit_date_submission", "Date submission", value=selected_rows.get_column("date_submission").to_list()[0]),
                         ui.input_switch("edit_result", "Result (tick for win)", value=selected_rows.get_column("result").to_list()[0]),
-                        ui.input_selectize("edit_sal_support", "Advisor(s)", choices=db.read_table("advisors", where=f"department_code = '{dept}' AND active = 'true'").select(pl.col("short_name")).to_series().to_list(), multiple=True, selected=selected_rows.get_column("sal_support").to_list()[0].split(", ")),
-                        ui.input_text("edit_country_focal", "Country focal(s)", value=selected_rows.get_column("country_focal").to_list()[0]),
+                        search_selectize("edit_sal_support", "Advisor(s)", "active_advisors", dept=dept, multiple=True, selected=selected_rows.get_column("sal_support").to_list()[0].split(", ")),
+                        search_selectize("edit_country_focal", "Country focal(s)", "focals", dept=dept, multiple=True, create=True, selected=(selected_rows.get_column("country_focal").to_list()[0] or "").split(", ")),
                         ui.input_text_area("edit_description", "Description", value=selected_rows.get_column("description").to_list()[0]),
                         ui.modal_button("Cancel"),
                         ui.input_action_button(f"edit_proposal_{dept}_submit", "Submit", class_="btn btn-primary"),
@@ -2068,7 +2836,7 @@ def server(input, output, session):
                 date_submission = input["edit_date_submission"]()
                 result = input["edit_result"]()
                 sal_support = re.sub("[()']", "", ", ".join(map(str, input["edit_sal_support"]()))).strip(",")
-                country_focal = input["edit_country_focal"]()
+                country_focal = re.sub("[()']", "", ", ".join(map(str, input["edit_country_focal"]()))).strip(",")
                 description = input["edit_description"]()
 
                 try:
@@ -2086,6 +2854,7 @@ def server(input, output, session):
                         },
                         where=f"id = {id_to_edit}"
                     )
+                    proposal_table_patchers[dept]("update", id_to_edit)
                     ui.notification_show(f"Proposal entry updated successfully!", type="success")
                 except Exception as e:
                     ui.notification_show(f"Error updating proposal entry: {e}", type="error")
@@ -2130,6 +2899,7 @@ def server(input, output, session):
                         "proposals",
                         where=f"id = {id_to_delete}"
                     )
+                    proposal_table_patchers[dept]("delete", id_to_delete)
                     ui.notification_show(f"Proposal entry deleted successfully for {country_name}!", type="success")
                 except Exception as e:
                     ui.notification_show(f"Error deleting proposal entry: {e}", type="error")
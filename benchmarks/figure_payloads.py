@@ -0,0 +1,89 @@
+"""
+Report the payload size of every dashboard chart before and after
+utils/figure_payload.compact.
+
+Runs the app in-process, opens a headless session over the websocket, shows
+each chart once for every department and prints the serialized figure size.
+
+    SAL_PASSWORD=... python benchmarks/figure_payloads.py
+"""
+import json
+import os
+import sys
+import threading
+import time
+from datetime import date
+
+import uvicorn
+from websockets.sync.client import connect
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from utils import figure_payload
+figure_payload.RECORD_STATS = True
+import app
+
+PORT = 8765
+CHARTS = [
+    "calendar_{dept}_plot",
+    "calendar_{dept}_insights_plot",
+    "support_{dept}_plot",
+    "support_{dept}_insights_timeline",
+    "support_{dept}_insights_pie_chart",
+    "support_{dept}_insights_advisors_plot",
+    "allocations_{dept}_map",
+    "proposal_{dept}_insights_timeline",
+    "proposal_{dept}_insights_pie_chart",
+]
+FILTERS = {
+    "calendar_{dept}_insights_year_filter_": str(date.today().year),
+    "calendar_{dept}_insights_advisor_filter_": "All",
+    "support_{dept}_overall_year_filter_": str(date.today().year),
+    "support_{dept}_insights_year_filter_": str(date.today().year),
+    "support_{dept}_insights_country_filter_": "All",
+    "proposal_{dept}_insights_year_filter_": str(date.today().year),
+    "proposal_{dept}_insights_country_filter_": "All",
+}
+
+
+def send(ws, data):
+    ws.send(json.dumps({"method": "update", "data": data}))
+
+
+def wait_idle(ws, quiet=2.0):
+    # Read messages until the server has been quiet for `quiet` seconds
+    while True:
+        try:
+            ws.recv(timeout=quiet)
+        except TimeoutError:
+            return
+
+
+def main():
+    server = uvicorn.Server(uvicorn.Config(app.app, port=PORT, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.1)
+
+    with connect(f"ws://127.0.0.1:{PORT}/websocket/", max_size=None) as ws:
+        ws.send(json.dumps({"method": "init", "data": {".clientdata_url_search": "", ".clientdata_singletons": ""}}))
+        wait_idle(ws)
+        send(ws, {"username": "sal", "password": os.getenv("SAL_PASSWORD"), "login_btn": 1, ".clientdata_output_dynamic_navbar_hidden": False})
+        wait_idle(ws)
+        for dept in [row[0] for row in app.get_departments()]:
+            send(ws, {name.format(dept=dept): value for name, value in FILTERS.items()})
+            send(ws, {f".clientdata_output_{chart.format(dept=dept)}_hidden": False for chart in CHARTS})
+            wait_idle(ws)
+
+    server.should_exit = True
+    total_before = total_after = 0
+    print(f"{'chart':<45}{'before':>12}{'after':>12}{'saved':>8}")
+    for name, (before, after) in sorted(figure_payload.stats.items()):
+        total_before += before
+        total_after += after
+        print(f"{name:<45}{before:>12,}{after:>12,}{1 - after / before:>8.0%}")
+    if total_before:
+        print(f"{'total':<45}{total_before:>12,}{total_after:>12,}{1 - total_after / total_before:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
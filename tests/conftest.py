@@ -0,0 +1,13 @@
+import pytest
+from utils import db
+
+
+@pytest.fixture
+def empty_db(tmp_path, monkeypatch):
+    # A new database with the tables of initialize_db and nothing in them
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "db.duckdb"))
+    monkeypatch.setattr(db, "HOLIDAYS_PATH", str(tmp_path / "holidays.csv"))
+    db.initialize_db()
+    # Caches keyed on the table versions may hold another test's database
+    for table in db.read_query("SHOW TABLES").get_column("name"):
+        db.bump_table_version(table)
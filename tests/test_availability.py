@@ -0,0 +1,69 @@
+import random
+from datetime import date, datetime, timedelta
+from utils.availability import IntervalIndex, day_interval
+
+ADVISORS = ["Ana", "Ben", "Cleo"]
+START = datetime(2025, 1, 1)
+DAYS = 60
+
+
+def random_events(rng, n):
+    events = []
+    for row_id in range(1, n + 1):
+        start = date(2025, 1, 1) + timedelta(days=rng.randrange(DAYS))
+        events.append((row_id, rng.choice(ADVISORS), start, start + timedelta(days=rng.randrange(6))))
+    return events
+
+
+def brute_busy(events, advisors, day):
+    # Whether any of the advisors has an event covering that day
+    return any(advisor in advisors and s <= day < e for _, advisor, s, e in events)
+
+
+def brute_slots(events, advisors, start, end, min_days):
+    slots, day = [], start
+    while day < end:
+        if brute_busy(events, advisors, day):
+            day += timedelta(days=1)
+            continue
+        slot_start = day
+        while day < end and not brute_busy(events, advisors, day):
+            day += timedelta(days=1)
+        if day - slot_start >= timedelta(days=min_days):
+            slots.append((slot_start, day))
+    return slots
+
+
+def test_interval_index_matches_brute_force():
+    rng = random.Random(7)
+    events = random_events(rng, 40)
+    index = IntervalIndex(events)
+    # Update and remove a few events, as availability.apply does
+    for row_id in rng.sample(range(1, 41), 8):
+        events = [event for event in events if event[0] != row_id]
+        index.remove(row_id)
+    for row_id, advisor, start, end in random_events(rng, 5):
+        events = [event for event in events if event[0] != row_id] + [(row_id, advisor, start, end)]
+        index.add(row_id, advisor, start, end)
+    intervals = [(row_id, advisor, *day_interval(start, end)) for row_id, advisor, start, end in events]
+
+    for _ in range(200):
+        start = START + timedelta(days=rng.randrange(-5, DAYS + 5))
+        end = start + timedelta(days=rng.randrange(1, 20))
+        advisors = rng.sample(ADVISORS, rng.randrange(1, 4))
+        overlapping = sorted(row_id for row_id, advisor, s, e in intervals if advisor in advisors and s < end and e > start)
+        assert sorted(index.overlapping(start, end, advisors)) == overlapping
+        for advisor in advisors:
+            assert index.is_free(advisor, start, end) == (not any(a == advisor and s < end and e > start for _, a, s, e in intervals))
+        min_days = rng.randrange(1, 4)
+        assert index.free_slots(advisors, start, end, timedelta(days=min_days)) == brute_slots(intervals, advisors, start, end, min_days)
+
+
+def test_events_cover_whole_days():
+    index = IntervalIndex([(1, "Ana", date(2025, 3, 3), date(2025, 3, 3)), (2, "Ana", date(2025, 3, 4), date(2025, 3, 5))])
+    assert not index.is_free("Ana", datetime(2025, 3, 3), datetime(2025, 3, 4))
+    assert index.is_free("Ana", datetime(2025, 3, 6), datetime(2025, 3, 7))
+    # Back to back events merge into one busy block
+    assert index.free_slots(["Ana"], datetime(2025, 3, 1), datetime(2025, 3, 10)) == [
+        (datetime(2025, 3, 1), datetime(2025, 3, 3)), (datetime(2025, 3, 6), datetime(2025, 3, 10))
+    ]
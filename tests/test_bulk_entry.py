@@ -0,0 +1,46 @@
+from datetime import date
+import polars as pl
+import pytest
+from utils import bulk_entry, db
+
+
+@pytest.fixture
+def lookups(empty_db):
+    db.insert_rows("advisors", pl.DataFrame({"department_code": "WASH", "name": ["Ana", "Ben"], "short_name": ["AN", "BE"]}))
+    db.insert_row("support", {"category": "Capacity", "name": "Training"})
+
+
+def test_prepare_parses_pasted_grid(lookups):
+    pasted = (
+        "Date\tCountry\tAdvisor(s)\tType of support\tHours\n"
+        "2025-01-31 00:00:00\tKenya; Chad\tAN,BE\tTraining\t2.5\n"
+        "\n"
+        "31/01/2025\tMali\tAN\tTraining\t\n"
+    )
+    rows, errors = bulk_entry.prepare(bulk_entry.read(pasted), "WASH")
+
+    assert errors.is_empty()
+    assert rows.select("department_code", "date", "country_name", "sal_attendees", "hours").rows() == [
+        ("WASH", date(2025, 1, 31), "Kenya, Chad", "AN, BE", 2.5),
+        ("WASH", date(2025, 1, 31), "Mali", "AN", bulk_entry.DEFAULT_HOURS),
+    ]
+    assert bulk_entry.save(rows) and db.count_rows("timesheet") == 2
+
+
+def test_prepare_reports_one_error_per_cell(lookups):
+    cells = bulk_entry.read("date,country_name,sal_attendees,support_name,hours\n2025-13-01,Kenya,AN,Training,1\n2025-01-02,,ZZ,Training,x\n")
+    rows, errors = bulk_entry.prepare(cells, "WASH")
+
+    assert rows.height == 2
+    assert errors.rows() == [
+        (0, "date", "Date must be a date (YYYY-MM-DD or DD/MM/YYYY)."),
+        (1, "country_name", "Country name is required."),
+        (1, "hours", "Hours must be a number."),
+        (1, "sal_attendees", "Sal attendees is not in the advisors table."),
+    ]
+    assert bulk_entry.preview(rows, errors).get_column("errors").to_list()[0].startswith("Date must be")
+
+
+def test_prepare_requires_columns(lookups):
+    with pytest.raises(ValueError, match="Missing column"):
+        bulk_entry.prepare(bulk_entry.read("date,hours\n2025-01-02,1\n"), "WASH")
@@ -0,0 +1,37 @@
+from datetime import date, datetime
+import polars as pl
+from utils import capacity, db
+
+
+def test_weekly_capacity_joins_available_days_and_logged_hours(empty_db):
+    for name in ("Leave", "No travel"):
+        db.insert_row("events", {"name": name})
+    db.insert_rows("advisors", pl.DataFrame({
+        "department_code": "WASH", "name": ["Ana", "Ben"], "short_name": ["AN", "BE"], "active": True, "duty_country_code": ["KEN", None]
+    }))
+    db.insert_row("holidays", {"country_code": "KEN", "date": date(2025, 1, 1), "name": "New Year's Day"})
+    db.insert_rows("calendar", pl.DataFrame({
+        "department_code": "WASH", "advisor_short_name": ["AN", "BE"],
+        "start_date": [datetime(2025, 1, 2), datetime(2025, 1, 6)], "end_date": [datetime(2025, 1, 2), datetime(2025, 1, 10)],
+        "event_name": ["Leave", "No travel"]
+    }))
+    db.insert_rows("timesheet", pl.DataFrame({
+        "department_code": "WASH", "date": [datetime(2025, 1, 3), datetime(2025, 1, 7)], "country_name": "Kenya",
+        "sal_attendees": ["AN, BE", "BE"], "support_name": "Training", "hours": [3.0, 7.5]
+    }))
+
+    weeks = capacity.weekly_capacity("WASH", 2025).filter(pl.col("week") < date(2025, 1, 13))
+    # Week of 30 December: Ana is on leave one day and off on the holiday, "No travel" keeps Ben available
+    assert weeks.select("advisor", "week", "available_days", "logged_hours", "load").rows() == [
+        ("AN", date(2024, 12, 30), 1, 3.0, 3.0 / 7.5),
+        ("AN", date(2025, 1, 6), 5, 0.0, 0.0),
+        ("BE", date(2024, 12, 30), 3, 3.0, 3.0 / 22.5),
+        ("BE", date(2025, 1, 6), 5, 7.5, 7.5 / 37.5),
+    ]
+
+    # A timesheet write only recomputes the logged half
+    available = capacity.available_days("WASH", 2025)
+    db.insert_row("timesheet", {"department_code": "WASH", "date": datetime(2025, 1, 8), "country_name": "Kenya", "sal_attendees": "AN", "support_name": "Training", "hours": 1.0})
+    assert capacity.available_days("WASH", 2025) is available
+    load = capacity.weekly_capacity("WASH", 2025).filter((pl.col("advisor") == "AN") & (pl.col("week") == date(2025, 1, 6)))
+    assert load.get_column("logged_hours").item() == 1.0
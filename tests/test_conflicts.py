@@ -0,0 +1,54 @@
+from datetime import date
+import polars as pl
+from utils import conflicts, db
+
+
+def add_events(*events):
+    # (advisor, start, end, event name) rows of the WASH calendar, returns their ids
+    return db.insert_rows("calendar", pl.DataFrame(
+        [("WASH", advisor, start, end, name) for advisor, start, end, name in events],
+        schema=["department_code", "advisor_short_name", "start_date", "end_date", "event_name"], orient="row"
+    ))
+
+
+def test_find_conflicts_overlapping_days(empty_db):
+    leave, _, _ = add_events(
+        ("Ana", date(2025, 3, 3), date(2025, 3, 7), "Leave"),
+        ("Ana", date(2025, 3, 10), date(2025, 3, 10), "Mission"),
+        ("Ben", date(2025, 3, 3), date(2025, 3, 7), "Leave"),
+    )
+
+    # The end date is included: an event starting on the last day overlaps
+    found = conflicts.find_conflicts("WASH", "Ana", date(2025, 3, 7), date(2025, 3, 8), event_name="Mission")
+    assert found.get_column("id").to_list() == [leave]
+    # The edited event doesn't conflict with itself
+    assert conflicts.find_conflicts("WASH", "Ana", date(2025, 3, 3), date(2025, 3, 4), exclude_id=leave).is_empty()
+    assert conflicts.find_conflicts("WASH", "Ana", date(2025, 3, 8), date(2025, 3, 9)).is_empty()
+
+
+def test_available_events_never_conflict(empty_db, monkeypatch):
+    monkeypatch.setattr(conflicts, "AVAILABLE", ["No travel", "Advisor's \"desk\" day"])
+    add_events(
+        ("Ana", date(2025, 3, 3), date(2025, 3, 7), "No travel"),
+        ("Ana", date(2025, 3, 3), date(2025, 3, 7), "Advisor's \"desk\" day"),
+        ("Ana", date(2025, 3, 5), date(2025, 3, 5), "Mission"),
+    )
+
+    assert conflicts.find_conflicts("WASH", "Ana", date(2025, 3, 4), date(2025, 3, 4), event_name="Leave").is_empty()
+    assert conflicts.find_conflicts("WASH", "Ana", date(2025, 3, 5), date(2025, 3, 5), event_name="No travel").is_empty()
+    assert conflicts.find_series_conflicts("WASH", "Ana", [date(2025, 3, 5)], [date(2025, 3, 5)], event_name="Advisor's \"desk\" day").is_empty()
+    assert conflicts.scan_conflicts("WASH").is_empty()
+
+
+def test_series_and_scan_conflicts(empty_db):
+    first, second, third = add_events(
+        ("Ana", date(2025, 3, 3), date(2025, 3, 7), "Leave"),
+        ("Ana", date(2025, 3, 7), date(2025, 3, 11), "Mission"),
+        ("Ana", date(2025, 3, 17), date(2025, 3, 17), "Mission"),
+    )
+
+    # Weekly occurrences on the 10th and the 17th
+    found = conflicts.find_series_conflicts("WASH", "Ana", [date(2025, 3, 10), date(2025, 3, 17)], [date(2025, 3, 10), date(2025, 3, 17)])
+    assert found.get_column("id").to_list() == [second, third]
+    pairs = conflicts.scan_conflicts("WASH")
+    assert pairs.select("id", "other_id", "overlap_start", "overlap_end").rows() == [(first, second, date(2025, 3, 7), date(2025, 3, 7))]
@@ -0,0 +1,62 @@
+import random
+from datetime import datetime
+import polars as pl
+import pytest
+from utils.cube import TimesheetCube
+
+COUNTRIES = ["Chad", "Kenya", "Mali"]
+ADVISORS = ["AN", "BE", "CL"]
+
+
+def random_timesheet(rng, n):
+    return pl.DataFrame({
+        "date": [datetime(rng.choice([2024, 2025]), rng.randrange(1, 13), rng.randrange(1, 29)) for _ in range(n)],
+        "country_name": [", ".join(rng.sample(COUNTRIES, rng.randrange(1, 3))) for _ in range(n)],
+        "support_name": [rng.choice(["Training", "Review", None]) for _ in range(n)],
+        "sal_attendees": [", ".join(rng.sample(ADVISORS, rng.randrange(1, 4))) for _ in range(n)],
+        "hours": [rng.choice([0.5, 1.0, 2.5, None]) for _ in range(n)],
+    })
+
+
+def grouped(timesheet, by, explode=()):
+    # The group_by the support charts ran on the timesheet before the cube
+    df = timesheet.with_columns(
+        pl.col("date").dt.year().alias("year"),
+        pl.col("date").dt.month().alias("month"),
+        pl.col("country_name").str.split(", ").alias("country"),
+        pl.col("support_name").alias("support"),
+        pl.col("sal_attendees").str.split(", ").alias("advisor"),
+        pl.col("hours").fill_null(0.0),
+    )
+    for dim in explode:
+        df = df.explode(dim)
+    return df.group_by(by).agg(pl.col("hours").sum()).filter(pl.col("hours") != 0)
+
+
+def as_dict(df, by):
+    return {row[:-1]: round(row[-1], 9) for row in df.select(*by, "hours").rows()}
+
+
+def test_cube_matches_group_by():
+    timesheet = random_timesheet(random.Random(5), 200)
+    cube = TimesheetCube(timesheet)
+
+    assert round(cube.aggregate().item(), 9) == round(timesheet.get_column("hours").sum(), 9)
+    assert as_dict(cube.aggregate(["year", "month"]), ["year", "month"]) == as_dict(grouped(timesheet, ["year", "month"]), ["year", "month"])
+    assert as_dict(cube.aggregate(["support"]), ["support"]) == as_dict(grouped(timesheet, ["support"]), ["support"])
+    # A session counts fully for each of its countries and attendees
+    assert as_dict(cube.aggregate(["country", "advisor"]), ["country", "advisor"]) == \
+        as_dict(grouped(timesheet, ["country", "advisor"], explode=["country", "advisor"]), ["country", "advisor"])
+
+    # Filters are slices of the cube
+    sessions = timesheet.filter((pl.col("date").dt.year() == 2025) & pl.col("country_name").str.contains("Kenya"))
+    assert as_dict(cube.aggregate(["month"], year=2025, country="Kenya"), ["month"]) == as_dict(grouped(sessions, ["month"]), ["month"])
+
+
+def test_pivot_and_unknown_dimensions():
+    timesheet = random_timesheet(random.Random(6), 50)
+    cube = TimesheetCube(timesheet)
+    pivot = cube.pivot("year", "support")
+    assert pivot.columns[0] == "year" and sorted(pivot.get_column("year")) == pivot.get_column("year").to_list()
+    with pytest.raises(ValueError, match="week"):
+        cube.aggregate(["week"])
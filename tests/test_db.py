@@ -0,0 +1,38 @@
+import polars as pl
+import pytest
+from utils import db
+
+
+def all_pages(table, order_by, descending, limit, **kwargs):
+    ids, after = [], None
+    while True:
+        page, after = db.read_page(table, order_by=order_by, descending=descending, after=after, limit=limit, **kwargs)
+        ids += page.get_column("id").to_list()
+        if after is None:
+            return ids
+
+
+@pytest.mark.parametrize("descending", [True, False])
+@pytest.mark.parametrize("limit", [1, 3, 50])
+def test_read_page_walks_every_row_once(empty_db, descending, limit):
+    # Repeated and NULL sort values, which the cursor must step over by id
+    colours = ["#111111", None, "#333333", "#111111", None, "#222222", "#333333", "#111111"]
+    db.insert_rows("advisors", pl.DataFrame({
+        "department_code": "WASH", "name": [f"Advisor {i}" for i in range(len(colours))], "short_name": [f"A{i}" for i in range(len(colours))], "colour": colours
+    }))
+    rows = db.read_table("advisors")
+    expected = (
+        rows.sort(["colour", "id"], descending=descending, nulls_last=True)
+        .get_column("id").to_list()
+    )
+    assert all_pages("advisors", "colour", descending, limit) == expected
+
+    # Filtered and searched pages, counted like the grid footer
+    searched = all_pages("advisors", "colour", descending, limit, where="colour IS NOT NULL", search="#111")
+    assert searched == [i for i in expected if rows.filter(pl.col("id") == i).item(0, "colour") == "#111111"]
+    assert db.count_rows("advisors", where="colour IS NOT NULL", search="#111") == len(searched)
+
+
+def test_read_page_rejects_unknown_columns(empty_db):
+    with pytest.raises(ValueError):
+        db.read_page("advisors", order_by="colour; DROP TABLE advisors")
@@ -0,0 +1,54 @@
+import io
+import zipfile
+import polars as pl
+import pytest
+from utils import db, delta_export
+
+
+def read_zip(path):
+    with zipfile.ZipFile(path) as zf:
+        return {name.removesuffix(".parquet"): pl.read_parquet(io.BytesIO(zf.read(name))) for name in zf.namelist()}
+
+
+@pytest.fixture
+def snapshots(tmp_path, monkeypatch):
+    monkeypatch.setattr(delta_export, "SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+
+
+def test_delta_marks_inserted_updated_and_deleted_rows(empty_db, snapshots, tmp_path):
+    ana, ben, cleo = db.insert_rows("advisors", pl.DataFrame({"department_code": "WASH", "name": ["Ana", "Ben", "Cleo"], "short_name": ["AN", "BE", "CL"]}))
+    db.insert_row("events", {"name": "Leave"})
+    first = delta_export.export_delta(str(tmp_path / "first.zip"), "parquet")
+    assert read_zip(tmp_path / "first.zip")["advisors"].get_column("_change").to_list() == ["insert"] * 3
+    delta_export.record(first)
+
+    db.update_row("advisors", {"role": "Lead"}, f"id = {ben}")
+    db.delete_row("advisors", f"id = {cleo}")
+    dan = db.insert_row("advisors", {"department_code": "WASH", "name": "Dan", "short_name": "DA"})
+    second = delta_export.export_delta(str(tmp_path / "second.zip"), "parquet", since=first)
+
+    files = read_zip(tmp_path / "second.zip")
+    # Events didn't change, tables without id are exported whole when they do
+    assert set(files) == {"summary", "advisors"}
+    changes = files["advisors"].sort("id")
+    assert changes.select("id", "_change").rows() == [(ben, "update"), (cleo, "delete"), (dan, "insert")]
+    # Deletions are markers holding only the id
+    assert changes.filter(pl.col("_change") == "delete").drop("id", "_change").null_count().row(0) == (1,) * (changes.width - 2)
+    assert files["summary"].select("change", "rows").rows() == [("delete", 1), ("insert", 1), ("update", 1)]
+    assert delta_export.watermarks() == [first]
+
+
+def test_undelivered_export_keeps_the_watermark(empty_db, snapshots, tmp_path):
+    db.insert_row("events", {"name": "Leave"})
+    first = delta_export.export_delta(str(tmp_path / "first.xlsx"))
+    delta_export.record(first)
+    db.insert_row("events", {"name": "Mission"})
+
+    pending = delta_export.export_delta(str(tmp_path / "second.csv.zip"), "csv", since=first)
+    delta_export.discard(pending)
+
+    assert delta_export.watermarks() == [first]
+    delta_export.export_delta(str(tmp_path / "third.zip"), "parquet", since=first)
+    assert read_zip(tmp_path / "third.zip")["events"].select("name", "_change").rows() == [("Leave", "snapshot"), ("Mission", "snapshot")]
+    with pytest.raises(ValueError):
+        delta_export.export_delta(str(tmp_path / "fourth.zip"), "parquet", since="19990101T000000000000")
@@ -0,0 +1,110 @@
+from datetime import datetime
+from pathlib import Path
+import fastexcel
+import polars as pl
+import pytest
+from utils import db, excel_io
+
+WORKBOOK = Path(__file__).resolve().parent.parent / "data" / "database.xlsx"
+
+
+def sheet_rows():
+    workbook = fastexcel.read_excel(WORKBOOK)
+    return {sheet.lower(): workbook.load_sheet(sheet).height for sheet in workbook.sheet_names}
+
+
+def test_import_workbook_into_empty_db(empty_db):
+    # Lookups (advisors, events, support, ...) are found in the other sheets
+    counts = excel_io.import_db(str(WORKBOOK))
+
+    rows = sheet_rows()
+    assert counts == {table: (rows[table], 0, 0) for table in rows}
+    for table, height in rows.items():
+        assert db.read_query(f"SELECT count(*) FROM {table}").item() == height
+
+
+def test_import_same_workbook_twice_skips_every_row(empty_db):
+    excel_io.import_db(str(WORKBOOK))
+    versions = {table: db.table_version(table) for table in sheet_rows()}
+
+    counts = excel_io.import_db(str(WORKBOOK))
+
+    rows = sheet_rows()
+    assert counts == {table: (0, 0, rows[table]) for table in rows}
+    for table, height in rows.items():
+        assert db.read_query(f"SELECT count(*) FROM {table}").item() == height
+    # Nothing was written, so the caches derived from the tables are kept
+    assert {table: db.table_version(table) for table in rows} == versions
+
+
+def test_import_keeps_columns_and_values(empty_db):
+    excel_io.import_db(str(WORKBOOK))
+
+    workbook = fastexcel.read_excel(WORKBOOK)
+    for sheet in workbook.sheet_names:
+        df = workbook.load_sheet(sheet).to_polars()
+        stored = db.read_table(sheet.lower())
+        # Every column of the sheet is kept (e.g. advisors.country_codes), with its values
+        assert set(df.columns) <= set(stored.columns), sheet
+        for column in df.columns:
+            assert stored.get_column(column).null_count() == df.get_column(column).null_count(), (sheet, column)
+    advisors = workbook.load_sheet("advisors").to_polars()
+    assert db.read_query("SELECT short_name, country_codes FROM advisors ORDER BY id").rows() == \
+        advisors.select("short_name", "country_codes").rows()
+
+
+def test_import_adds_columns_missing_from_table(empty_db, tmp_path):
+    path = tmp_path / "extra.xlsx"
+    pl.DataFrame({"name": ["Leave"], "colour": ["#112233"], "category": ["absence"]}).write_excel(path, worksheet="events")
+
+    assert excel_io.import_db(str(path)) == {"events": (1, 0, 0)}
+    assert db.read_query("SELECT name, colour, category FROM events").rows() == [("Leave", "#112233", "absence")]
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow", "duckdb"])
+def test_export_import_replaces_rows_and_keeps_constraints(empty_db, tmp_path, fmt):
+    excel_io.import_db(str(WORKBOOK))
+    path = str(tmp_path / f"export.{fmt}.zip")
+    excel_io.export_db(path, fmt)
+
+    counts = excel_io.import_db(path)
+
+    rows = sheet_rows()
+    assert {table: counts[table] for table in rows} == {table: (rows[table], 0, 0) for table in rows}
+    keys = db.read_query("SELECT table_name FROM duckdb_constraints() WHERE constraint_type = 'PRIMARY KEY'").get_column("table_name")
+    assert set(excel_io.table_keys()) <= set(keys)
+
+
+def test_export_import_round_trip_skips_every_row(empty_db, tmp_path):
+    excel_io.import_db(str(WORKBOOK))
+    excel_io.ensure_sequences()
+    # Timestamps finer than Excel's millisecond, e.g. written by the app
+    db.insert_row("calendar", {
+        "department_code": "WASH", "advisor_short_name": "Paolo L", "event_name": "Leave",
+        "start_date": datetime(2025, 1, 6, 9, 30, 12, 123456), "end_date": datetime(2025, 1, 6, 17, 0, 59, 999900)
+    })
+    path = str(tmp_path / "export.xlsx")
+    excel_io.export_db(path, "xlsx")
+    tables = db.read_query("SHOW TABLES").get_column("name").to_list()
+    before = {table: db.read_table(table) for table in tables}
+
+    counts = excel_io.import_db(path)
+
+    assert all(inserted == 0 and updated == 0 for inserted, updated, _ in counts.values()), counts
+    assert all(db.read_table(table).equals(before[table]) for table in tables)
+
+
+def test_export_streams_tables_in_batches(empty_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(excel_io, "EXPORT_BATCH_ROWS", 3)
+    monkeypatch.setattr(excel_io, "EXPORT_CHUNK_BYTES", 1000)
+    db.insert_rows("events", pl.DataFrame({"name": [f"Event {i}" for i in range(7)], "colour": "#112233"}))
+    calls = []
+    path = tmp_path / "export.xlsx"
+
+    excel_io.export_db(str(path), "xlsx", lambda *args: calls.append(args))
+
+    assert [call[3:] for call in calls if call[2] == "events"] == [(0, 7), (3, 7), (6, 7), (7, 7)]
+    assert {call[1] for call in calls} == {len(db.read_query("SHOW TABLES"))}
+    assert pl.read_excel(path, sheet_name="events").get_column("name").to_list() == [f"Event {i}" for i in range(7)]
+    chunks = list(excel_io.read_chunks(str(path)))
+    assert b"".join(chunks) == path.read_bytes() and max(map(len, chunks)) == 1000
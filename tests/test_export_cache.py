@@ -0,0 +1,38 @@
+import os
+from utils import db, export_cache, export_jobs
+
+
+def test_fingerprint_follows_content(empty_db):
+    db.insert_row("events", {"name": "Leave", "colour": "#112233"})
+    before = export_cache.fingerprint()
+    assert export_cache.fingerprint() == before
+
+    # Same row count, written outside the CRUD helpers (e.g. another process)
+    conn = db.get_db_connection()
+    conn.execute("UPDATE events SET colour = '#445566'")
+    conn.close()
+    assert export_cache.fingerprint() != before
+
+
+def test_fingerprint_of_snapshots_includes_sequences(empty_db):
+    before = export_cache.fingerprint(sequences=True)
+    db.read_query("SELECT nextval('calendar_series_seq')")
+    assert export_cache.fingerprint() == export_cache.fingerprint()
+    assert export_cache.fingerprint(sequences=True) != before
+
+
+def test_export_job_reuses_cached_file_and_cleans_partial_files(empty_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(export_cache, "CACHE_DIR", str(tmp_path / "cache"))
+    os.makedirs(export_cache.CACHE_DIR)
+    stale = os.path.join(export_cache.CACHE_DIR, "left.xlsx.part")
+    open(stale, "w").close()
+    db.insert_row("events", {"name": "Leave"})
+
+    first = export_jobs.ExportJob("xlsx")
+    path = first.run()
+    second = export_jobs.ExportJob("xlsx")
+
+    assert not os.path.exists(stale)
+    assert second.run() == path and second.cached and not first.cached
+    db.insert_row("events", {"name": "Training"})
+    assert export_jobs.ExportJob("xlsx").run() != path
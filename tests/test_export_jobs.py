@@ -0,0 +1,40 @@
+import os
+import threading
+import polars as pl
+import pytest
+from utils import db, excel_io, export_cache, export_jobs
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_cache, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(excel_io, "EXPORT_BATCH_ROWS", 2)
+    return tmp_path / "cache"
+
+
+def test_export_job_reports_progress_on_a_worker_thread(empty_db, cache_dir):
+    db.insert_rows("events", pl.DataFrame({"name": [f"Event {i}" for i in range(5)]}))
+    job = export_jobs.ExportJob("xlsx")
+    assert job.fraction == 0.0 and job.describe() == "Starting export..."
+
+    result = []
+    worker = threading.Thread(target=lambda: result.append(job.run()))
+    worker.start()
+    worker.join()
+
+    assert os.path.dirname(result[0]) == str(cache_dir) and not job.cached
+    # Progress of the last batch of the last sheet
+    assert job.sheet == job.sheets - 1 and job.rows == job.table_rows
+    assert job.fraction == 1.0
+    assert job.describe().startswith(f"Sheet {job.sheets}/{job.sheets}: ")
+
+
+def test_cancelled_export_leaves_no_file(empty_db, cache_dir):
+    db.insert_rows("events", pl.DataFrame({"name": [f"Event {i}" for i in range(5)]}))
+    job = export_jobs.ExportJob("parquet")
+    job.cancel()
+
+    with pytest.raises(export_jobs.ExportCancelled):
+        job.run()
+    assert os.listdir(cache_dir) == []
+    assert export_jobs.ExportJob("parquet").run().endswith(".parquet.zip")
@@ -0,0 +1,32 @@
+from pathlib import Path
+import pytest
+from utils import db, occupancy
+
+SEED = Path(__file__).resolve().parent.parent / "data" / "holidays.csv"
+
+
+def test_seed_adds_only_missing_holidays(empty_db, tmp_path):
+    seed = tmp_path / "holidays.csv"
+    seed.write_text("country_code,date,name\nKEN,2025-01-01,New Year's Day\nKEN,2025-12-25,Christmas Day\n")
+    conn = db.get_db_connection()
+    conn.execute("INSERT INTO holidays VALUES ('KEN', '2025-01-01', 'New Year')")
+
+    assert db.seed_holidays(conn, str(seed))
+    assert not db.seed_holidays(conn, str(seed))
+    assert conn.execute("SELECT date::VARCHAR, name FROM holidays ORDER BY date").fetchall() == \
+        [("2025-01-01", "New Year"), ("2025-12-25", "Christmas Day")]
+    conn.close()
+
+
+def test_shipped_seed_covers_2024_to_2030(empty_db):
+    conn = db.get_db_connection()
+    assert db.seed_holidays(conn, str(SEED))
+    years = conn.execute("SELECT min(year(date)), max(year(date)) FROM holidays").fetchone()
+    conn.close()
+    assert years == (2024, 2030)
+
+
+def test_missing_holidays_warn(empty_db):
+    db.bump_table_version("holidays")
+    with pytest.warns(UserWarning, match="No public holidays of KEN in 2040"):
+        assert len(occupancy.holiday_dates("KEN", 2040)) == 0
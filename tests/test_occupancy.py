@@ -0,0 +1,62 @@
+import random
+from datetime import date, datetime, timedelta
+import numpy as np
+from utils import db
+from utils.occupancy import Occupancy
+
+EVENTS = ["Leave", "Mission", "Training"]
+
+
+def random_rows(rng, n):
+    rows = []
+    for _ in range(n):
+        start = datetime(2024, 12, 1) + timedelta(days=rng.randrange(90))
+        rows.append((rng.choice(["Ana", "Ben"]), start, start + timedelta(days=rng.randrange(10)), rng.choice(EVENTS)))
+    return rows
+
+
+def brute_days(rows, year):
+    # Event of each advisor's weekday, the event starting last winning
+    cells = {}
+    for advisor, start, end, event in sorted(rows, key=lambda row: row[1]):
+        day = start.date()
+        while day <= end.date():
+            cells[(advisor, day)] = event
+            day += timedelta(days=1)
+    counts = {}
+    for (advisor, day), event in cells.items():
+        if day.year == year and day.weekday() < 5:
+            counts[(advisor, event)] = counts.get((advisor, event), 0) + 1
+    return counts
+
+
+def test_days_by_event_matches_day_by_day_count():
+    rows = random_rows(random.Random(3), 30)
+    matrix = Occupancy(rows, EVENTS, advisors=["Cleo"])
+    assert matrix.advisors == ["Ana", "Ben", "Cleo"]
+    for year in (2024, 2025):
+        counts = matrix.days_by_event(year)
+        assert {(a, e): n for a, e, n, _ in counts.iter_rows()} == brute_days(rows, year)
+        weekdays = int(np.busday_count(f"{year}-01-01", f"{year + 1}-01-01"))
+        assert set(counts.get_column("working_days")) == {weekdays}
+
+        utilisation = matrix.utilisation(year)
+        busy = {a: n for a, n in utilisation.select("advisor_short_name", "busy_days").iter_rows()}
+        assert busy["Cleo"] == 0
+        for advisor in ("Ana", "Ben"):
+            assert busy[advisor] == sum(n for (a, _), n in brute_days(rows, year).items() if a == advisor)
+
+
+def test_monthly_load_and_working_days_of_duty_country(empty_db):
+    db.insert_row("holidays", {"country_code": "KEN", "date": date(2025, 1, 1), "name": "New Year's Day"})
+    # Leave on Wednesday 1 to Friday 3 January 2025, over the holiday
+    rows = [("Ana", datetime(2025, 1, 1), datetime(2025, 1, 3), "Leave")]
+    matrix = Occupancy(rows, EVENTS, countries={"Ana": "KEN"}, advisors=["Ben"])
+    counts = {a: (n, w) for a, _, n, w in matrix.days_by_event(2025).iter_rows()}
+    assert counts == {"Ana": (2, 260)}
+
+    advisors, load = matrix.monthly_load(2025)
+    assert advisors == ["Ana", "Ben"]
+    # 22 working days in January in Kenya, 23 without the holiday
+    assert load[0, 0] == 2 / 22 and load[1, 0] == 0
+    assert load[:, 1:].sum() == 0
@@ -0,0 +1,47 @@
+from datetime import date, datetime
+import pytest
+from utils import db, recurrence
+
+
+def starts(occurrences):
+    return occurrences.get_column("start_date").to_list()
+
+
+def test_monthly_occurrences_clamp_to_month_end():
+    occurrences = recurrence.expand(date(2024, 1, 31), date(2024, 2, 1), "monthly", count=4)
+    # Each occurrence is offset from the first one, so March is back on the 31st
+    assert starts(occurrences) == [date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30)]
+    assert occurrences.get_column("end_date").to_list() == [date(2024, 2, 1), date(2024, 3, 1), date(2024, 4, 1), date(2024, 5, 1)]
+
+
+def test_interval_and_until():
+    occurrences = recurrence.expand("2025-01-06", "2025-01-06", "weekly", interval=2, until=date(2025, 2, 3))
+    assert starts(occurrences) == [date(2025, 1, 6), date(2025, 1, 20), date(2025, 2, 3)]
+    assert starts(recurrence.expand(date(2025, 1, 1), date(2025, 1, 1), "daily", count=3)) == [date(2025, 1, 1), date(2025, 1, 2), date(2025, 1, 3)]
+
+
+@pytest.mark.parametrize("kwargs, message", [
+    ({"frequency": "daily", "count": recurrence.MAX_OCCURRENCES}, None),
+    ({"frequency": "daily", "count": recurrence.MAX_OCCURRENCES + 1}, "at most"),
+    ({"frequency": "daily", "until": date(2027, 1, 1)}, "at most"),
+    ({"frequency": "weekly", "until": date(2024, 12, 31)}, "before the start date"),
+    ({"frequency": "weekly", "count": 2, "interval": 0}, "interval"),
+    ({"frequency": "yearly", "count": 2}, "Unknown frequency"),
+    ({"frequency": "weekly"}, "end date or a number"),
+])
+def test_limits(kwargs, message):
+    if message is None:
+        assert recurrence.expand(date(2025, 1, 1), date(2025, 1, 1), **kwargs).height == recurrence.MAX_OCCURRENCES
+        return
+    with pytest.raises(ValueError, match=message):
+        recurrence.expand(date(2025, 1, 1), date(2025, 1, 1), **kwargs)
+
+
+def test_insert_series_ties_occurrences_together(empty_db):
+    entry = {"department_code": "WASH", "advisor_short_name": "AN", "start_date": datetime(2025, 1, 6), "end_date": datetime(2025, 1, 7), "event_name": "Mission"}
+    first = recurrence.insert_series(recurrence.occurrences(entry, "weekly", count=3))
+    second = recurrence.insert_series(recurrence.occurrences(entry, "monthly", count=2))
+
+    series = db.read_query("SELECT id, series_id FROM calendar ORDER BY id")
+    assert series.get_column("id").to_list() == first + second
+    assert series.get_column("series_id").n_unique() == 2
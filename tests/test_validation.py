@@ -0,0 +1,41 @@
+import polars as pl
+import pytest
+from utils import db, validation
+
+
+def test_validate_reports_each_failing_row_and_rule(empty_db):
+    db.insert_row("departments", {"name": "Water", "code": "WASH"})
+    advisors = pl.DataFrame({
+        "department_code": ["WASH", "EDU", "WASH"],
+        "name": ["Ana", "Ben", None],
+        "short_name": ["AN", "BE", "CL"],
+        "email": ["ana@example.org", "ben", None],
+        "colour": ["#112233", "#12", None],
+    })
+    errors = validation.validate("advisors", advisors)
+    assert errors.rows() == [
+        (1, "colour", "Colour must be a valid HEX code (e.g., #FF5733)."),
+        (1, "department_code", "Department code is not in the departments table."),
+        (1, "email", "Email must be a valid email address."),
+        (2, "name", "Name is required."),
+    ]
+    assert validation.describe(errors, first_row=2)[-1] == "Name is required. Row(s) 4"
+
+
+def test_lookups_accept_rows_written_together(empty_db):
+    calendar = pl.DataFrame({"department_code": ["WASH"], "advisor_short_name": ["AN"], "event_name": ["Leave"]})
+    assert validation.validate("calendar", calendar).get_column("column").to_list() == ["advisor_short_name", "event_name"]
+    incoming = {"advisors": pl.DataFrame({"short_name": ["AN"]}), "events": pl.DataFrame({"name": ["Leave"]})}
+    assert validation.validate("calendar", calendar, incoming).is_empty()
+
+
+def test_modal_records_require_an_email(empty_db):
+    db.insert_row("departments", {"name": "Water", "code": "WASH"})
+    advisor = {"department_code": "WASH", "name": "Ana", "short_name": "AN", "email": None}
+    # Imported sheets may leave it empty, the modals may not
+    assert validation.validate("advisors", pl.DataFrame([advisor])).is_empty()
+    with pytest.raises(ValueError, match="Email is required"):
+        validation.check_row("advisors", advisor)
+    with pytest.raises(ValueError, match="Email is required"):
+        validation.check_row("country_focals", {"department_code": "WASH", "name": "Focal", "country_name": "Kenya", "email": ""})
+    validation.check_row("advisors", {**advisor, "email": "ana@example.org"})
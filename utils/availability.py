@@ -0,0 +1,146 @@
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from datetime import datetime, date, timedelta
+from .db import read_query, table_version
+
+# Calendar events during which an advisor still counts as available
+AVAILABLE_EVENTS = ("No travel",)
+
+ROWS_SQL = (
+    "SELECT id, advisor_short_name, start_date, end_date FROM calendar "
+    f"WHERE department_code = ? AND event_name NOT IN ({', '.join('?' * len(AVAILABLE_EVENTS))})"
+)
+
+
+def day_interval(start, end):
+    # Calendar events cover whole days, from the start date to the end date included
+    start = datetime(start.year, start.month, start.day)
+    end = datetime(end.year, end.month, end.day) + timedelta(days=1)
+    return start, max(end, start + timedelta(days=1))
+
+
+class IntervalIndex:
+    """
+    Busy intervals of the advisors of one department.
+    The events of each advisor are kept sorted by start and merged into disjoint
+    busy blocks, so that overlap and free-slot queries are binary searches over
+    the blocks. Adding or removing an event only re-merges that advisor's blocks.
+    """
+
+    def __init__(self, rows=(), version=None):
+        self.version = version
+        self.events = {}  # id -> (advisor, start, end)
+        self._by_advisor = defaultdict(list)  # advisor -> [(start, end, id)] sorted by start
+        self._blocks = {}  # advisor -> (starts, ends, first event, last event + 1)
+        for row_id, advisor, start, end in rows:
+            self.add(row_id, advisor, start, end)
+
+    def add(self, row_id, advisor, start, end):
+        if row_id in self.events:
+            self.remove(row_id)
+        start, end = day_interval(start, end)
+        self.events[row_id] = (advisor, start, end)
+        insort(self._by_advisor[advisor], (start, end, row_id))
+        self._blocks.pop(advisor, None)
+
+    def remove(self, row_id):
+        advisor, start, end = self.events.pop(row_id)
+        events = self._by_advisor[advisor]
+        events.pop(bisect_left(events, (start, end, row_id)))
+        self._blocks.pop(advisor, None)
+
+    @property
+    def advisors(self):
+        return sorted(advisor for advisor, events in self._by_advisor.items() if events)
+
+    def _busy_blocks(self, advisor):
+        if advisor not in self._blocks:
+            starts, ends, first, last = [], [], [], []
+            for i, (start, end, _) in enumerate(self._by_advisor.get(advisor, [])):
+                if ends and start <= ends[-1]:
+                    ends[-1] = max(ends[-1], end)
+                    last[-1] = i + 1
+                else:
+                    starts.append(start)
+                    ends.append(end)
+                    first.append(i)
+                    last.append(i + 1)
+            self._blocks[advisor] = (starts, ends, first, last)
+        return self._blocks[advisor]
+
+    def _blocks_between(self, advisor, start, end):
+        # Indexes of the busy blocks overlapping [start, end)
+        starts, ends, _, _ = self._busy_blocks(advisor)
+        return range(bisect_right(ends, start), bisect_left(starts, end))
+
+    def is_free(self, advisor, start, end) -> bool:
+        return not self._blocks_between(advisor, start, end)
+
+    def free_advisors(self, advisors, start, end) -> list:
+        return [advisor for advisor in advisors if self.is_free(advisor, start, end)]
+
+    def overlapping(self, start, end, advisors=None) -> list:
+        # Ids of the events overlapping [start, end)
+        ids = []
+        for advisor in advisors if advisors is not None else self.advisors:
+            _, _, first, last = self._busy_blocks(advisor)
+            events = self._by_advisor.get(advisor, [])
+            for b in self._blocks_between(advisor, start, end):
+                ids += [row_id for s, e, row_id in events[first[b]:last[b]] if s < end and e > start]
+        return ids
+
+    def free_slots(self, advisors, start, end, min_length=timedelta(days=1)) -> list:
+        # Periods within [start, end) during which all the advisors are free
+        busy = []
+        for advisor in advisors:
+            starts, ends, _, _ = self._busy_blocks(advisor)
+            busy += [(starts[b], ends[b]) for b in self._blocks_between(advisor, start, end)]
+        slots, cursor = [], start
+        for busy_start, busy_end in sorted(busy):
+            if busy_start - cursor >= min_length:
+                slots.append((cursor, busy_start))
+            cursor = max(cursor, busy_end)
+        if end - cursor >= min_length:
+            slots.append((cursor, end))
+        return slots
+
+
+# One index per department, shared by all sessions
+_indexes = {}
+
+def get_index(dept: str) -> IntervalIndex:
+    version = table_version("calendar", dept)
+    index = _indexes.get(dept)
+    if index is None or index.version != version:
+        rows = read_query(ROWS_SQL, [dept, *AVAILABLE_EVENTS]).iter_rows()
+        index = IntervalIndex(rows, version)
+        _indexes[dept] = index
+    return index
+
+def apply(dept: str, op: str, row_id):
+    """
+    Apply a single write to the calendar ("insert", "update" or "delete" of
+    row `row_id`), called right after it. When other writes happened in the
+    meantime, the index is left stale and rebuilt on its next use.
+    """
+    index = _indexes.get(dept)
+    if index is None or index.version is None:
+        return
+    version = table_version("calendar", dept)
+    if version != (index.version[0], index.version[1] + 1):
+        index.version = None
+        return
+    if row_id in index.events:
+        index.remove(row_id)
+    if op != "delete":
+        row = read_query(ROWS_SQL + " AND id = ?", [dept, *AVAILABLE_EVENTS, row_id])
+        if row.height:
+            index.add(*row.row(0))
+    index.version = version
+
+
+def as_datetime(value) -> datetime:
+    # Query parameters and date inputs to the start of their day
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    return datetime(value.year, value.month, value.day)
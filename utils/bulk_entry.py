@@ -0,0 +1,107 @@
+import io
+import re
+import fastexcel
+import polars as pl
+from . import db, validation
+
+# Bulk timesheet entry: rows uploaded as a CSV/Excel file or pasted from a
+# spreadsheet are parsed, validated as one batch and inserted in one statement.
+COLUMNS = ["date", "country_name", "sal_attendees", "country_attendees", "support_name", "description", "hours"]
+REQUIRED = ["date", "country_name", "sal_attendees", "support_name"]
+# Other accepted headers (compared lower case, spaces as underscores)
+ALIASES = {
+    "country": "country_name", "countries": "country_name", "country(ies)": "country_name",
+    "advisor": "sal_attendees", "advisors": "sal_attendees", "advisor(s)": "sal_attendees",
+    "country_attendee": "country_attendees", "country_attendee(s)": "country_attendees",
+    "support": "support_name", "type": "support_name", "type_of_support": "support_name",
+}
+MULTI_VALUED = ["country_name", "sal_attendees"]
+DEFAULT_HOURS = 1.0
+
+
+def read(source: str, name: str = None) -> pl.DataFrame:
+    """
+    Cells of an uploaded file (`source` is its path and `name` its file name:
+    .xlsx, .csv, .tsv or .txt) or of pasted text (`name` None, tab separated
+    when copied from a spreadsheet, else comma separated), all read as text.
+    The first row holds the column names.
+    """
+    if name is not None and name.lower().endswith(".xlsx"):
+        return fastexcel.read_excel(source).load_sheet(0, dtypes="string").to_polars()
+    if name is not None:
+        with open(source, encoding="utf-8-sig") as f:
+            source = f.read()
+    source = source.strip("\n")
+    separator = "\t" if "\t" in source.split("\n", 1)[0] else ","
+    return pl.read_csv(io.StringIO(source), separator=separator, infer_schema=False)
+
+
+def prepare(cells: pl.DataFrame, dept: str):
+    """
+    Timesheet rows of `dept` from the cells returned by read(), with the
+    errors of each row: (rows, errors), see validation.validate for errors.
+    Raises ValueError when required columns are missing.
+    """
+    names = {column: re.sub(r"\s+", "_", column.strip().lower()) for column in cells.columns}
+    cells = cells.rename({column: ALIASES.get(name, name) for column, name in names.items()})
+    missing = [column for column in REQUIRED if column not in cells.columns]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}. Expected: {', '.join(COLUMNS)}.")
+
+    text = {column: pl.col(column).str.strip_chars() if column in cells.columns else pl.lit(None, pl.String) for column in COLUMNS}
+    # Spreadsheet dates come as "2024-01-31 00:00:00", typed ones as 2024-01-31 or 31/01/2024
+    date = pl.coalesce(
+        text["date"].str.slice(0, 10).str.to_date("%Y-%m-%d", strict=False),
+        text["date"].str.to_date("%d/%m/%Y", strict=False)
+    )
+    rows = (
+        cells
+        # Blank lines of a pasted grid
+        .filter(pl.any_horizontal(pl.col(column).str.strip_chars().fill_null("") != "" for column in cells.columns))
+        .select(
+            pl.lit(dept).alias("department_code"),
+            date.alias("date"),
+            *[
+                text[column].str.replace_all(";", ",").str.split(",").list.eval(pl.element().str.strip_chars()).list.join(", ").alias(column)
+                if column in MULTI_VALUED else text[column].alias(column)
+                for column in COLUMNS if column not in ("date", "hours")
+            ],
+            text["hours"].cast(pl.Float64, strict=False).alias("hours"),
+            text["date"].alias("_date"),
+            text["hours"].alias("_hours"),
+        )
+    )
+    # Cells that couldn't be parsed, then the rules of the timesheet table
+    conversions = [
+        ("date", pl.col("date").is_null() & (pl.col("_date").fill_null("") != ""), "Date must be a date (YYYY-MM-DD or DD/MM/YYYY)."),
+        ("hours", pl.col("hours").is_null() & (pl.col("_hours").fill_null("") != ""), "Hours must be a number."),
+    ]
+    unparsed = pl.concat(
+        [
+            rows.with_row_index("row").filter(invalid).select(pl.col("row"), pl.lit(column).alias("column"), pl.lit(message).alias("message"))
+            for column, invalid, message in conversions
+        ]
+    )
+    rows = rows.drop(["_date", "_hours"]).with_columns(pl.col("hours").fill_null(DEFAULT_HOURS))
+    # One error per cell: a date that couldn't be parsed is not also reported as missing
+    errors = (
+        pl.concat([unparsed, validation.validate("timesheet", rows)])
+        .unique(["row", "column"], keep="first", maintain_order=True)
+        .sort(["row", "column"])
+    )
+    return rows, errors
+
+
+def preview(rows: pl.DataFrame, errors: pl.DataFrame) -> pl.DataFrame:
+    # Rows to show before saving, with their errors in a first column
+    messages = errors.group_by("row").agg(pl.col("message").str.join(" ").alias("errors"))
+    return (
+        rows.with_row_index("row")
+        .join(messages, on="row", how="left")
+        .select(pl.col("errors").fill_null(""), pl.exclude("row", "errors", "department_code"))
+    )
+
+
+def save(rows: pl.DataFrame) -> list:
+    # Insert validated rows in one transaction, returns their ids
+    return db.insert_rows("timesheet", rows)
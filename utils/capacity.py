@@ -0,0 +1,82 @@
+import numpy as np
+import polars as pl
+from .db import read_query, table_version
+from .occupancy import get_matrix
+from .availability import AVAILABLE_EVENTS
+
+# Hours of a working day, to turn available days into available hours
+HOURS_PER_DAY = 7.5
+
+# Weekly capacity of a department per year, split in the part derived from the
+# calendar (available days) and the part derived from the timesheet (logged
+# hours), each cached on its own table versions so that a write to one table
+# only recomputes its half before the join
+_available, _logged, _capacity = {}, {}, {}
+
+
+def available_days(dept: str, year: int) -> pl.DataFrame:
+    # Working days per advisor and week (Monday) without leave, missions, etc.
+    matrix = get_matrix(dept)
+    cached = _available.get((dept, year))
+    if cached is None or cached[0] is not matrix:
+        columns = matrix.years == year
+        days = matrix.days[columns]
+        weeks, week_index = np.unique(days - (days.astype(int) + 3) % 7, return_inverse=True)
+        unavailable = [code + 1 for code, event in enumerate(matrix.events) if event not in AVAILABLE_EVENTS]
+        free = matrix.working[:, columns] & ~np.isin(matrix.matrix[:, columns], unavailable)
+        in_week = (week_index[:, None] == np.arange(len(weeks))).astype(np.int32)  # days x weeks
+        free_days = free.astype(np.int32) @ in_week  # advisors x weeks
+        cached = (matrix, pl.DataFrame({
+            "advisor": np.repeat(matrix.advisors, len(weeks)).tolist(),
+            "week": np.tile(weeks, len(matrix.advisors)),
+            "available_days": free_days.ravel()
+        }, schema={"advisor": pl.String, "week": pl.Date, "available_days": pl.Int64}))
+        _available[(dept, year)] = cached
+    return cached[1]
+
+
+def logged_hours(dept: str, year: int) -> pl.DataFrame:
+    # Support hours per attendee and week, each attendee is credited the hours of the session
+    version = table_version("timesheet", dept)
+    cached = _logged.get((dept, year))
+    if cached is None or cached[0] != version:
+        cached = (version, read_query(
+            """
+            SELECT trim(attendee) AS advisor, date_trunc('week', date)::DATE AS week, sum(hours) AS logged_hours
+            FROM timesheet, unnest(string_split(sal_attendees, ',')) AS attendees(attendee)
+            WHERE department_code = ? AND year(date) = ? AND trim(attendee) <> ''
+            GROUP BY ALL
+            """,
+            [dept, year]
+        ))
+        _logged[(dept, year)] = cached
+    return cached[1]
+
+
+def weekly_capacity(dept: str, year: int) -> pl.DataFrame:
+    """
+    Available hours against logged support hours per advisor and week:
+    advisor, week, available_days, available_hours, logged_hours, load
+    (logged / available hours, null when the advisor wasn't available).
+    """
+    available, logged = available_days(dept, year), logged_hours(dept, year)
+    cached = _capacity.get((dept, year))
+    if cached is None or cached[0] is not available or cached[1] is not logged:
+        capacity = (
+            available.join(logged, on=["advisor", "week"], how="full", coalesce=True)
+            .with_columns(
+                pl.col("available_days").fill_null(0),
+                pl.col("logged_hours").fill_null(0.0)
+            )
+            .with_columns((pl.col("available_days") * HOURS_PER_DAY).alias("available_hours"))
+            .with_columns(
+                pl.when(pl.col("available_hours") > 0)
+                .then(pl.col("logged_hours") / pl.col("available_hours"))
+                .alias("load")
+            )
+            .select(["advisor", "week", "available_days", "available_hours", "logged_hours", "load"])
+            .sort(["advisor", "week"])
+        )
+        cached = (available, logged, capacity)
+        _capacity[(dept, year)] = cached
+    return cached[2]
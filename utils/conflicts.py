@@ -0,0 +1,68 @@
+import polars as pl
+from .db import read_query
+from .availability import AVAILABLE_EVENTS
+
+# Two calendar events of the same advisor conflict when they share at least one
+# day (events cover whole days, end date included). Both checks below are a
+# single range join in DuckDB rather than pairwise comparisons in Python.
+OVERLAP = "a.start_date::DATE <= b.end_date::DATE AND b.start_date::DATE <= a.end_date::DATE"
+# Events during which the advisor still counts as available (see availability.py)
+# never conflict, whether they are the new event or an existing one; the list is
+# a bound parameter of the queries
+AVAILABLE = list(AVAILABLE_EVENTS)
+FREE = "list_contains(?::VARCHAR[], {})"
+
+
+def find_conflicts(dept: str, advisor: str, start_date, end_date, exclude_id=None, event_name=None) -> pl.DataFrame:
+    # Events of `advisor` overlapping a new or edited event (`exclude_id` is the edited row)
+    sql = f"""
+    SELECT b.id, b.event_name, b.start_date, b.end_date
+    FROM (SELECT ?::DATE AS start_date, ?::DATE AS end_date) AS a
+    JOIN calendar AS b ON {OVERLAP}
+    WHERE b.department_code = ? AND b.advisor_short_name = ? AND (?::INTEGER IS NULL OR b.id <> ?::INTEGER)
+        AND NOT {FREE.format("b.event_name")} AND NOT {FREE.format("coalesce(?::VARCHAR, '')")}
+    ORDER BY b.start_date
+    """
+    return read_query(sql, [start_date, end_date, dept, advisor, exclude_id, exclude_id, AVAILABLE, AVAILABLE, event_name])
+
+
+def find_series_conflicts(dept: str, advisor: str, start_dates: list, end_dates: list, event_name=None) -> pl.DataFrame:
+    # Events of `advisor` overlapping any occurrence of a recurring entry, in one range join
+    sql = f"""
+    SELECT DISTINCT b.id, b.event_name, b.start_date, b.end_date
+    FROM (SELECT unnest(?::DATE[]) AS start_date, unnest(?::DATE[]) AS end_date) AS a
+    JOIN calendar AS b ON {OVERLAP}
+    WHERE b.department_code = ? AND b.advisor_short_name = ?
+        AND NOT {FREE.format("b.event_name")} AND NOT {FREE.format("coalesce(?::VARCHAR, '')")}
+    ORDER BY b.start_date
+    """
+    return read_query(sql, [start_dates, end_dates, dept, advisor, AVAILABLE, AVAILABLE, event_name])
+
+
+def scan_conflicts(dept: str) -> pl.DataFrame:
+    # Every pair of overlapping events of the department, one row per pair
+    sql = f"""
+    SELECT
+        a.advisor_short_name AS advisor,
+        greatest(a.start_date::DATE, b.start_date::DATE) AS overlap_start,
+        least(a.end_date::DATE, b.end_date::DATE) AS overlap_end,
+        a.id, a.event_name, a.start_date::DATE AS start_date, a.end_date::DATE AS end_date,
+        b.id AS other_id, b.event_name AS other_event_name, b.start_date::DATE AS other_start_date, b.end_date::DATE AS other_end_date
+    FROM calendar AS a
+    JOIN calendar AS b
+        ON a.department_code = b.department_code
+        AND a.advisor_short_name = b.advisor_short_name
+        AND a.id < b.id
+        AND {OVERLAP}
+    WHERE a.department_code = ? AND NOT {FREE.format("a.event_name")} AND NOT {FREE.format("b.event_name")}
+    ORDER BY overlap_start, advisor
+    """
+    return read_query(sql, [dept, AVAILABLE, AVAILABLE])
+
+
+def describe(conflicts: pl.DataFrame) -> str:
+    # Short list of conflicting events for notifications
+    return "; ".join(
+        f"{row['event_name']} ({row['start_date']:%d-%b-%Y} to {row['end_date']:%d-%b-%Y})"
+        for row in conflicts.iter_rows(named=True)
+    )
@@ -0,0 +1,122 @@
+import numpy as np
+import polars as pl
+from .db import read_query, table_version
+
+# Dimensions of the timesheet cube, in axis order, and the timesheet columns they come from.
+# Country and advisor hold comma separated lists: a session counts fully for each of them.
+DIMENSIONS = ("year", "month", "country", "support", "advisor")
+MULTI_VALUED = ("country", "advisor")
+ALL = 0  # slot of the multi-valued dimensions holding each session once, whatever its values
+
+
+class TimesheetCube:
+    """
+    Dense cube of support hours of a department: one float64 array indexed by
+    year, month, country, support type and advisor.
+    Slot 0 (ALL) of the country and advisor axes is a margin holding every
+    session once, so that totals over these axes don't count a session once per
+    country or attendee; slots 1.. hold the hours credited to each value. Any
+    combination of filters is then a slice of the cube followed by a sum, in
+    O(cells) and without reading the timesheet again.
+    """
+
+    def __init__(self, timesheet: pl.DataFrame):
+        timesheet = (
+            timesheet
+            .filter(pl.col("date").is_not_null())
+            .select(
+                pl.col("date").dt.year().alias("year"),
+                pl.col("date").dt.month().alias("month"),
+                pl.col("country_name").str.split(", ").alias("country"),
+                pl.col("support_name").alias("support"),
+                pl.col("sal_attendees").str.split(", ").alias("advisor"),
+                pl.col("hours").fill_null(0.0)
+            )
+        )
+        self.labels = {
+            "year": sorted(timesheet.get_column("year").unique().to_list()),
+            "month": list(range(1, 13)),
+            "support": sorted(timesheet.get_column("support").drop_nulls().unique().to_list()) + [None]
+        }
+        for dim in MULTI_VALUED:
+            self.labels[dim] = [None] + sorted(timesheet.get_column(dim).explode().drop_nulls().unique().to_list())
+        self.index = {dim: {label: i for i, label in enumerate(labels)} for dim, labels in self.labels.items()}
+        self.cube = np.zeros([len(self.labels[dim]) for dim in DIMENSIONS])
+
+        # One cell per session, country (or ALL) and advisor (or ALL)
+        cells = timesheet
+        for dim in MULTI_VALUED:
+            cells = cells.with_columns(
+                pl.concat_list(pl.lit([None], dtype=pl.List(pl.String)), pl.col(dim).fill_null([])).alias(dim)
+            ).explode(dim)
+        positions = tuple(
+            np.array([self.index[dim][value] for value in cells.get_column(dim).to_list()], dtype=np.intp)
+            for dim in DIMENSIONS
+        )
+        np.add.at(self.cube, positions, cells.get_column("hours").to_numpy())
+
+    def _axis(self, dim, value, grouped):
+        # Slots of one axis for a filter value (a label, a list of labels or None for all)
+        offset = 1 if dim in MULTI_VALUED else 0
+        if value is None:
+            if dim in MULTI_VALUED and not grouped:
+                return [ALL]
+            return list(range(offset, len(self.labels[dim])))
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        return [self.index[dim][v] for v in values if v in self.index[dim] and self.index[dim][v] >= offset]
+
+    def aggregate(self, by=(), **filters) -> pl.DataFrame:
+        """
+        Hours summed over every dimension not in `by`, one row per non-empty
+        combination of `by`, e.g. aggregate(["month"], year=2024, country="Chad").
+        Filters take a label or a list of labels; on country and advisor a list
+        credits a session once per matching value.
+        """
+        unknown = (set(by) | set(filters)) - set(DIMENSIONS)
+        if unknown:
+            raise ValueError(f"Unknown cube dimension(s): {', '.join(sorted(unknown))}")
+        axes = [self._axis(dim, filters.get(dim), dim in by) for dim in DIMENSIONS]
+        cells = self.cube[np.ix_(*axes)]
+        cells = cells.sum(axis=tuple(i for i, dim in enumerate(DIMENSIONS) if dim not in by))
+        if not by:
+            return pl.DataFrame({"hours": [float(cells)]})
+        order = [dim for dim in DIMENSIONS if dim in by]
+        cells = cells.transpose([order.index(dim) for dim in by])
+        positions = np.nonzero(cells)
+        data = {
+            dim: [self.labels[dim][axes[DIMENSIONS.index(dim)][i]] for i in positions[k]]
+            for k, dim in enumerate(by)
+        }
+        data["hours"] = cells[positions]
+        return pl.DataFrame(data, schema={**{dim: self.schema(dim) for dim in by}, "hours": pl.Float64})
+
+    def pivot(self, index, on, **filters) -> pl.DataFrame:
+        # Wide table of hours with the values of `index` as rows and those of `on` as columns
+        index = [index] if isinstance(index, str) else list(index)
+        return (
+            self.aggregate(index + [on], **filters)
+            .with_columns(pl.col(on).cast(pl.String))
+            .pivot(on=on, index=index, values="hours")
+            .fill_null(0.0)
+            .sort(index)
+        )
+
+    @staticmethod
+    def schema(dim):
+        return pl.Int64 if dim in ("year", "month") else pl.String
+
+
+# One cube per department, rebuilt when its timesheet changes
+_cubes = {}
+
+def get_cube(dept: str) -> TimesheetCube:
+    version = table_version("timesheet", dept)
+    cached = _cubes.get(dept)
+    if cached is None or cached[0] != version:
+        timesheet = read_query(
+            "SELECT date, country_name, support_name, sal_attendees, hours FROM timesheet WHERE department_code = ?",
+            [dept]
+        )
+        cached = (version, TimesheetCube(timesheet))
+        _cubes[dept] = cached
+    return cached[1]
@@ -5,13 +5,39 @@ import os
 
 # DB_PATH = Path("data/db.duckdb")
 DB_PATH = os.path.join(os.getcwd(),"data","db.duckdb")
+# Public holidays of the countries advisors can be on duty in, 2024-2030
+# (generated with the `holidays` package). Rows missing from the holidays table
+# are added at every start, so appending later years (or other countries) to
+# the file extends existing databases too
+HOLIDAYS_PATH = os.path.join(os.getcwd(),"data","holidays.csv")
 
 def get_db_connection():
     return duckdb.connect(database=str(DB_PATH), read_only=False)
 
 
-def initialize_db():
-    conn = get_db_connection()
+# Per-table write counters, bumped by every CRUD helper below. In-memory caches
+# (search indexes, figures, ...) key their entries on these versions so that a
+# write to one table only invalidates what was derived from it.
+# Writes are also counted per department when the written rows are known
+# (key (table, dept)); writes that can't be attributed (imports, tables without
+# department) are counted under (table, None) and invalidate every department.
+_table_versions = {}
+
+def table_version(table: str, dept: str=None):
+    if dept is None:
+        return _table_versions.get(table, 0)
+    return (_table_versions.get((table, None), 0), _table_versions.get((table, dept), 0))
+
+def bump_table_version(table: str, depts: list=None):
+    _table_versions[table] = _table_versions.get(table, 0) + 1
+    for key in [(table, dept) for dept in set(depts)] if depts is not None else [(table, None)]:
+        _table_versions[key] = _table_versions.get(key, 0) + 1
+
+
+def initialize_db(conn=None):
+    # conn: run the DDL on another connection (e.g. in memory, see excel_io.table_schemas)
+    own_conn = conn is None
+    conn = conn or get_db_connection()
 
     conn.execute("""
     CREATE SEQUENCE IF NOT EXISTS advisors_id_seq START 1;
@@ -24,11 +50,18 @@ def initialize_db():
         role TEXT,
         email TEXT,
         active BOOLEAN DEFAULT TRUE,
-        country_code TEXT,
+        country_codes TEXT,
         colour TEXT(7)
     );
     """)
 
+    # Comma separated ISO codes of the countries the advisor supports (see the
+    # allocations maps); databases created before were given an unused country_code
+    conn.execute("ALTER TABLE advisors ADD COLUMN IF NOT EXISTS country_codes TEXT")
+
+    # Country whose public holidays apply to the advisor (see the holidays table)
+    conn.execute("ALTER TABLE advisors ADD COLUMN IF NOT EXISTS duty_country_code TEXT(3)")
+
     conn.execute("""
     CREATE SEQUENCE IF NOT EXISTS departments_id_seq START 1;
     
@@ -54,6 +87,12 @@ def initialize_db():
     );
     """)
 
+    # Occurrences of a recurring entry share a series id (see recurrence.py),
+    # numbered after the series of databases created before the sequence
+    conn.execute("ALTER TABLE calendar ADD COLUMN IF NOT EXISTS series_id INTEGER")
+    series_start = conn.execute("SELECT coalesce(max(series_id), 0) + 1 FROM calendar").fetchone()[0]
+    conn.execute(f"CREATE SEQUENCE IF NOT EXISTS calendar_series_seq START {series_start}")
+
     conn.execute("""
     CREATE SEQUENCE IF NOT EXISTS timesheet_id_seq START 1;
     
@@ -63,13 +102,17 @@ def initialize_db():
         date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         country_name TEXT NOT NULL,
         sal_attendees TEXT NOT NULL,
-        country_attendees TEXT NOT NULL,
+        country_attendees TEXT,
         support_name TEXT NOT NULL,
         description TEXT,
         hours FLOAT DEFAULT 1.0
     );
     """)
 
+    # Not every support session has country attendees (the sample workbook has
+    # timesheet rows without any); older databases declared the column NOT NULL
+    conn.execute("ALTER TABLE timesheet ALTER COLUMN country_attendees DROP NOT NULL")
+
     conn.execute("""
     CREATE SEQUENCE IF NOT EXISTS matrix_id_seq START 1;
     
@@ -129,6 +172,14 @@ def initialize_db():
     );
     """)
 
+    conn.execute("""   
+    CREATE TABLE IF NOT EXISTS holidays (
+        country_code TEXT(3) NOT NULL,
+        date DATE NOT NULL,
+        name TEXT
+    );
+    """)
+
     conn.execute("""   
     CREATE TABLE IF NOT EXISTS support (
         category TEXT NOT NULL,
@@ -138,8 +189,30 @@ def initialize_db():
     );
     """)
 
+    seeded = own_conn and seed_holidays(conn)
+
     conn.commit()
-    conn.close()
+    if own_conn:
+        conn.close()
+    if seeded:
+        bump_table_version("holidays")
+
+
+def seed_holidays(conn, path: str=None) -> bool:
+    # Add the holidays of the seed file whose (country_code, date) is missing, returns whether rows were added
+    path = path or HOLIDAYS_PATH
+    if not os.path.exists(path):
+        return False
+    added = conn.execute(
+        """
+        INSERT INTO holidays BY NAME
+        SELECT DISTINCT ON (s.country_code, s.date) s.*
+        FROM read_csv(?, header=true, columns={'country_code': 'TEXT', 'date': 'DATE', 'name': 'TEXT'}) AS s
+        ANTI JOIN holidays AS h ON h.country_code = s.country_code AND h.date = s.date
+        """,
+        [path]
+    ).fetchone()[0]
+    return added > 0
 
 
 # # ----------------------------
@@ -164,8 +237,33 @@ def insert_row(table: str, row: dict):
     cols = ", ".join(row.keys())
     placeholders = ", ".join(["?"] * len(row))
     sql = f"INSERT INTO {table} ({cols}) VALUES ({placeholders})"
-    conn.execute(sql, list(row.values()))
+    # Return the id of the new row (tables without an id column return None)
+    has_id = "id" in table_columns(table)
+    if has_id:
+        sql += " RETURNING id"
+    result = conn.execute(sql, list(row.values())).fetchone()
     conn.close()
+    bump_table_version(table, [row["department_code"]] if "department_code" in row else None)
+    return result[0] if has_id else None
+
+def insert_rows(table: str, rows: pl.DataFrame) -> list:
+    # Insert a batch of rows in one statement and transaction, with a single
+    # version bump; returns the ids of the new rows (empty without id column)
+    rows = rows.drop("id", strict=False)
+    conn = get_db_connection()
+    try:
+        conn.register("tmp_rows", rows)
+        sql = f"INSERT INTO {table} BY NAME SELECT * FROM tmp_rows"
+        has_id = "id" in table_columns(table)
+        if has_id:
+            sql += " RETURNING id"
+        conn.execute("BEGIN TRANSACTION")
+        result = conn.execute(sql).fetchall()
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+    bump_table_version(table, rows.get_column("department_code").unique().to_list() if "department_code" in rows.columns else None)
+    return [r[0] for r in result] if has_id else []
 
 # READ
 def read_table(table: str, where: str=None) -> pl.DataFrame:
@@ -177,6 +275,98 @@ def read_table(table: str, where: str=None) -> pl.DataFrame:
     df = conn.execute(sql).pl()
     conn.close()
     return df
+
+def read_query(sql: str, params: list=None) -> pl.DataFrame:
+    conn = get_db_connection()
+    df = conn.execute(sql, params or []).pl()
+    conn.close()
+    return df
+
+# Distinct values of an expression (e.g. the years of a date column), cached until
+# the table is written to again. Used for the choices of the dashboard filters.
+_distinct_cache = {}
+
+def distinct_values(table: str, expr: str, where: str=None, params: list=None) -> list:
+    key = (table, expr, where, tuple(params or []))
+    version = table_version(table)
+    cached = _distinct_cache.get(key)
+    if cached is None or cached[0] != version:
+        sql = f"SELECT DISTINCT {expr} AS value FROM {table}"
+        if where:
+            sql += f" WHERE {where}"
+        sql += " ORDER BY value"
+        conn = get_db_connection()
+        values = [row[0] for row in conn.execute(sql, params or []).fetchall() if row[0] is not None]
+        conn.close()
+        cached = (version, values)
+        _distinct_cache[key] = cached
+    return cached[1]
+
+def table_columns(table: str) -> list[str]:
+    conn = get_db_connection()
+    sql = "SELECT column_name FROM information_schema.columns WHERE table_name = ? ORDER BY ordinal_position"
+    columns = [row[0] for row in conn.execute(sql, [table]).fetchall()]
+    conn.close()
+    return columns
+
+# READ (paged)
+def _page_filter(table: str, where: str=None, search: str=None):
+    # Combine the caller's WHERE clause with a case-insensitive search over all columns
+    clauses, params = [], []
+    if where:
+        clauses.append(f"({where})")
+    if search:
+        columns = table_columns(table)
+        clauses.append("(" + " OR ".join([f"CAST({col} AS TEXT) ILIKE ?" for col in columns]) + ")")
+        params += [f"%{search}%"] * len(columns)
+    return clauses, params
+
+def read_page(table: str, where: str=None, order_by: str="id", descending: bool=True, after: tuple=None, limit: int=100, search: str=None):
+    """
+    Keyset pagination: return at most `limit` rows ordered by (order_by, id),
+    starting right after the `after` cursor, plus the cursor of the next page
+    (None on the last page). NULL sort values are always placed last.
+    """
+    if order_by not in table_columns(table):
+        raise ValueError(f"Unknown column '{order_by}' for table '{table}'")
+
+    clauses, params = _page_filter(table, where, search)
+    op = "<" if descending else ">"
+    if after is not None:
+        value, last_id = after
+        if value is None:
+            clauses.append(f"({order_by} IS NULL AND id {op} ?)")
+            params += [last_id]
+        else:
+            clauses.append(f"({order_by} {op} ? OR ({order_by} = ? AND id {op} ?) OR {order_by} IS NULL)")
+            params += [value, value, last_id]
+
+    direction = "DESC" if descending else "ASC"
+    sql = f"SELECT * FROM {table}"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += f" ORDER BY {order_by} {direction} NULLS LAST, id {direction} LIMIT {int(limit) + 1}"
+
+    df = read_query(sql, params)
+    if df.height <= limit:
+        return df, None
+    df = df.head(limit)
+    return df, (df.get_column(order_by)[-1], df.get_column("id")[-1])
+
+# READ (date range)
+def read_overlapping(table: str, start_col: str, end_col: str, start, end, where: str=None) -> pl.DataFrame:
+    # Rows whose [start_col, end_col] interval overlaps [start, end)
+    sql = f"SELECT * FROM {table} WHERE {start_col} < ? AND {end_col} >= ?"
+    if where:
+        sql += f" AND ({where})"
+    return read_query(sql, [end, start])
+
+def count_rows(table: str, where: str=None, search: str=None) -> int:
+    clauses, params = _page_filter(table, where, search)
+    sql = f"SELECT COUNT(*) FROM {table}"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    return read_query(sql, params).item()
     
 
 # UPDATE
@@ -184,12 +374,22 @@ def update_row(table: str, updates: dict, where: str):
     conn = get_db_connection()
     set_clause = ", ".join([f"{col} = ?" for col in updates.keys()])
     sql = f"UPDATE {table} SET {set_clause} WHERE {where}"
-    conn.execute(sql, list(updates.values()))
+    depts = None
+    if "department_code" in table_columns(table):
+        # Departments of the rows before and after the update
+        depts = [r[0] for r in conn.execute(f"SELECT DISTINCT department_code FROM {table} WHERE {where}").fetchall()]
+        sql += " RETURNING department_code"
+    result = conn.execute(sql, list(updates.values())).fetchall()
     conn.close()
+    bump_table_version(table, depts + [r[0] for r in result] if depts is not None else None)
 
 # DELETE
 def delete_row(table: str, where: str):
     conn = get_db_connection()
     sql = f"DELETE FROM {table} WHERE {where}"
-    conn.execute(sql)
-    conn.close()
\ No newline at end of file
+    has_dept = "department_code" in table_columns(table)
+    if has_dept:
+        sql += " RETURNING department_code"
+    result = conn.execute(sql).fetchall()
+    conn.close()
+    bump_table_version(table, [r[0] for r in result] if has_dept else None)
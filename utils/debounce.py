@@ -0,0 +1,100 @@
+import time
+from shiny import reactive
+
+# Delay reactive recomputation until a value has settled.
+#
+# Both helpers wrap a reactive function `f` (e.g. reading a few inputs) and
+# return a reactive.Calc that only invalidates once per settled state:
+#   - debounce(delay): fires `delay` seconds after the last change
+#     (typing, clicking through several filters)
+#   - coalesce(window): fires immediately on the first change, then at most
+#     once per `window` seconds while changes keep coming (bursts of writes)
+# They must be created inside a session (i.e. in the server function).
+
+
+def debounce(delay: float):
+    def wrapper(f):
+        trigger = reactive.Value(0)
+        deadline = reactive.Value(None)
+        state = {"started": False}
+
+        @reactive.Effect(priority=102)
+        def _watch():
+            try:
+                f()  # Only to take a dependency on f's reactive sources
+            except Exception:
+                pass
+            # The initial value is served right away by the Calc below
+            if state["started"]:
+                deadline.set(time.monotonic() + delay)
+            state["started"] = True
+
+        @reactive.Effect(priority=101)
+        def _timer():
+            _fire_when_due(deadline, trigger)
+
+        return _settled(f, trigger)
+    return wrapper
+
+
+def coalesce(window: float):
+    def wrapper(f):
+        trigger = reactive.Value(0)
+        deadline = reactive.Value(None)
+        state = {"last": None}
+
+        @reactive.Effect(priority=102)
+        def _watch():
+            try:
+                f()  # Only to take a dependency on f's reactive sources
+            except Exception:
+                pass
+            now = time.monotonic()
+            if state["last"] is None:
+                # The initial value is served right away by the Calc below
+                state["last"] = now
+                return
+            with reactive.isolate():
+                if deadline() is not None:
+                    return  # Already waiting, this change is folded into the pending one
+                if now - state["last"] >= window:
+                    state["last"] = now
+                    trigger.set(trigger() + 1)
+                else:
+                    deadline.set(state["last"] + window)
+
+        @reactive.Effect(priority=101)
+        def _timer():
+            if _fire_when_due(deadline, trigger):
+                state["last"] = time.monotonic()
+
+        return _settled(f, trigger)
+    return wrapper
+
+
+def settle(policy):
+    # policy: ("debounce" | "coalesce", seconds)
+    kind, seconds = policy
+    return {"debounce": debounce, "coalesce": coalesce}[kind](seconds)
+
+
+def _fire_when_due(deadline, trigger) -> bool:
+    when = deadline()
+    if when is None:
+        return False
+    time_left = when - time.monotonic()
+    if time_left > 0:
+        reactive.invalidate_later(time_left)
+        return False
+    with reactive.isolate():
+        deadline.set(None)
+        trigger.set(trigger() + 1)
+    return True
+
+
+def _settled(f, trigger):
+    @reactive.Calc
+    @reactive.event(trigger, ignore_none=False)
+    def settled():
+        return f()
+    return settled
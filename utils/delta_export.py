@@ -0,0 +1,141 @@
+import io
+import os
+import zipfile
+from datetime import datetime
+import polars as pl
+import xlsxwriter
+from .db import get_db_connection
+
+# Each delta export records a snapshot of the database: the key and the hash of
+# every row, per table. Its id is the watermark to pass to the next delta
+# export, which then only emits the rows inserted, updated or deleted since.
+# The snapshot stays pending until the export has been delivered (see record),
+# so that a failed or interrupted download doesn't move the watermark.
+SNAPSHOT_DIR = os.path.join(os.getcwd(), "data", "export_snapshots")
+KEEP_SNAPSHOTS = 20
+KEY_COLUMN = "id"
+FORMATS = {"xlsx": "Excel", "csv": "CSV (zip)", "parquet": "Parquet (zip)"}
+
+
+def watermarks() -> list:
+    # Ids of the recorded snapshots, oldest first
+    if not os.path.isdir(SNAPSHOT_DIR):
+        return []
+    return sorted(name[:-len(".parquet")] for name in os.listdir(SNAPSHOT_DIR) if name.endswith(".parquet"))
+
+
+def _snapshot_path(watermark: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, f"{watermark}.parquet")
+
+
+def _pending_path(watermark: str) -> str:
+    return _snapshot_path(watermark) + ".pending"
+
+
+def record(watermark: str):
+    # Make the snapshot of a delivered export the latest watermark
+    os.replace(_pending_path(watermark), _snapshot_path(watermark))
+    for old in watermarks()[:-KEEP_SNAPSHOTS]:
+        os.remove(_snapshot_path(old))
+
+
+def discard(watermark: str):
+    # Drop the snapshot of an export that wasn't delivered (no-op once recorded)
+    if os.path.exists(_pending_path(watermark)):
+        os.remove(_pending_path(watermark))
+
+
+def _key(conn, table):
+    # Rows are matched on their id; tables without one are compared as a whole
+    columns = conn.execute(f"SELECT column_name, column_type FROM (DESCRIBE {table})").fetchall()
+    return dict(columns).get(KEY_COLUMN)
+
+
+def _table_delta(conn, table, key_type, snapshot) -> pl.DataFrame:
+    # Changed rows of one table with a `_change` column: insert, update, delete
+    # (only the id is filled) or snapshot (whole table of a table without id)
+    old = f"(SELECT key, row_hash FROM read_parquet('{snapshot}') WHERE table_name = '{table}')" if snapshot else \
+        "(SELECT NULL::VARCHAR AS key, NULL::UBIGINT AS row_hash WHERE false)"
+    if key_type is None:
+        changed = conn.execute(f"""
+            SELECT (SELECT count(*) FROM {table}) <> (SELECT count(*) FROM {old})
+                OR (SELECT sum(hash(t)::HUGEINT) FROM {table} AS t) IS DISTINCT FROM (SELECT sum(row_hash::HUGEINT) FROM {old})
+        """).fetchone()[0]
+        return conn.execute(f"SELECT *, 'snapshot' AS _change FROM {table}").pl() if changed else None
+    return conn.execute(f"""
+        SELECT t.*, CASE WHEN s.key IS NULL THEN 'insert' ELSE 'update' END AS _change
+        FROM {table} AS t LEFT JOIN {old} AS s ON s.key = t.{KEY_COLUMN}::VARCHAR
+        WHERE s.key IS NULL OR s.row_hash <> hash(t)
+        UNION ALL BY NAME
+        SELECT s.key::{key_type} AS {KEY_COLUMN}, 'delete' AS _change
+        FROM {old} AS s ANTI JOIN {table} AS t ON s.key = t.{KEY_COLUMN}::VARCHAR
+    """).pl()
+
+
+def _write_snapshot(conn, tables, keys, watermark):
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    rows = " UNION ALL ".join(
+        f"SELECT '{table}' AS table_name, "
+        f"{f'{KEY_COLUMN}::VARCHAR' if keys[table] else 'NULL::VARCHAR'} AS key, hash(t) AS row_hash FROM {table} AS t"
+        for table in tables
+    )
+    conn.execute(f"COPY ({rows}) TO '{_pending_path(watermark)}' (FORMAT parquet, COMPRESSION zstd)")
+
+
+def export_delta(file_path: str, fmt: str = "xlsx", since: str = None) -> str:
+    """
+    Write the rows changed since the snapshot `since` (all rows when None) to
+    `file_path`: an xlsx workbook or a zip of CSV/Parquet files, one sheet/file
+    per changed table plus a summary. Deleted rows are markers holding only
+    their id. The delta and the new snapshot are read in one transaction;
+    returns the new watermark, to record() once the file has been delivered.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown delta export format: {fmt}")
+    if since and not os.path.exists(_snapshot_path(since)):
+        raise ValueError(f"Unknown export watermark: {since}")
+    watermark = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+
+    conn = get_db_connection()
+    try:
+        conn.execute("BEGIN TRANSACTION")
+        tables = conn.execute("SHOW TABLES").pl()["name"].to_list()
+        keys = {table: _key(conn, table) for table in tables}
+        deltas = {}
+        for table in tables:
+            delta = _table_delta(conn, table, keys[table], _snapshot_path(since) if since else None)
+            if delta is not None and delta.height:
+                deltas[table] = delta
+        _write_snapshot(conn, tables, keys, watermark)
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+    summary = pl.DataFrame(
+        [
+            (table, change, rows, since or "", watermark)
+            for table, delta in deltas.items()
+            for change, rows in delta.group_by("_change").len().sort("_change").iter_rows()
+        ],
+        schema={"table": pl.String, "change": pl.String, "rows": pl.Int64, "since": pl.String, "until": pl.String},
+        orient="row"
+    )
+    try:
+        if fmt == "xlsx":
+            with xlsxwriter.Workbook(file_path) as wb:
+                summary.write_excel(workbook=wb, worksheet="summary")
+                for table, delta in deltas.items():
+                    delta.write_excel(workbook=wb, worksheet=table)
+        else:
+            with zipfile.ZipFile(file_path, "w", zipfile.ZIP_DEFLATED) as zf:
+                for name, df in {"summary": summary, **deltas}.items():
+                    buffer = io.BytesIO()
+                    if fmt == "csv":
+                        df.write_csv(buffer)
+                    else:
+                        df.write_parquet(buffer, compression="zstd")
+                    zf.writestr(f"{name}.{fmt}", buffer.getvalue())
+    except BaseException:
+        discard(watermark)
+        raise
+    return watermark
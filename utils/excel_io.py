@@ -1,36 +1,216 @@
 import polars as pl
-from .db import get_db_connection
+import pyarrow as pa
+import pyarrow.ipc
+from .db import get_db_connection, bump_table_version, initialize_db
+from . import validation
+from concurrent.futures import ThreadPoolExecutor
+import duckdb
 import xlsxwriter
 import fastexcel
 import os
+import re
+import tempfile
+import zipfile
 
 excel_file = os.path.join(os.getcwd(),"data","database.xlsx")
 db_file = os.path.join(os.getcwd(),"data","db.duckdb")
 
 
-def import_excel_to_db(file_path: str):
-    # Read the excel file
+# fastexcel dtypes of the DuckDB column types used in initialize_db
+EXCEL_DTYPES = {
+    "INTEGER": "int", "BIGINT": "int", "FLOAT": "float", "DOUBLE": "float",
+    "VARCHAR": "string", "BOOLEAN": "boolean", "TIMESTAMP": "datetime", "DATE": "date",
+}
+# Sheets load in parallel, one reader per thread
+IMPORT_THREADS = 4
+
+_schemas, _keys = {}, {}
+
+def table_schemas() -> dict:
+    """
+    Columns of every table as declared by the DDL of initialize_db, run once on
+    an in-memory database: {table: {column: (type, required)}}, where required
+    columns are NOT NULL without a default.
+    """
+    if not _schemas:
+        conn = duckdb.connect(":memory:")
+        initialize_db(conn)
+        for table, column, column_type, nullable, default in conn.execute(
+            "SELECT table_name, column_name, data_type, is_nullable, column_default FROM duckdb_columns() ORDER BY table_name, column_index"
+        ).fetchall():
+            _schemas.setdefault(table, {})[column] = (column_type, not nullable and default is None)
+        for table, columns in conn.execute(
+            "SELECT table_name, constraint_column_names FROM duckdb_constraints() WHERE constraint_type = 'PRIMARY KEY'"
+        ).fetchall():
+            _keys[table] = columns[0]
+        conn.close()
+    return _schemas
+
+
+def table_keys() -> dict:
+    # Primary key column of the tables declaring one in initialize_db (kept
+    # here since tables recreated by a Parquet or Arrow import lose it)
+    table_schemas()
+    return _keys
+
+
+def _load_sheet(file_path, sheet, schema):
+    # One sheet typed after its table's schema, with the missing columns and the
+    # cells that couldn't be converted reported as errors. Columns the table
+    # doesn't have are kept with the types read from the sheet (see _merge_sheet)
     wb = fastexcel.read_excel(file_path)
-    
-    # Make a dictionary of dataframes
-    dfs = {}
-    for sheet in wb.sheet_names:
-        dfs.update({f"{sheet}":wb.load_sheet(sheet).to_polars()})
+    if schema is None:
+        return wb.load_sheet(sheet).to_polars(), []
+    available = [column.name for column in wb.load_sheet(sheet, n_rows=0).available_columns()]
+    columns = [column for column in schema if column in available]
+    errors = [f"{sheet}: missing column {column}" for column, (_, required) in schema.items() if required and column not in available]
+    if not columns:
+        return None, errors or [f"{sheet}: none of the columns of the {sheet.lower()} table found"]
+    extra = [column for column in available if column not in schema]
+    typed = wb.load_sheet(sheet, use_columns=columns + extra, dtypes={column: EXCEL_DTYPES.get(schema[column][0], "string") for column in columns}).to_polars()
+    raw = wb.load_sheet(sheet, use_columns=columns, dtypes="string").to_polars()
+    for column in columns:
+        text = raw.get_column(column).str.strip_chars()
+        # Dates and numbers typed as text in the workbook are parsed from their text
+        dtype = EXCEL_DTYPES.get(schema[column][0])
+        if dtype in ("datetime", "date", "int", "float") and typed.get_column(column).is_null().any():
+            parsed = (
+                text.str.to_datetime(strict=False, time_unit="ms") if dtype == "datetime"
+                else text.str.to_date(strict=False) if dtype == "date"
+                else text.cast(pl.Float64, strict=False)
+            )
+            typed = typed.with_columns(pl.col(column).fill_null(parsed.cast(typed.get_column(column).dtype, strict=False)))
+        # Spreadsheet rows: 1-based, after the header row
+        unconverted = typed.get_column(column).is_null() & (text.fill_null("") != "")
+        if unconverted.any():
+            rows = (unconverted.arg_true() + 2).to_list()
+            errors.append(f"{sheet}.{column}: invalid {schema[column][0].lower()} in row(s) {', '.join(map(str, rows[:10]))}{' ...' if len(rows) > 10 else ''}")
+    return typed, errors
 
-    # Get a database connection
+
+def _merge_sheet(conn, table, df, key):
+    """
+    Merge the rows of a sheet into its table, comparing each row's hash with
+    the hash of the stored row (over the columns of the sheet, cast to the
+    table's types): unchanged rows are skipped, changed ones updated and new
+    ones inserted. Rows are matched on the primary key; rows without one
+    (or tables without key) are inserted unless an identical row exists.
+    Returns (inserted, updated, skipped).
+    """
+    conn.register("tmp_df", df)
+    # Columns of the sheet the table doesn't have yet are added to it
+    for column, column_type in conn.execute("SELECT column_name, column_type FROM (DESCRIBE SELECT * FROM tmp_df)").fetchall():
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS "{column}" {"VARCHAR" if column_type == "NULL" else column_type}')
+
+    columns = [f'"{column}"' for column in df.columns]
+    key = f'"{key}"' if key in df.columns else None
+    values = [column for column in columns if column != key]
+    # Excel keeps timestamps to the millisecond: stored ones are compared rounded
+    # the same way, so that an exported and re-imported row is unchanged
+    timestamps = {f'"{column}"' for column, column_type in conn.execute(f"SELECT column_name, column_type FROM (DESCRIBE {table})").fetchall() if column_type.startswith("TIMESTAMP")}
+    value = lambda alias, column: f"date_trunc('millisecond', {alias}.{column} + INTERVAL 500 MICROSECOND)" if column in timestamps else f"{alias}.{column}"
+    hashed = lambda alias: f"hash({', '.join(value(alias, column) for column in values)})" if values else "0::UBIGINT"
+
+    conn.execute(f"CREATE OR REPLACE TEMP TABLE staged AS SELECT {', '.join(columns)} FROM {table} LIMIT 0")
+    conn.execute("INSERT INTO staged BY NAME SELECT * FROM tmp_df")
+    conn.unregister("tmp_df")
+    if key:
+        # A key repeated in the sheet keeps its last row
+        conn.execute(f"""
+            CREATE OR REPLACE TEMP TABLE incoming AS
+            SELECT s.*, {hashed('s')} AS _row_hash, t.{key} IS NOT NULL AS _exists, {hashed('t')} AS _old_hash
+            FROM staged AS s LEFT JOIN {table} AS t ON t.{key} = s.{key}
+            QUALIFY s.{key} IS NULL OR row_number() OVER (PARTITION BY s.{key} ORDER BY s.rowid DESC) = 1
+        """)
+    else:
+        conn.execute(f"""
+            CREATE OR REPLACE TEMP TABLE incoming AS
+            SELECT s.*, {hashed('s')} AS _row_hash, false AS _exists, NULL::UBIGINT AS _old_hash FROM staged AS s
+        """)
+    unkeyed = f"{key} IS NULL" if key else "true"
+    new_rows = f"""
+        SELECT DISTINCT ON (_row_hash) {', '.join(values)} FROM incoming
+        WHERE {unkeyed} AND _row_hash NOT IN (SELECT {hashed('t')} FROM {table} AS t)
+    """
+    inserted = conn.execute(f"SELECT count(*) FROM ({new_rows})").fetchone()[0]
+    if inserted:
+        conn.execute(f"INSERT INTO {table} BY NAME {new_rows}")
+    updated = 0
+    if key:
+        inserted += conn.execute(f"""
+            INSERT INTO {table} BY NAME SELECT {', '.join(columns)} FROM incoming WHERE {key} IS NOT NULL AND NOT _exists
+        """).fetchone()[0]
+        if values:
+            updated = conn.execute(f"""
+                UPDATE {table} AS t SET {', '.join(f'{column} = i.{column}' for column in values)}
+                FROM incoming AS i WHERE t.{key} = i.{key} AND i._exists AND i._old_hash <> i._row_hash
+            """).fetchone()[0]
+    conn.execute("DROP TABLE staged")
+    conn.execute("DROP TABLE incoming")
+    return inserted, updated, df.height - inserted - updated
+
+
+def import_excel_to_db(file_path: str) -> dict:
+    """
+    Import every sheet of a workbook into the table of the same name.
+    Sheets of known tables are read with the column types of initialize_db
+    (columns the table doesn't have are added to it, in parallel threads) and validated first
+    (see validation.validate); nothing is written when a sheet has errors. They are then merged into their tables
+    (see _merge_sheet) in a single transaction, so that importing the same or
+    an overlapping workbook again only writes what changed and never
+    duplicates rows. Rows of a table missing from the sheet are kept.
+    Returns {table: (inserted, updated, skipped)} of the imported tables.
+    """
+    # Read the excel file
+    sheets = fastexcel.read_excel(file_path).sheet_names
+    # Columns added to the tables after their DDL (e.g. by earlier imports) are kept too
+    schemas = {table: dict(columns) for table, columns in table_schemas().items()}
     conn = get_db_connection()
-  
-    # Iterate over each sheet and import into the database
-    for sheet, df in dfs.items():
-        # Register the dataframe as a temporary table
-        conn.register("tmp_df", df)
-        # Create or replace the table in the database
-        conn.execute(f"CREATE OR REPLACE TABLE {sheet.lower()} AS SELECT * FROM tmp_df")
-
-    # Commit and close the connection
-    conn.commit()
+    for table, column, column_type in conn.execute(
+        "SELECT table_name, column_name, data_type FROM duckdb_columns() ORDER BY table_name, column_index"
+    ).fetchall():
+        if table in schemas:
+            schemas[table].setdefault(column, (column_type, False))
     conn.close()
 
+    # Make a dictionary of dataframes, loaded in parallel
+    with ThreadPoolExecutor(max_workers=IMPORT_THREADS) as pool:
+        loaded = dict(zip(sheets, pool.map(lambda sheet: _load_sheet(file_path, sheet, schemas.get(sheet.lower())), sheets)))
+    errors = [error for _, sheet_errors in loaded.values() for error in sheet_errors]
+    # Required values, formats, lookups, etc. (see validation.RULES); values
+    # referenced across sheets (e.g. a new advisor's calendar) may come from
+    # the workbook itself
+    incoming = {sheet.lower(): df for sheet, (df, _) in loaded.items() if df is not None and sheet.lower() in schemas}
+    for table, df in incoming.items():
+        errors += [f"{table}: {error}" for error in validation.describe(validation.validate(table, df, incoming), first_row=2)]
+    if errors:
+        raise ValueError("Invalid workbook: " + "; ".join(errors))
+
+    # Get a database connection
+    conn = get_db_connection()
+    counts = {}
+    try:
+        conn.execute("BEGIN TRANSACTION")
+        for sheet, (df, _) in loaded.items():
+            table = sheet.lower()
+            if table in schemas:
+                counts[table] = _merge_sheet(conn, table, df, table_keys().get(table))
+            else:
+                # Register the dataframe as a temporary table
+                conn.register("tmp_df", df)
+                # Create or replace the table in the database
+                conn.execute(f"CREATE OR REPLACE TABLE {table} AS SELECT * FROM tmp_df")
+                conn.unregister("tmp_df")
+                counts[table] = (df.height, 0, 0)
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+    # Tables left unchanged keep their version, and the caches derived from them
+    for table, (inserted, updated, _) in counts.items():
+        if inserted or updated:
+            bump_table_version(table)
+    return counts
+
 def ensure_sequences():
     """
     Ensures all ID sequences exist and are aligned with table data.
@@ -67,26 +247,205 @@ def ensure_sequences():
         conn.execute(f"CREATE SEQUENCE {seq} START {next_val}")
         conn.execute(f"ALTER TABLE {table} ALTER COLUMN id SET DEFAULT nextval('{seq}')")
 
+    # Series ids of recurring calendar entries (no column default, see recurrence.insert_series)
+    next_series = conn.execute("SELECT coalesce(max(series_id), 0) + 1 FROM calendar").fetchone()[0]
+    conn.execute(f"CREATE OR REPLACE SEQUENCE calendar_series_seq START {next_series}")
+
     print("✅ All sequences exist and are synced to current data.")
 
 
-def export_db_to_excel(file_path: str):
+# Rows fetched from DuckDB per Arrow record batch when exporting, and size of
+# the chunks the exported file is streamed to the browser in
+EXPORT_BATCH_ROWS = 10_000
+EXPORT_CHUNK_BYTES = 1 << 20
+
+def export_db_to_excel(file_path: str, progress=None):
+    """
+    Write every table of the database to a sheet of an xlsx file.
+    Tables are read in Arrow record batches and written with xlsxwriter's
+    constant_memory mode, which flushes each row to disk once the next one
+    starts, so memory stays flat whatever the size of the tables.
+    `progress(sheet, sheets, table, rows_written, table_rows)` is called when
+    a sheet starts and after each batch; it may raise to abort the export.
+    """
     # Get a database connection
     conn = get_db_connection()
 
     # Fetch all table names from the database
     tables = conn.execute("SHOW TABLES").pl()["name"].to_list()
-    print(tables)
-    
-    # Write each table to a separate sheet in the Excel file
-    with xlsxwriter.Workbook(file_path) as wb:
-        for table in tables:
-            df = conn.execute(f"SELECT * FROM {table}").pl()
-            df.write_excel(workbook=wb, worksheet=table)
-    
-    # Commit and close the connection
-    conn.commit()
-    conn.close()
+    report = progress or (lambda *args: None)
+
+    try:
+        options = {"constant_memory": True, "remove_timezone": True, "nan_inf_to_errors": True}
+        with xlsxwriter.Workbook(file_path, options) as wb:
+            header = wb.add_format({"bold": True})
+            formats = {
+                "date": wb.add_format({"num_format": "yyyy-mm-dd"}),
+                "timestamp": wb.add_format({"num_format": "yyyy-mm-dd hh:mm:ss"})
+            }
+            for sheet, table in enumerate(tables):
+                table_rows = conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+                report(sheet, len(tables), table, 0, table_rows)
+                ws = wb.add_worksheet(table)
+                batches = conn.execute(f"SELECT * FROM {table}").fetch_record_batch(EXPORT_BATCH_ROWS)
+                ws.write_row(0, 0, batches.schema.names, header)
+                ws.freeze_panes(1, 0)
+                # Date and datetime cells need a number format to show as dates in Excel
+                cell_formats = [
+                    formats["timestamp"] if pa.types.is_timestamp(field.type)
+                    else formats["date"] if pa.types.is_date(field.type)
+                    else None
+                    for field in batches.schema
+                ]
+                row = 1
+                for batch in batches:
+                    for values in zip(*(column.to_pylist() for column in batch.columns)):
+                        for col, value in enumerate(values):
+                            if value is not None:
+                                ws.write(row, col, value, cell_formats[col])
+                        row += 1
+                    report(sheet, len(tables), table, row - 1, table_rows)
+    finally:
+        # Close the connection, also when the export is aborted
+        conn.close()
+
+# Columnar formats: one file per table (Parquet or Arrow IPC, zstd compressed),
+# or a DuckDB EXPORT DATABASE snapshot (schema, sequences and Parquet data),
+# each delivered as a zip. Much faster to write and read back than Excel.
+EXPORT_FORMATS = {
+    "xlsx": ("Excel", "xlsx"),
+    "parquet": ("Parquet (zstd)", "zip"),
+    "arrow": ("Arrow IPC", "zip"),
+    "duckdb": ("DuckDB snapshot", "zip"),
+}
+
+def export_db(file_path: str, fmt: str = "xlsx", progress=None):
+    # Export the database in one of EXPORT_FORMATS, see export_db_to_excel for `progress`
+    if fmt == "xlsx":
+        return export_db_to_excel(file_path, progress)
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    report = progress or (lambda *args: None)
+
+    conn = get_db_connection()
+    try:
+        with tempfile.TemporaryDirectory(prefix="sal_export_") as directory:
+            if fmt == "duckdb":
+                report(0, 1, "database", 0, 0)
+                conn.execute(f"EXPORT DATABASE '{directory}' (FORMAT parquet, COMPRESSION zstd)")
+            else:
+                tables = conn.execute("SHOW TABLES").pl()["name"].to_list()
+                for sheet, table in enumerate(tables):
+                    table_rows = conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+                    report(sheet, len(tables), table, 0, table_rows)
+                    path = os.path.join(directory, f"{table}.{fmt}")
+                    if fmt == "parquet":
+                        conn.execute(f"COPY {table} TO '{path}' (FORMAT parquet, COMPRESSION zstd)")
+                    else:
+                        batches = conn.execute(f"SELECT * FROM {table}").fetch_record_batch(EXPORT_BATCH_ROWS)
+                        options = pa.ipc.IpcWriteOptions(compression="zstd")
+                        with pa.ipc.new_file(path, batches.schema, options=options) as writer:
+                            rows = 0
+                            for batch in batches:
+                                writer.write_batch(batch)
+                                rows += batch.num_rows
+                                report(sheet, len(tables), table, rows, table_rows)
+                    report(sheet, len(tables), table, table_rows, table_rows)
+            # The files are already compressed
+            with zipfile.ZipFile(file_path, "w", zipfile.ZIP_STORED) as zf:
+                for name in sorted(os.listdir(directory)):
+                    zf.write(os.path.join(directory, name), name)
+    finally:
+        conn.close()
+
+
+def detect_format(file_path: str) -> str:
+    # Format of a file to import, from the content of the zip (an xlsx is a zip too)
+    if zipfile.is_zipfile(file_path):
+        names = zipfile.ZipFile(file_path).namelist()
+        if "[Content_Types].xml" in names:
+            return "xlsx"
+        if "schema.sql" in names and "load.sql" in names:
+            return "duckdb"
+        for fmt in ("parquet", "arrow"):
+            if names and all(name.endswith(f".{fmt}") for name in names):
+                return fmt
+    raise ValueError("Expected an Excel workbook or a Parquet, Arrow or DuckDB export")
+
+def _replace_rows(conn, table: str, source: str, exists: bool):
+    # Rows of `source` in place of those of `table`; re-creating the table would drop its constraints
+    if exists:
+        # Columns the file has and the table doesn't (e.g. added by another version of the app) are added
+        known = {row[0] for row in conn.execute(f"SELECT column_name FROM (DESCRIBE {table})").fetchall()}
+        for column, column_type in conn.execute(f"SELECT column_name, column_type FROM (DESCRIBE SELECT * FROM {source})").fetchall():
+            if column not in known:
+                conn.execute(f'ALTER TABLE {table} ADD COLUMN "{column}" {column_type}')
+        conn.execute(f"DELETE FROM {table}")
+        conn.execute(f"INSERT INTO {table} BY NAME SELECT * FROM {source}")
+    else:
+        conn.execute(f"CREATE TABLE {table} AS SELECT * FROM {source}")
+
+def import_db(file_path: str, fmt: str = None) -> dict:
+    """
+    Import a file exported by export_db (format detected when not given).
+    A workbook is merged into the tables (see import_excel_to_db). Parquet and
+    Arrow files replace the rows of the tables they are named after (keeping
+    the tables of initialize_db with their constraints and defaults, unknown
+    tables are created), a DuckDB snapshot replaces the whole database; both
+    in a single transaction.
+    Returns {table: (inserted, updated, skipped)} of the imported tables, as
+    import_excel_to_db does; replaced tables count all their rows as inserted.
+    """
+    fmt = fmt or detect_format(file_path)
+    if fmt == "xlsx":
+        return import_excel_to_db(file_path)
+
+    conn = get_db_connection()
+    try:
+        with tempfile.TemporaryDirectory(prefix="sal_import_") as directory:
+            zipfile.ZipFile(file_path).extractall(directory)
+            conn.execute("BEGIN TRANSACTION")
+            if fmt == "duckdb":
+                # The snapshot recreates the tables and their sequences
+                replaced = conn.execute("SHOW TABLES").pl()["name"].to_list()
+                for table in replaced:
+                    conn.execute(f"DROP TABLE {table}")
+                for (sequence,) in conn.execute("SELECT sequence_name FROM duckdb_sequences()").fetchall():
+                    conn.execute(f"DROP SEQUENCE {sequence}")
+                conn.execute(f"IMPORT DATABASE '{directory}'")
+                tables = conn.execute("SHOW TABLES").pl()["name"].to_list()
+                replaced = sorted(set(replaced) | set(tables))
+            else:
+                tables = []
+                existing = set(conn.execute("SHOW TABLES").pl()["name"].to_list())
+                for name in sorted(os.listdir(directory)):
+                    table = name.rsplit(".", 1)[0].lower()
+                    if not re.fullmatch(r"[a-z_][a-z0-9_]*", table):
+                        raise ValueError(f"Invalid table name: {table}")
+                    path = os.path.join(directory, name)
+                    if fmt == "parquet":
+                        _replace_rows(conn, table, f"read_parquet('{path}')", table in existing)
+                    else:
+                        with pa.memory_map(path) as source:
+                            conn.register("tmp_arrow", pa.ipc.open_file(source).read_all())
+                            _replace_rows(conn, table, "tmp_arrow", table in existing)
+                            conn.unregister("tmp_arrow")
+                    tables.append(table)
+                replaced = tables
+            counts = {table: (conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0], 0, 0) for table in tables}
+            conn.execute("COMMIT")
+    finally:
+        conn.close()
+    for table in replaced:
+        bump_table_version(table)
+    return counts
+
+
+def read_chunks(file_path: str):
+    # Yield an exported file in chunks, to stream it to the browser
+    with open(file_path, "rb") as f:
+        while chunk := f.read(EXPORT_CHUNK_BYTES):
+            yield chunk
 
 
 # Example usage:
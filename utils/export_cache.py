@@ -0,0 +1,104 @@
+import hashlib
+import os
+import tempfile
+import threading
+from .db import get_db_connection
+
+# Exported workbooks are kept on disk under the fingerprint of the database
+# state they were built from, so that exporting an unchanged database serves
+# the previous file instead of writing it again
+CACHE_DIR = os.path.join(os.getcwd(), "data", "export_cache")
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+# Bump when the layout of the exported file changes, to ignore older artifacts
+FORMAT_VERSION = 1
+
+_lock = threading.Lock()
+# Artifacts being built by this process (see new_file), kept by clean_partial()
+_building = set()
+
+
+def fingerprint(suffix: str = ".xlsx", sequences: bool = False) -> str:
+    """
+    Hash of the content of every table: its columns and types, its row count
+    and the sum of the hashes of its rows (computed by DuckDB in one scan per
+    table), plus the state of the sequences when `sequences` (DuckDB snapshots
+    restore them). Content based rather than on the in-memory table versions,
+    so that it sees writes from other processes and still matches the cached
+    files after a restart.
+    """
+    conn = get_db_connection()
+    try:
+        tables = conn.execute("SHOW TABLES").pl()["name"].to_list()
+        digest = hashlib.sha256(f"{FORMAT_VERSION}".encode())
+        for table in tables:
+            columns = conn.execute(
+                f"SELECT string_agg(column_name || ' ' || column_type, ', ') FROM (DESCRIBE {table})"
+            ).fetchone()[0]
+            rows, rows_hash = conn.execute(f"SELECT count(*), sum(hash(t)::HUGEINT) FROM {table} AS t").fetchone()
+            digest.update(f"{table}|{columns}|{rows}|{rows_hash}\n".encode())
+        if sequences:
+            for name, last_value in conn.execute("SELECT sequence_name, last_value FROM duckdb_sequences() ORDER BY sequence_name").fetchall():
+                digest.update(f"{name}|{last_value}\n".encode())
+    finally:
+        conn.close()
+    return digest.hexdigest() + suffix
+
+
+def get(key: str):
+    # Path of the cached artifact, marked as recently used, or None
+    path = os.path.join(CACHE_DIR, key)
+    with _lock:
+        if not os.path.exists(path):
+            return None
+        os.utime(path)
+    return path
+
+
+def new_file(key: str) -> str:
+    # Private file to build an artifact in, moved into the cache by put()
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix=f"{key}.", suffix=".part", dir=CACHE_DIR)
+    os.close(fd)
+    with _lock:
+        _building.add(path)
+    return path
+
+
+def discard(file_path: str):
+    # Remove an artifact whose build failed or was cancelled
+    with _lock:
+        _building.discard(file_path)
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+
+def clean_partial():
+    # Remove the .part files left by builds that never finished (e.g. the app
+    # was stopped during an export), keeping the ones still being written
+    if not os.path.isdir(CACHE_DIR):
+        return
+    with _lock:
+        for entry in os.scandir(CACHE_DIR):
+            if entry.name.endswith(".part") and entry.path not in _building:
+                os.remove(entry.path)
+
+
+def put(key: str, file_path: str) -> str:
+    # Move a built artifact into the cache and evict the least recently used
+    # ones beyond MAX_CACHE_BYTES (never the artifact just stored)
+    path = os.path.join(CACHE_DIR, key)
+    with _lock:
+        os.replace(file_path, path)
+        _building.discard(file_path)
+        artifacts = sorted(
+            (entry for entry in os.scandir(CACHE_DIR) if entry.is_file() and not entry.name.endswith(".part")),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        size = sum(entry.stat().st_size for entry in artifacts)
+        for entry in artifacts:
+            if size <= MAX_CACHE_BYTES:
+                break
+            if entry.path != path:
+                size -= entry.stat().st_size
+                os.remove(entry.path)
+    return path
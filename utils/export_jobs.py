@@ -0,0 +1,61 @@
+import threading
+from . import export_cache
+from .excel_io import export_db, EXPORT_FORMATS
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+class ExportJob:
+    """
+    One export of the database (in one of EXPORT_FORMATS), run on a worker thread (see
+    the export_task extended task in app.py) so that the event loop and the
+    other sessions keep running meanwhile.
+    The worker writes its progress on the job and the session polls it; a
+    cancellation is noticed by the worker after the current batch of rows.
+    When the database hasn't changed since a previous export, the cached file
+    is returned right away (see utils/export_cache.py).
+    """
+
+    def __init__(self, fmt="xlsx"):
+        self.fmt, self.extension = fmt, EXPORT_FORMATS[fmt][1]
+        self.sheet, self.sheets, self.table, self.rows, self.table_rows = 0, 0, None, 0, 0
+        self.cached = False
+        self._cancelled = threading.Event()
+
+    def _progress(self, sheet, sheets, table, rows, table_rows):
+        if self._cancelled.is_set():
+            raise ExportCancelled()
+        self.sheet, self.sheets, self.table, self.rows, self.table_rows = sheet, sheets, table, rows, table_rows
+
+    def run(self) -> str:
+        export_cache.clean_partial()
+        key = export_cache.fingerprint(f".{self.fmt}.{self.extension}", sequences=self.fmt == "duckdb")
+        path = export_cache.get(key)
+        if path is not None:
+            self.cached = True
+            return path
+        file_path = export_cache.new_file(key)
+        try:
+            export_db(file_path, self.fmt, self._progress)
+        except BaseException:
+            export_cache.discard(file_path)
+            raise
+        return export_cache.put(key, file_path)
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def fraction(self) -> float:
+        # Share of the export done: whole sheets written plus the share of rows of the current one
+        # (an empty table has nothing left to write)
+        if not self.sheets:
+            return 0.0
+        return (self.sheet + (self.rows / self.table_rows if self.table_rows else 1)) / self.sheets
+
+    def describe(self) -> str:
+        if self.table is None:
+            return "Starting export..."
+        return f"{'Sheet' if self.fmt == 'xlsx' else 'Table'} {self.sheet + 1}/{self.sheets}: {self.table} ({self.rows:,}/{self.table_rows:,} rows)"
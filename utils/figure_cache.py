@@ -0,0 +1,77 @@
+import threading
+from collections import OrderedDict
+from functools import wraps
+import plotly.io as pio
+from .db import table_version
+from .figure_payload import compact
+
+# Byte budget of the serialized figures kept in memory (shared by all sessions)
+MAX_BYTES = 64 * 1024 * 1024
+
+
+class FigureCache:
+    """
+    LRU cache of serialized Plotly figures (JSON strings) with a byte budget.
+    """
+
+    def __init__(self, max_bytes: int=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            payload = self._items.get(key)
+            if payload is not None:
+                self._items.move_to_end(key)
+            return payload
+
+    def put(self, key, payload: str):
+        if len(payload) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                self.size -= len(self._items.pop(key))
+            self._items[key] = payload
+            self.size += len(payload)
+            while self.size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.size = 0
+
+
+figures = FigureCache()
+
+
+def cached(output_id: str, tables: tuple, dept: str=None, filters=None, invalidate=None):
+    """
+    Cache the figure returned by a render function, keyed by the output, the
+    value of `filters` (a reactive function, e.g. the settled filter inputs)
+    and the versions of the `tables` the figure is built from, as seen by
+    department `dept` (writes to other departments' rows keep the entry).
+    `invalidate` is read only to keep the render function's reactive dependency
+    (e.g. on data_version) when the figure comes from the cache.
+    """
+    def wrapper(fn):
+        @wraps(fn)
+        def render():
+            if invalidate is not None:
+                invalidate()
+            key = (
+                output_id,
+                filters() if filters is not None else None,
+                tuple(table_version(t, dept) for t in tables)
+            )
+            payload = figures.get(key)
+            if payload is not None:
+                return pio.from_json(payload)
+            fig = compact(fn(), output_id)
+            figures.put(key, fig.to_json())
+            return fig
+        return render
+    return wrapper
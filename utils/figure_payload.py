@@ -0,0 +1,67 @@
+import numpy as np
+
+# Compact Plotly figures before they are cached and sent to the browser:
+#   - numeric data arrays become the smallest NumPy dtype that keeps them at
+#     display precision, which Plotly emits as base64 typed arrays
+#   - the template only keeps the defaults of the trace types actually used
+
+# Decimals kept for float data (hours, percentages, durations)
+PRECISION = 2
+
+# Trace properties holding one value per point
+ARRAY_PROPS = ("x", "y", "z", "base", "values", "lat", "lon", "r", "theta")
+
+# Layout sections of the template that only matter for some trace types
+SUBPLOT_TYPES = {
+    "geo": ("choropleth", "scattergeo"),
+    "polar": ("barpolar", "scatterpolar", "scatterpolargl"),
+    "ternary": ("scatterternary",),
+    "scene": ("scatter3d", "surface", "mesh3d", "cone", "streamtube", "volume", "isosurface"),
+    "mapbox": ("scattermapbox", "choroplethmapbox", "densitymapbox"),
+    "map": ("scattermap", "choroplethmap", "densitymap"),
+}
+
+# Payload sizes per output (bytes before, bytes after), only filled when
+# RECORD_STATS is set, e.g. by benchmarks/figure_payloads.py
+RECORD_STATS = False
+stats = {}
+
+
+def compact_array(values):
+    # Return a typed array for numeric data, None when the data isn't numeric
+    arr = np.asarray(values)
+    if arr.dtype.kind in "iu" and arr.size:
+        return arr.astype(np.promote_types(np.min_scalar_type(arr.min()), np.min_scalar_type(arr.max())))
+    if arr.dtype.kind == "f":
+        arr = arr.round(PRECISION)
+        # float32 holds ~7 significant digits, enough at display precision for small values
+        if arr.size and np.nanmax(np.abs(arr), initial=0) < 2 ** 23 / 10 ** PRECISION:
+            return arr.astype(np.float32)
+        return arr
+    return None
+
+
+def trim_template(fig):
+    template = fig.layout.template
+    types = {trace.type for trace in fig.data}
+    template.data = {t: traces for t, traces in template.data.to_plotly_json().items() if t in types}
+    for section, owners in SUBPLOT_TYPES.items():
+        if not types.intersection(owners) and section in template.layout:
+            template.layout[section] = None
+
+
+def compact(fig, name: str=None):
+    before = len(fig.to_json()) if RECORD_STATS else None
+
+    for trace in fig.data:
+        for prop in ARRAY_PROPS:
+            if prop not in trace or trace[prop] is None or isinstance(trace[prop], str):
+                continue
+            arr = compact_array(trace[prop])
+            if arr is not None:
+                trace[prop] = arr
+    trim_template(fig)
+
+    if RECORD_STATS and name:
+        stats[name] = (before, len(fig.to_json()))
+    return fig
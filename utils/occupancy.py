@@ -0,0 +1,141 @@
+from datetime import date
+import warnings
+import numpy as np
+import polars as pl
+from .db import read_query, table_version
+
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+
+# Public holidays per (country, year) as datetime64[D] arrays, shared by all matrices
+_holidays = {}
+
+def holiday_dates(country_code: str, year: int) -> np.ndarray:
+    version = table_version("holidays")
+    cached = _holidays.get((country_code, year))
+    if cached is None or cached[0] != version:
+        dates = read_query(
+            "SELECT DISTINCT date::DATE AS date FROM holidays WHERE country_code = ? AND year(date) = ? ORDER BY date",
+            [country_code, year]
+        ).get_column("date").to_list()
+        if not dates and country_code:
+            warnings.warn(
+                f"No public holidays of {country_code} in {year} in the holidays table, every weekday counts as a working day "
+                "(add them to data/holidays.csv, loaded at the next start)"
+            )
+        cached = (version, np.array(dates, dtype="datetime64[D]"))
+        _holidays[(country_code, year)] = cached
+    return cached[1]
+
+
+class Occupancy:
+    """
+    Advisors x days matrix of a department's calendar, one uint8 per cell:
+    0 when the advisor is free, otherwise the code of the event type
+    (index in `events` + 1). The days span whole calendar years, so that any
+    count per year, month or event type is a reduction over a slice of columns.
+    Events cover whole days, end date included; when events overlap, the one
+    starting last fills the shared days.
+    A second boolean matrix marks the working days of each advisor: weekdays
+    that are not a public holiday in the advisor's duty country (`countries`).
+    """
+
+    def __init__(self, rows, events, countries=None, advisors=()):
+        # advisors: also kept when they have no events (e.g. the active advisors)
+        rows = sorted(rows, key=lambda row: row[1])  # (advisor, start_date, end_date, event_name)
+        self.events = list(events) + sorted({row[3] for row in rows} - set(events))
+        self.advisors = sorted({row[0] for row in rows} | set(advisors))
+        countries = countries or {}
+
+        first = min((row[1].date() for row in rows), default=date.today())
+        last = max((max(row[1], row[2]).date() for row in rows), default=date.today())
+        self.first = date(first.year, 1, 1)
+        self.days = np.arange(np.datetime64(self.first), np.datetime64(date(last.year, 12, 31)) + np.timedelta64(1, "D"))
+        self.years = self.days.astype("datetime64[Y]").astype(int) + 1970
+        self.months = self.days.astype("datetime64[M]").astype(int) % 12
+        # 1970-01-01 was a Thursday: weekday 0 is Monday
+        weekdays = (self.days.astype(int) + 3) % 7 < 5
+        working_by_country = {}
+        for country in {countries.get(advisor) for advisor in self.advisors}:
+            holidays = [holiday_dates(country, int(year)) for year in np.unique(self.years)] if country else []
+            working_by_country[country] = weekdays & ~np.isin(self.days, np.concatenate(holidays)) if holidays else weekdays
+        self.working = np.array(
+            [working_by_country[countries.get(advisor)] for advisor in self.advisors],
+            dtype=bool
+        ).reshape(len(self.advisors), len(self.days))
+
+        self.matrix = np.zeros((len(self.advisors), len(self.days)), dtype=np.uint8)
+        advisor_index = {advisor: i for i, advisor in enumerate(self.advisors)}
+        codes = {name: i + 1 for i, name in enumerate(self.events)}
+        for advisor, start, end, event_name in rows:
+            a = (start.date() - self.first).days
+            b = (max(start, end).date() - self.first).days + 1
+            self.matrix[advisor_index[advisor], a:b] = codes[event_name]
+
+    def _select(self, year=None, advisors=None):
+        # Rows of the advisors, columns of the year (all years when None) and
+        # the working days of those advisors within these columns
+        rows = [i for i, advisor in enumerate(self.advisors) if advisors is None or advisor in advisors]
+        columns = self.years == int(year) if year else np.ones(len(self.days), dtype=bool)
+        return rows, columns, self.working[rows][:, columns]
+
+    def days_by_event(self, year=None, advisors=None) -> pl.DataFrame:
+        # Working days per advisor and event type, one bincount over the selected cells,
+        # with the advisor's working days of the period
+        rows, columns, working = self._select(year, advisors)
+        cells = np.where(working, self.matrix[rows][:, columns], 0).astype(np.int64)
+        width = len(self.events) + 1
+        offsets = np.arange(len(rows))[:, None] * width
+        counts = np.bincount((cells + offsets).ravel(), minlength=len(rows) * width).reshape(len(rows), width)
+        advisor_ids, event_ids = np.nonzero(counts[:, 1:])
+        return pl.DataFrame({
+            "advisor_short_name": [self.advisors[rows[i]] for i in advisor_ids],
+            "event_name": [self.events[e] for e in event_ids],
+            "total_days": counts[advisor_ids, event_ids + 1],
+            "working_days": working.sum(axis=1)[advisor_ids]
+        }, schema={"advisor_short_name": pl.String, "event_name": pl.String, "total_days": pl.Int64, "working_days": pl.Int64})
+
+    def utilisation(self, year=None, advisors=None) -> pl.DataFrame:
+        # Share of the working days each advisor has an event
+        rows, columns, working = self._select(year, advisors)
+        busy = ((self.matrix[rows][:, columns] > 0) & working).sum(axis=1)
+        total = working.sum(axis=1)
+        return pl.DataFrame({
+            "advisor_short_name": [self.advisors[i] for i in rows],
+            "busy_days": busy,
+            "working_days": total,
+            "utilisation": np.divide(busy, total, out=np.zeros(len(rows)), where=total > 0)
+        })
+
+    def monthly_load(self, year, advisors=None):
+        # Advisors x 12 months share of busy working days, with the advisor names
+        rows, columns, working = self._select(year, advisors)
+        in_month = (self.months[columns][:, None] == np.arange(12)).astype(np.int32)  # days x months
+        busy = ((self.matrix[rows][:, columns] > 0) & working).astype(np.int32) @ in_month
+        total = working.astype(np.int32) @ in_month
+        load = np.divide(busy, total, out=np.zeros(busy.shape), where=total > 0)
+        return [self.advisors[i] for i in rows], load
+
+
+# One matrix per department, rebuilt when the calendar, the event types, the
+# advisors' duty countries or the holidays change
+_matrices = {}
+
+def get_matrix(dept: str) -> Occupancy:
+    version = (table_version("calendar", dept), table_version("events"), table_version("advisors", dept), table_version("holidays"))
+    cached = _matrices.get(dept)
+    if cached is None or cached[0] != version:
+        rows = read_query(
+            "SELECT advisor_short_name, start_date, end_date, event_name FROM calendar WHERE department_code = ?",
+            [dept]
+        ).iter_rows()
+        events = read_query("SELECT name FROM events ORDER BY name").get_column("name").to_list()
+        advisors = read_query(
+            "SELECT short_name, duty_country_code, coalesce(active::BOOLEAN, false) AS active FROM advisors WHERE department_code = ?",
+            [dept]
+        )
+        countries = dict(zip(advisors.get_column("short_name").to_list(), advisors.get_column("duty_country_code").to_list()))
+        active = advisors.filter(pl.col("active")).get_column("short_name").to_list()
+        cached = (version, Occupancy(list(rows), events, countries, active))
+        _matrices[dept] = cached
+    return cached[1]
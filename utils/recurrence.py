@@ -0,0 +1,70 @@
+import polars as pl
+from datetime import date, datetime
+from . import db
+
+# Recurring calendar entries (weekly calls, recurring leave, ...) are expanded
+# into one calendar row per occurrence, inserted in one batch and tied together
+# by their series_id, so that every reader of the calendar (availability,
+# occupancy, conflicts, capacity) sees them as ordinary events.
+FREQUENCIES = {"daily": ("Daily", "d"), "weekly": ("Weekly", "w"), "monthly": ("Monthly", "mo")}
+# Upper bound of a series, e.g. a daily entry for a year
+MAX_OCCURRENCES = 366
+
+
+def expand(start_date, end_date, frequency: str, interval: int = 1, until=None, count: int = None) -> pl.DataFrame:
+    """
+    Start and end dates of the occurrences of an entry spanning start_date to
+    end_date, repeated every `interval` days, weeks or months until the date
+    `until` (included) or `count` times. Computed as one date offset per
+    occurrence over an integer range, months ending early being clamped
+    (the 31st falls on the last day of shorter months).
+    """
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"Unknown frequency: {frequency}")
+    if until is None and not count:
+        raise ValueError("A recurring entry needs an end date or a number of occurrences.")
+    if interval is None or interval < 1:
+        raise ValueError("The repeat interval must be at least 1.")
+    interval, count = int(interval), int(count) if count else None
+    start_date, end_date = _as_date(start_date), _as_date(end_date)
+    if end_date < start_date:
+        raise ValueError("End date must be on or after the start date.")
+
+    unit = FREQUENCIES[frequency][1]
+    steps = pl.int_range(0, min(count or MAX_OCCURRENCES + 1, MAX_OCCURRENCES + 1), dtype=pl.Int64) * interval
+    occurrences = pl.select(
+        pl.lit(start_date).dt.offset_by(pl.format(f"{{}}{unit}", steps)).alias("start_date")
+    ).with_columns(
+        (pl.col("start_date") + (end_date - start_date)).alias("end_date")
+    )
+    if until is not None:
+        occurrences = occurrences.filter(pl.col("start_date") <= _as_date(until))
+    if occurrences.is_empty():
+        raise ValueError("The repeat end date is before the start date.")
+    if occurrences.height > MAX_OCCURRENCES:
+        raise ValueError(f"A recurring entry can have at most {MAX_OCCURRENCES} occurrences.")
+    return occurrences
+
+
+def occurrences(entry: dict, frequency: str, interval: int = 1, until=None, count: int = None) -> pl.DataFrame:
+    # Calendar rows of a recurring entry: the entry's fields on every occurrence
+    dates = expand(entry["start_date"], entry["end_date"], frequency, interval, until, count)
+    return dates.with_columns(
+        pl.col("start_date").cast(pl.Datetime("us")),
+        pl.col("end_date").cast(pl.Datetime("us")),
+        *[pl.lit(value).alias(column) for column, value in entry.items() if column not in ("start_date", "end_date")]
+    )
+
+
+def insert_series(rows: pl.DataFrame) -> list:
+    # Insert the occurrences of a series in one transaction under a new series_id, returns their ids
+    series_id = db.read_query("SELECT nextval('calendar_series_seq') AS series_id").item()
+    return db.insert_rows("calendar", rows.with_columns(pl.lit(series_id, pl.Int32).alias("series_id")))
+
+
+def _as_date(value) -> date:
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    if isinstance(value, datetime):
+        return value.date()
+    return value
@@ -0,0 +1,113 @@
+import re
+from collections import defaultdict
+from .db import read_query, table_version
+
+# Maximum number of matches returned to the browser for one search
+SEARCH_LIMIT = 50
+
+# Reference lists that can be searched from the modals.
+# kind: (tables the list is derived from, query, filtered by department)
+SOURCES = {
+    "countries": (
+        ("countries",),
+        "SELECT name AS value, name AS label FROM countries ORDER BY name",
+        False
+    ),
+    "country_codes": (
+        ("countries",),
+        "SELECT iso_alpha3_code AS value, name AS label FROM countries ORDER BY name",
+        False
+    ),
+    "advisors": (
+        ("advisors",),
+        "SELECT short_name AS value, short_name AS label FROM advisors WHERE department_code = ? ORDER BY short_name",
+        True
+    ),
+    "active_advisors": (
+        ("advisors",),
+        "SELECT short_name AS value, short_name AS label FROM advisors WHERE department_code = ? AND active = 'true' ORDER BY short_name",
+        True
+    ),
+    "focals": (
+        ("country_focals",),
+        "SELECT DISTINCT name AS value, name AS label FROM country_focals WHERE department_code = ? AND name IS NOT NULL ORDER BY name",
+        True
+    ),
+    "donors": (
+        ("proposals",),
+        "SELECT DISTINCT donor AS value, donor AS label FROM proposals WHERE department_code = ? AND donor IS NOT NULL ORDER BY donor",
+        True
+    ),
+}
+
+
+class SearchIndex:
+    """
+    In-memory prefix / n-gram index over (value, label) pairs.
+    Word prefixes are answered from a dictionary lookup, any other substring
+    of at least `ngram` characters from the intersection of its n-grams.
+    """
+
+    def __init__(self, entries, ngram=3):
+        self.ngram = ngram
+        self.values = [str(value) for value, _ in entries]
+        self.labels = [str(label) for _, label in entries]
+        self._keys = [label.lower() for label in self.labels]
+        self._by_value = dict(zip(self.values, self.labels))
+        self._prefixes = defaultdict(set)
+        self._ngrams = defaultdict(set)
+
+        for i, key in enumerate(self._keys):
+            for token in re.split(r"[\s,()/-]+", key):
+                for n in range(1, len(token) + 1):
+                    self._prefixes[token[:n]].add(i)
+            for n in range(len(key) - ngram + 1):
+                self._ngrams[key[n:n + ngram]].add(i)
+
+    def __len__(self):
+        return len(self.values)
+
+    def _candidates(self, keyword):
+        if keyword in self._prefixes:
+            return self._prefixes[keyword]
+        if len(keyword) >= self.ngram:
+            grams = [keyword[n:n + self.ngram] for n in range(len(keyword) - self.ngram + 1)]
+            ids = set.intersection(*(self._ngrams.get(g, set()) for g in grams))
+        else:
+            ids = range(len(self._keys))
+        # N-grams (and short keywords) only narrow the search, confirm the substring
+        return {i for i in ids if keyword in self._keys[i]}
+
+    def _rank(self, i, keywords):
+        # 0: label starts with the keyword, 1: a word starts with it, 2: anywhere else
+        key = self._keys[i]
+        return sum(0 if key.startswith(kw) else 1 if i in self._prefixes.get(kw, ()) else 2 for kw in keywords)
+
+    def search(self, query: str, limit: int=SEARCH_LIMIT) -> list[dict]:
+        keywords = [kw for kw in re.split(r"\s+", query.lower()) if kw]
+        if not keywords:
+            ids = range(min(limit, len(self.values)))
+        else:
+            ids = set.intersection(*(self._candidates(kw) for kw in keywords))
+            ids = sorted(ids, key=lambda i: (self._rank(i, keywords), self._keys[i]))[:limit]
+        return [{"value": self.values[i], "label": self.labels[i]} for i in ids]
+
+    def lookup(self, values) -> dict:
+        # Map values back to their labels (unknown values are kept as they are)
+        return {value: self._by_value.get(value, value) for value in values}
+
+
+# Indexes are shared by all sessions and rebuilt when one of their tables changes
+_indexes = {}
+
+def get_index(kind: str, dept: str=None) -> SearchIndex:
+    tables, sql, per_department = SOURCES[kind]
+    key = (kind, dept if per_department else None)
+    versions = tuple(table_version(t, dept if per_department else None) for t in tables)
+
+    cached = _indexes.get(key)
+    if cached is None or cached[0] != versions:
+        entries = read_query(sql, [dept] if per_department else None).iter_rows()
+        cached = (versions, SearchIndex(list(entries)))
+        _indexes[key] = cached
+    return cached[1]
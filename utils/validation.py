@@ -0,0 +1,145 @@
+import polars as pl
+from .db import read_query, table_version
+
+# Rules on the rows of each table, written once as Polars expressions so that
+# a whole batch (an imported sheet, a bulk entry) is checked in one pass, and a
+# single record (a modal) is a batch of one row.
+# A rule is (columns, check, message): check(incoming) returns an expression
+# that is true on valid rows; rules on columns missing from the batch are
+# skipped. `incoming` holds the other tables written together with the batch
+# (e.g. the other sheets of an imported workbook), {table: DataFrame}.
+HEX_COLOUR = r"^#[A-Fa-f0-9]{6}$"
+EMAIL = r"^[^@]+@[^@]+\.[^@]+"
+MAX_HOURS = 24
+
+
+def _label(column):
+    return column.replace("_", " ").capitalize()
+
+
+def _text(column):
+    return pl.col(column).cast(pl.String).str.strip_chars()
+
+
+def required(*columns):
+    return [((column,), lambda incoming, column=column: _text(column).fill_null("") != "", f"{_label(column)} is required.") for column in columns]
+
+
+def matches(column, pattern, message):
+    # Empty (null) values pass, see required()
+    return [((column,), lambda incoming: pl.col(column).is_null() | pl.col(column).cast(pl.String).str.contains(pattern), message)]
+
+
+def one_of(column, table, key, multiple=False):
+    # Values (a comma separated list if multiple) that must exist in another
+    # table, or in the rows of that table written with them
+    def check(incoming):
+        values = _lookup(table, key)
+        if table in incoming and key in incoming[table].columns:
+            values = values + incoming[table].get_column(key).drop_nulls().unique().to_list()
+        if multiple:
+            # Empty items are left to required()
+            value = pl.element().str.strip_chars()
+            return _text(column).str.split(",").list.eval(value.is_in(values) | (value == "")).list.all()
+        return pl.col(column).is_null() | pl.col(column).is_in(values)
+    return [((column,), check, f"{_label(column)} is not in the {table} table.")]
+
+
+# Values of the lookup columns, re-read when their table changes
+_lookups = {}
+
+def _lookup(table, column):
+    version = table_version(table)
+    cached = _lookups.get((table, column))
+    if cached is None or cached[0] != version:
+        cached = (version, read_query(f"SELECT DISTINCT {column} FROM {table} WHERE {column} IS NOT NULL").get_column(column).to_list())
+        _lookups[(table, column)] = cached
+    return cached[1]
+
+
+RULES = {
+    "advisors": [
+        *required("department_code", "name", "short_name"),
+        *matches("email", EMAIL, "Email must be a valid email address."),
+        *matches("colour", HEX_COLOUR, "Colour must be a valid HEX code (e.g., #FF5733)."),
+        *one_of("department_code", "departments", "code"),
+    ],
+    "departments": required("name", "code"),
+    "calendar": [
+        *required("department_code", "advisor_short_name", "event_name"),
+        *one_of("advisor_short_name", "advisors", "short_name"),
+        *one_of("event_name", "events", "name"),
+        (("start_date", "end_date"), lambda incoming: pl.col("end_date") >= pl.col("start_date"), "End date must be on or after the start date."),
+    ],
+    "timesheet": [
+        *required("department_code", "date", "country_name", "sal_attendees", "support_name"),
+        *one_of("sal_attendees", "advisors", "short_name", multiple=True),
+        *one_of("support_name", "support", "name"),
+        (("hours",), lambda incoming: (pl.col("hours") > 0) & (pl.col("hours") <= MAX_HOURS), f"Hours must be more than 0 and at most {MAX_HOURS}."),
+    ],
+    "country_focals": [
+        *required("department_code", "name", "country_name"),
+        *matches("email", EMAIL, "Email must be a valid email address."),
+    ],
+    "proposals": required("department_code", "type", "country_name"),
+    "construction_risk_matrix": required("country_name", "score"),
+    "countries": required("iso_alpha3_code", "name", "continent"),
+    "events": [*required("name"), *matches("colour", HEX_COLOUR, "Colour must be a valid HEX code (e.g., #FF5733).")],
+    "holidays": required("country_code", "date"),
+    "support": [*required("category", "name"), *matches("colour", HEX_COLOUR, "Colour must be a valid HEX code (e.g., #FF5733).")],
+}
+
+# Rules on the single records entered in the modals only: advisors and focal
+# points get an email there, while the imported sheets may leave it empty
+RECORD_RULES = {
+    "advisors": required("email"),
+    "country_focals": required("email"),
+}
+
+ERRORS_SCHEMA = {"row": pl.UInt32, "column": pl.String, "message": pl.String}
+
+
+def validate(table: str, df: pl.DataFrame, incoming: dict = None, rules: list = None) -> pl.DataFrame:
+    """
+    Check a batch of rows of `table` against its RULES (or `rules`), every rule
+    evaluated over the whole frame in a single select. Lookups accept the values
+    of the database and of `incoming` ({table: rows written in the same batch}).
+    Returns one error per failing row and rule: row (position in `df`),
+    column and message.
+    """
+    rules = RULES.get(table, []) if rules is None else rules
+    rules = [rule for rule in rules if all(column in df.columns for column in rule[0])]
+    if not rules or df.is_empty():
+        return pl.DataFrame(schema=ERRORS_SCHEMA)
+    # A rule evaluating to null (e.g. a comparison with an empty cell) doesn't apply
+    checks = df.select(check(incoming or {}).fill_null(True).alias(str(i)) for i, (_, check, _) in enumerate(rules))
+    messages = pl.DataFrame(
+        {"rule": [str(i) for i in range(len(rules))], "column": [rule[0][-1] for rule in rules], "message": [rule[2] for rule in rules]}
+    )
+    return (
+        checks.with_row_index("row")
+        .unpivot(index="row", variable_name="rule", value_name="valid")
+        .filter(~pl.col("valid"))
+        .join(messages, on="rule")
+        .select(["row", "column", "message"])
+        .sort(["row", "column"])
+    )
+
+
+def check_row(table: str, row: dict):
+    # Validate a single record (e.g. from a modal), raising its errors as a ValueError
+    errors = validate(table, pl.DataFrame([row]), rules=RECORD_RULES.get(table, []) + RULES.get(table, []))
+    if errors.height:
+        raise ValueError(" ".join(errors.get_column("message").unique(maintain_order=True).to_list()))
+
+
+def describe(errors: pl.DataFrame, first_row: int = 0, limit: int = 10) -> list:
+    # One line per failing rule with its rows, numbered from first_row (e.g. 2 for spreadsheet rows)
+    return [
+        f"{message} Row(s) {', '.join(map(str, rows[:limit]))}{' ...' if len(rows) > limit else ''}"
+        for message, rows in (
+            errors.group_by("message", maintain_order=True)
+            .agg((pl.col("row").unique(maintain_order=True) + first_row).alias("rows"))
+            .iter_rows()
+        )
+    ]
@@ -0,0 +1,98 @@
+from functools import wraps
+import plotly.graph_objects as go
+from shiny import reactive
+from shiny.types import SilentException
+from shinywidgets import render_widget
+
+# Layout properties owned by the widget once it is displayed (shinywidgets shrinks
+# the margins of plotly widgets), which must not be reset by a patch
+KEEP_LAYOUT = ("margin", "template")
+
+
+def patch_figure(widget, fig) -> bool:
+    """
+    Copy the traces and layout of `fig` into the displayed `widget` in place.
+    Plotly only sends the properties that actually changed to the browser.
+    Returns False when the traces can't be patched (a trace changed type, or a
+    new trace type has no defaults in the widget's trimmed template), in which
+    case the widget has to be rebuilt.
+    """
+    common = min(len(widget.data), len(fig.data))
+    if any(widget.data[i].type != fig.data[i].type for i in range(common)):
+        return False
+    if {trace.type for trace in fig.data} - {trace.type for trace in widget.data}:
+        return False
+
+    with widget.batch_update():
+        # Traces can appear or disappear (e.g. one trace per colour)
+        if len(widget.data) > len(fig.data):
+            widget.data = widget.data[:len(fig.data)]
+        for old, new in zip(widget.data, fig.data):
+            _replace(old, new.to_plotly_json(), keep=("uid",))
+        if len(fig.data) > common:
+            widget.add_traces(fig.data[common:])
+
+        layout = {k: v for k, v in fig.layout.to_plotly_json().items() if k not in KEEP_LAYOUT}
+        _replace(widget.layout, layout, keep=KEEP_LAYOUT)
+    return True
+
+
+def _replace(obj, props: dict, keep=()):
+    # Set the new properties and clear the ones the new figure doesn't have
+    stale = {k: None for k in obj.to_plotly_json() if k not in props and k not in keep}
+    obj.update({**stale, **props}, overwrite=True)
+
+
+def persistent(fn):
+    """
+    Drop-in replacement for @render_widget for functions returning a Plotly
+    figure: the FigureWidget is created once per output, and later changes of
+    the figure only patch its traces and layout instead of sending a whole new
+    figure to the browser.
+    """
+    rebuild = reactive.Value(0)
+    # The figure is built once per change of its dependencies and shared by the
+    # render and the patch effect; `rendered` is the figure the widget was built from
+    figure = reactive.Calc(lambda: fn())
+    state = {"rendered": None}
+
+    @render_widget
+    @wraps(fn)
+    def widget():
+        rebuild()
+        with reactive.isolate():
+            state["rendered"] = figure()
+            return go.FigureWidget(state["rendered"])
+
+    @reactive.Effect
+    def _patch():
+        # Waits until the widget has been rendered (i.e. the output is visible)
+        current = widget.widget
+        try:
+            fig = figure()
+        except SilentException:
+            raise
+        except Exception:
+            fig = None  # Let the render function show the error
+        if fig is not None and fig is state["rendered"]:
+            # Dependencies unchanged since the render: nothing to patch
+            return
+        if fig is None or not patch_figure(current, fig):
+            with reactive.isolate():
+                rebuild.set(rebuild() + 1)
+        else:
+            state["rendered"] = fig
+
+    return widget
+
+
+def empty_figure(message: str, title: str = None) -> go.Figure:
+    # Placeholder for plots without data (e.g. a heatmap with no rows or columns)
+    fig = go.Figure()
+    fig.update_layout(
+        title=title,
+        xaxis={"visible": False},
+        yaxis={"visible": False},
+        annotations=[{"text": message, "showarrow": False, "xref": "paper", "yref": "paper", "x": 0.5, "y": 0.5, "font": {"size": 14}}]
+    )
+    return fig